@@ -1,12 +1,17 @@
 from django.shortcuts import render, redirect
 from social_distribution.models import Author, Friends, FollowRequest, Post, Like
+from social_distribution.friends import friends_cache
+from social_distribution.serializers import get_friends_detail_dicts
 from django.http import HttpResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView
 from service.models import ServerNode
-import requests
+from service.federation import federation_client
+from service.requests import get_server_node
+from service.fanout import fetch_posts, fetch_author_lists
+from service.outbox import enqueue
 from urllib.parse import urlparse
-from markdown_it import MarkdownIt
+from social_distribution.rendering import markdown_renderer
 
 
 # Create your views here.
@@ -23,16 +28,10 @@ def display_profile(request):
     url = request.GET.get('url')
     if url:
         host = urlparse(url).netloc
-        node = None
-        for n in ServerNode.objects.all():
-            print(n.host, url)
-            if url.startswith(n.host):
-                node = n
-                break
+        node = get_server_node(url)
         if node:
-            auth = (node.sending_username, node.sending_password)
-            response = requests.get(url, auth=auth)
             try:
+                response = federation_client.get(url, node=node)
                 author = response.json()
                 not_found = False
                 myself = Author.objects.filter(id=request.user.id).get()
@@ -43,32 +42,12 @@ def display_profile(request):
                 pass
 
     posts = []
-    for node in ServerNode.objects.all():
-        if node.is_local:
-            continue
-        url = f'{node.host}/authors/'
-        auth = (node.sending_username, node.sending_password)
-        response = requests.get(url, auth=auth)
-        try:
-            data = response.json()
-            authors = data['items']
-            for a in authors:
-                if a['id'] == author['id']:
-                    url = author['url'] + '/posts/'
-                    response = requests.get(url, auth=auth)
-                    try:
-                        data = response.json()
-                        posts.extend(data['items'])
-                        for post in data['items']:
-                            if post["contentType"] == "text/markdown":
-                                md = MarkdownIt('commonmark')
-                                post["content"] = md.render(post["content"])
-                    except Exception as e:
-                        print('Error: URL =', url)
-                        print(e)
-        except Exception as e:
-            print('Error: URL =', url)
-            print(e)
+    if author:
+        nodes = ServerNode.objects.filter(is_local=False)
+        posts = fetch_posts(nodes, author_filter=lambda a: a['id'] == author.get('id'))
+        for post in posts:
+            if post.get("contentType") == "text/markdown":
+                post["content"] = markdown_renderer.render(str(post.get("content") or ''))
 
     context = {
         'not_found': not_found,
@@ -87,23 +66,18 @@ Retrieve and display all authors saved as Author model instances in the database
 def display_authors(request):    
     print('entered author_list_view')
     nodes = []
-    for node in ServerNode.objects.all():
+    server_nodes = ServerNode.objects.all()
+    remote_authors = fetch_author_lists([node for node in server_nodes if not node.is_local])
+    for node in server_nodes:
         print('host username:password =', node.host, node.sending_username, node.sending_password)
 
         if node.is_local:
             authors = [author.get_detail_dict() for author in Author.objects.all()]
+        elif node.id in remote_authors:
+            authors = remote_authors[node.id]
         else:
-            url = f'{node.host}/authors/'
-            auth = (node.sending_username, node.sending_password)
-            response = requests.get(url, auth=auth)
-            try:
-                data = response.json()
-                authors = data['items']
-            except Exception as e:
-                print(f'Failed to get authors from {url}')
-                print(f'Error: {e}')
-                print(f'response.text = {response.text}')
-                continue
+            print(f'Failed to get authors from {node.host}/authors/')
+            continue
         # print(authors)
         nodes.append({
             'is_local': node.is_local,
@@ -119,7 +93,7 @@ Retrieve and display a single author
 """
 def display_author(request, id):
     author = Author.objects.get(id=id)
-    posts = Post.objects.filter(author=author, visibility='PUBLIC').order_by('-published')
+    posts = Post.objects.filter(author=author, visibility='PUBLIC').select_related('shared_post').order_by('-published')
     sender = Author.objects.get(username=request.user)
     s_qs = Friends.objects.filter(sender=sender, status='send').values_list('receiver', flat=True)
     r_qs = Friends.objects.filter(sender=sender, status='accepted').values_list('receiver', flat=True)
@@ -171,6 +145,8 @@ def author_friend_view(request):
                 follower, inserted = FollowRequest.objects.get_or_create(to_author=recv, from_author=send) #, summary=summary)
                 friend.save()
                 follower.save()
+                if inserted:
+                    enqueue('FOLLOW', follower, send)
         if action_flag == 'R':
             #if (Friends.objects.get(receiver=recv, sender=send,status='send').count())>0:
             Friends.objects.get(receiver=recv, sender=send, status='send').delete()
@@ -204,6 +180,8 @@ def pending_action_view(request):
         me = Author.objects.get(username=request.user)
         if accept == 'A':
             friend = Friends.objects.filter(receiver=me, sender=sender,status='send').update(status='accepted')
+            # update() does not send post_save
+            friends_cache.invalidate([me.id, sender.id])
             me.followers.add(sender)
         if accept == 'R':
             friend = Friends.objects.filter(receiver=me, sender=sender,status='send')
@@ -243,64 +221,12 @@ def friends_view1(request):
 
 
 def friends_view(request):
-######################
-# Access users from other connected nodes
-    f_qs = []
-    authors =[]
-    for node in ServerNode.objects.all():
-        if node.is_local:
-            url = f'https://cmput-404-w22-project-group09.herokuapp.com/service/authors/{request.user.id}/followers'
-            auth = ('localserver', 'pwdlocal')
-            response = requests.get(url, auth=auth)
-        else:
-            url = f'{node.host}/service/authors/{request.user.id}/followers'
-            auth = (node.sending_username, node.sending_password)
-            response = requests.get(url, auth=auth)
-        try:
-            data = response.json()
-            authors = data['items']
-            for gauthor in authors:
-                mauthId=gauthor['id']
-                if node.is_local:
-                    url1 = f'{mauthId}/followers/{request.user.id}'
-                    auth = ('localserver', 'pwdlocal')
-                else:
-                    url1 = f'{node.host}/service/authors/{mauthId}/followers/{request.user.id}'
-                    auth = (node.sending_username, node.sending_password)
-                response1 = requests.get(url1, auth=auth)
-                try:
-                    #data1 = response1.json()
-                    if (response1.status_code == 200):
-                        if gauthor not in f_qs:
-                            f_qs.append(gauthor)
-                except Exception as e:
-                    print('Error: URL =', url)
-                    print(e)
-        except Exception as e:
-            print('Error: URL =', url)
-            print(e)
-
-
-    f_qs1 = list(set(f_qs))
+    # the friends of local and remote authors are resolved locally, see FriendsCache
+    friends = get_friends_detail_dicts(request.user.id)
     context = {
-        'authors': f_qs1,
-        'f_qs': authors,
+        'authors': friends,
+        'f_qs': friends,
     }
-########################
-
-
-#
-#    f_qs_list = []
-#    authors = Friends.objects.filter(sender=request.user, status='accepted').values_list('receiver', flat=True)
-#    for qs in authors:
-#        cross_qs = Friends.objects.filter(sender=qs, receiver=request.user, status='accepted').count()
-#        if cross_qs > 0:
-#            f_qs_list.append(qs)
-#    f_qs = Author.objects.filter(id__in=f_qs_list)
-#    context = {
-#        'authors': authors,
-#        'f_qs': f_qs,
-    #}
     return render(request, 'authors/friends_list.html', context)
 
 
@@ -322,6 +248,8 @@ def author_profile_view(request):
                 follower, inserted = FollowRequest.objects.get_or_create(to_author=recv, from_author=send) #, summary=summary)
                 friend.save()
                 follower.save()
+                if inserted:
+                    enqueue('FOLLOW', follower, send)
         if action_flag == 'R':
             #if (Friends.objects.get(receiver=recv, sender=send,status='send').count())>0:
             Friends.objects.get(receiver=recv, sender=send, status='send').delete()
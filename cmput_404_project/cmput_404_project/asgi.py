@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cmput_404_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are loaded
+from service.events import INBOX_EVENTS_PATH, inbox_events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    '''
+    Streams inbox events outside of the Django request cycle, so that the open connections
+    do not hold worker threads, and sends every other request to Django.
+    '''
+    if scope['type'] == 'http' and INBOX_EVENTS_PATH.match(scope['path']):
+        await inbox_events_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
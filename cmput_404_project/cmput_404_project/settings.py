@@ -144,6 +144,31 @@ STATICFILES_DIRS = (
     os.path.join(BASE_DIR, 'static'),
 )
 
+# Cache shared by all worker processes, e.g. of the friends of local authors, so that an
+# invalidation made by one process is seen by the others. Create its table with
+# "python manage.py createcachetable".
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
+# Cache of the authors, posts and comments fetched from remote servers
+# See social_distribution/remote_cache.py for all options
+REMOTE_OBJECT_CACHE = {
+    'CACHE_ALIAS': None,
+    'MAX_ENTRIES': 1000,
+    'NEGATIVE_TIMEOUT': 30,
+}
+
+# Events of new inbox items pushed to the inbox page, see service/events.py for all options.
+# With BACKEND None, the events go through PostgreSQL LISTEN/NOTIFY when the database is
+# PostgreSQL, so that the items added by every process and worker reach every client.
+EVENTS = {
+    'BACKEND': None,
+}
+
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
@@ -1,6 +1,7 @@
 import re
 from django.shortcuts import render, redirect
-from social_distribution.models import Author, Post, Comment, Like, Friends
+from social_distribution.models import Author, Post, PostAudience, Comment, Like
+from social_distribution.friends import friends_cache, clear_audience, get_readable_posts_q
 from django.http import HttpResponse
 from .forms import PostForm, PostLike, PrivatePostForm, CommentForm
 from django.utils import timezone
@@ -8,12 +9,11 @@ import hashlib
 from django.utils.text import slugify
 import time
 import uuid
-import requests
-from requests.auth import HTTPBasicAuth
 from urllib.parse import urlparse
-from service.requests import get_b64_server_credential
-from service.models import ServerNode
-from markdown_it import MarkdownIt
+from service.models import ServerNode, RemotePost
+from service.outbox import enqueue
+
+REMOTE_POSTS_SIZE = 100
 
 def display_public_posts(request):
     # posts = Post.objects.filter(visibility='PUBLIC').exclude(author=request.user).order_by('-published')
@@ -24,33 +24,13 @@ def display_public_posts(request):
     comment_form = CommentForm(request.POST)
     new_post_form = PostForm()
 
-    # Access posts from other connected nodes
-    foreign_posts = []
-    for node in ServerNode.objects.all():
-        if node.is_local:
-            continue
-        url = f'{node.host}/authors/'
-        auth = (node.sending_username, node.sending_password)
-        response = requests.get(url, auth=auth)
-        try:
-            data = response.json()
-            authors = data['items']
-            for author in authors:
-                url = author['url'] + '/posts/'
-                response = requests.get(url, auth=auth)
-                try:
-                    data = response.json()
-                    foreign_posts.extend(data['items'])
-                    for post in data['items']:
-                        if post["contentType"] == "text/markdown":
-                            md = MarkdownIt('commonmark')
-                            post["content"] = md.render(post["content"])
-                except Exception as e:
-                    print('Error: URL =', url)
-                    print(e)
-        except Exception as e:
-            print('Error: URL =', url)
-            print(e)
+    # Posts from other connected nodes, pulled by the sync_remote_posts command
+    remote_posts = RemotePost.objects.filter(unlisted=False).order_by('-published')[:REMOTE_POSTS_SIZE]
+    foreign_posts = [remote_post.data for remote_post in remote_posts]
+    for remote_post, post in zip(remote_posts, foreign_posts):
+        if remote_post.content_hash:
+            # rendered when the post was pulled, see render_content
+            post["content"] = remote_post.content_html
     # print(foreign_posts)
     context = {
         # 'posts': posts,
@@ -64,7 +44,11 @@ def display_public_posts(request):
     return render(request, 'posts/public_posts.html', context)
 
 def display_private_posts(request):
-    posts = Post.objects.filter(visibility='PRIVATE').filter(recipient=request.user.id)
+    # FRIENDS posts of the friends of the user, and PRIVATE posts sent to the user
+    posts = Post.objects.filter(get_readable_posts_q(request.user.id)) \
+                        .select_related('author', 'share_from', 'shared_post') \
+                        .prefetch_related('liked') \
+                        .order_by('-published')
     context = {
         'posts': posts,
         'author': request.user,
@@ -77,7 +61,7 @@ def get_post_comments(post):
     return comments
 
 def display_own_posts(request):
-    posts = Post.objects.filter(author=request.user).order_by('-published')
+    posts = Post.objects.filter(author=request.user).select_related('shared_post').order_by('-published')
 
     return render(request, 'posts/own_posts.html', {'posts': posts})
 
@@ -97,6 +81,7 @@ def edit_post(request, id):
         obj.visibility = form['visibility'].value()
         print(obj.visibility)
         obj.save()
+        clear_audience(obj)
 
         return redirect("/")
     else:
@@ -119,48 +104,36 @@ def delete_post(request, id):
 
     return redirect("/")
 
-def create_post(form, author, visibility='PUBLIC', recipient='', share_from=''):
+def create_post(form, author, visibility='PUBLIC', audience=(), share_from=''):
+    '''
+    Saves the post of form. A PRIVATE post is saved once, and audience is the ids of
+    the authors it is sent to. A FRIENDS post is read by the friends of its author.
+    '''
     obj = form.save(commit=False)  
     obj.author = author
     obj.visibility = visibility
-    if recipient is not '':
-        obj.recipient = recipient
-    if share_from is not '':
+    if share_from != '':
         obj.share_from = share_from
 
-    # TODO set proper URls
-    obj.source = ""
-    obj.origin = ""
-
+    # source and origin are set to the url of the post upon save
     obj.save()
+    set_audience(obj, audience)
+    enqueue('POST', obj, author)
+
+def set_audience(post, audience):
+    '''Adds the authors whose ids are in audience to the readers of post.'''
+    PostAudience.objects.bulk_create([PostAudience(post=post, recipient_id=recipient) for recipient in audience],
+                                     ignore_conflicts=True)
 
 def get_friends_list(request):
-    f_qs_list = []
-    friends_list = []
-    authors = Friends.objects.filter(sender=request.user, status='accepted').values_list('receiver', flat=True)
-    for qs in authors:
-        cross_qs = Friends.objects.filter(sender=qs, receiver=request.user, status='accepted').count()
-        if cross_qs > 0:
-            f_qs_list.append(qs)
-    f_qs = Author.objects.filter(id__in=f_qs_list)
-    for qs in f_qs:
-        if qs.id in authors:
-            friends_list.append(qs.id)
-    return friends_list
+    '''Returns the ids of the local friends of the user, see FriendsCache.'''
+    return friends_cache.get_local_ids(request.user.id)
 
 def new_post(request):
     if request.method == "POST":
         form = PostForm(request.POST)
         form.save(commit=False)
-        if form.cleaned_data["visibility"] == "FRIENDS":
-            friends = get_friends_list(request)
-            for friend in friends:
-                form = PostForm(request.POST)
-                form.save(commit=False)
-                create_post(form, request.user, 'PRIVATE', friend)
-
-        else:
-            create_post(form, request.user, form.cleaned_data["visibility"])
+        create_post(form, request.user, form.cleaned_data["visibility"])
     #     # print(post)
     #     #TODO: send this post to appropriate inboxes
     #     #-----------------------------
@@ -194,7 +167,7 @@ def new_post(request):
 def new_private_post(request):
     if request.method == "POST":
         form = PrivatePostForm(request.POST)
-        create_post(form, request.user, 'PRIVATE', request.POST.get('recipient'))
+        create_post(form, request.user, 'PRIVATE', [request.POST.get('recipient')])
 
         return redirect("/")
     else:
@@ -209,26 +182,18 @@ def new_private_post(request):
 
 def share_post(request, id):
     if request.method == "POST":   
-        obj = Post.objects.get(id=id)
-        if obj.visibility == "PUBLIC":
-            share_from = obj.author
-            obj.pk = None
-            #obj.save
-            obj.visibility = "PUBLIC"
-            obj.share_from = share_from
-            obj.author = request.user
-            obj.save()
-        else:
-            friends = get_friends_list(request)
-            for friend in friends:
-                obj = Post.objects.get(id=id)
-                share_from = obj.author
-                obj.pk = None
-                obj.visibility = "PRIVATE"
-                obj.share_from = share_from
-                obj.author = request.user
-                obj.recipient = friend
-                obj.save()
+        obj = Post.objects.select_related('author', 'shared_post').get(id=id)
+        # a share references the original post instead of copying its content
+        original = obj.get_content_post()
+        share, inserted = Post.objects.get_or_create(author=request.user, shared_post=original, defaults={
+            'visibility': "PUBLIC" if obj.visibility == "PUBLIC" else "FRIENDS",
+            'share_from': obj.author,
+            'content_type': original.content_type,
+            'source': obj.get_id_url(),
+            'origin': original.origin or original.get_id_url(),
+        })
+        if inserted:
+            enqueue('POST', share, request.user)
 
     return redirect("/")
 
@@ -239,6 +204,7 @@ def add_comment(request, id):
         author = request.user
         comment = Comment.objects.create(content=content, author=author, post=post)
         comment.save()
+        enqueue('COMMENT', comment, author)
         
     return redirect('/posts/')
 
@@ -250,13 +216,15 @@ def like_post1(request):
     if request.method == "POST":
         id = request.POST.get('post_id')
         post = Post.objects.get(id=id)
-        like, inserted = Like.objects.get_or_create(author=request.user, object_url=post.get_id_url())
+        like, inserted = Like.objects.create_like(object_type='POST',
+                                                  object_id=post.id,
+                                                  author_url=request.user.get_id_url(),
+                                                  author=request.user,
+                                                  object_url=post.get_id_url())
         if not inserted:
             post.liked.remove(request.user)
-            rec = Like.objects.get(author=request.user, object_url=post.get_id_url())
-            rec.delete()
+            Like.objects.delete_like(like)
         else:
             post.liked.add(request.user)
-            post.save()
-            like.save()
+            enqueue('LIKE', like, request.user)
     return redirect('/posts/')
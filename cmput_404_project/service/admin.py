@@ -1,6 +1,28 @@
 from django.contrib import admin
 
-from service.models import ServerNode
+from service.models import ServerNode, RemotePost, ServerNodeSync, OutboxActivity, OutboxDelivery, \
+                           InboxJournalEntry
+
+
+class ServerNodeSyncAdmin(admin.ModelAdmin):
+    list_display = ('node', 'watermark', 'last_succeeded', 'get_lag', 'last_reconciled', 'num_synced_posts',
+                    'num_removed_posts', 'num_runs', 'num_errors')
+    readonly_fields = ('get_lag',)
+
+
+class OutboxDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('activity', 'inbox_url', 'status', 'num_attempts', 'next_attempt', 'date_delivered')
+    list_filter = ('status', 'node')
+
+
+class InboxJournalEntryAdmin(admin.ModelAdmin):
+    list_display = ('author', 'node', 'status', 'date_created', 'date_processed')
+    list_filter = ('status', 'node')
 
 
 admin.site.register(ServerNode)
+admin.site.register(RemotePost)
+admin.site.register(ServerNodeSync, ServerNodeSyncAdmin)
+admin.site.register(OutboxActivity)
+admin.site.register(OutboxDelivery, OutboxDeliveryAdmin)
+admin.site.register(InboxJournalEntry, InboxJournalEntryAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service'
+
+    def ready(self):
+        # register signal receivers
+        from service import nodes, events, inbox
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import re
+import select
+import threading
+import time
+import uuid
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http.cookie import parse_cookie
+
+from social_distribution.models import InboxItem
+
+
+DEFAULT_SETTINGS = {
+    # 'local' notifies the clients connected to this process only. 'postgres' notifies
+    # the clients of every process through LISTEN/NOTIFY, including the items added by
+    # workers such as process_inbox. None uses 'postgres' if the database is PostgreSQL.
+    'BACKEND': None,
+    # seconds between heartbeats, which keep idle connections open through proxies
+    'HEARTBEAT': 15,
+    # max number of events queued per connection. When a slow client falls behind,
+    # the queued events are replaced by one "reset" event.
+    'QUEUE_SIZE': 16,
+    # max number of open connections per process
+    'MAX_CONNECTIONS': 200,
+}
+
+INBOX_EVENTS_PATH = re.compile(r'^/service/authors/(?P<author_id>[0-9a-fA-F-]{32,36})/inbox/events/?$')
+
+POSTGRES_CHANNEL = 'inbox_items'
+
+
+def get_config() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'EVENTS', {})}
+
+
+def get_backend() -> str:
+    '''Returns the BACKEND of the settings, or the backend of the database if it is not set.'''
+    backend = get_config()['BACKEND']
+    if backend is None:
+        backend = 'postgres' if connections['default'].vendor == 'postgresql' else 'local'
+    return backend
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class Subscription():
+    '''The events of an author's inbox, queued for one connection.'''
+
+    def __init__(self, author_id, queue_size):
+        self.author_id = author_id
+        self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # True if events were dropped since the client fell behind
+        self.overflowed = False
+
+    def put(self, event):
+        '''Queues event without waiting. Must be called from the event loop of the subscription.'''
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self) -> dict:
+        '''Returns the next event, or a "reset" event if events were dropped.'''
+        event = await self.queue.get()
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            event = {'type': 'reset'}
+        return event
+
+
+class InboxNotifier():
+    '''
+    Sends the events of inboxes to the connections of their authors in this process.
+
+    publish() can be called from any thread, e.g. from a sync view, and never waits for a client.
+    With the 'postgres' backend, a listener thread also forwards the events published by other processes.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._num_subscriptions = 0
+        self._listener = None
+
+    def subscribe(self, author_id) -> Subscription:
+        '''
+        Returns a new Subscription to the events of author_id.
+
+        Raises TooManyConnections if MAX_CONNECTIONS subscriptions are open in this process.
+        '''
+        config = get_config()
+        with self._lock:
+            if self._num_subscriptions >= config['MAX_CONNECTIONS']:
+                raise TooManyConnections()
+            subscription = Subscription(str(author_id), config['QUEUE_SIZE'])
+            self._subscriptions.setdefault(subscription.author_id, set()).add(subscription)
+            self._num_subscriptions += 1
+
+        if get_backend() == 'postgres':
+            self._start_listener()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.author_id, set())
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                self._num_subscriptions -= 1
+            if not subscriptions:
+                self._subscriptions.pop(subscription.author_id, None)
+
+    def get_num_connections(self) -> int:
+        return self._num_subscriptions
+
+    def publish(self, author_id, event):
+        '''Sends event to the connections of author_id in this process.'''
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(author_id), ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='inbox-events', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        '''Publishes the notifications of the POSTGRES_CHANNEL to the connections of this process.'''
+        import psycopg2
+
+        while True:
+            try:
+                conn = psycopg2.connect(**connections['default'].get_connection_params())
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN {POSTGRES_CHANNEL}')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish(conn.notifies.pop(0).payload, {'type': 'inbox'})
+            except psycopg2.Error:
+                # reconnect
+                time.sleep(5)
+
+
+inbox_notifier = InboxNotifier()
+
+
+def notify_inbox(author_ids):
+    '''
+    Notifies the connections of author_ids that items were added to their inbox,
+    once the current transaction is committed.
+    '''
+    author_ids = {str(author_id) for author_id in author_ids}
+    if author_ids:
+        transaction.on_commit(lambda: _publish(author_ids))
+
+
+def _publish(author_ids):
+    if get_backend() == 'postgres':
+        with connections['default'].cursor() as cursor:
+            for author_id in author_ids:
+                cursor.execute('SELECT pg_notify(%s, %s)', [POSTGRES_CHANNEL, author_id])
+    else:
+        for author_id in author_ids:
+            inbox_notifier.publish(author_id, {'type': 'inbox'})
+
+
+@receiver(post_save, sender=InboxItem)
+def notify_new_inbox_item(sender, instance, created, **kwargs):
+    '''Upon InboxItem creation, notify the connections of the author of the inbox.'''
+    if created:
+        notify_inbox([instance.inbox.author_id])
+
+
+class InboxEventsApp():
+    '''
+    ASGI app that streams the events of an author's inbox as Server-Sent Events.
+
+    GET /service/authors/<author_id>/inbox/events, signed in as the author.
+    An "inbox" event is sent when items are added to the inbox, and a "reset" event when events
+    were dropped because the client fell behind. In both cases, the client fetches the new items
+    with ?since=. Connections are held by the event loop, not by a worker thread.
+    '''
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] != 'GET':
+            await self._send_response(send, 405, b'Method not allowed', [(b'allow', b'GET')])
+            return
+
+        author_id = self._get_author_id(scope['path'])
+        if author_id is None or author_id != await self._get_user_id(scope):
+            await self._send_response(send, 403, b"You do not have permission to access this author's inbox.")
+            return
+
+        try:
+            subscription = inbox_notifier.subscribe(author_id)
+        except TooManyConnections:
+            await self._send_response(send, 503, b'Too many connections', [(b'retry-after', b'30')])
+            return
+
+        try:
+            await self._stream(subscription, receive, send)
+        finally:
+            inbox_notifier.unsubscribe(subscription)
+
+    async def _stream(self, subscription, receive, send):
+        heartbeat = get_config()['HEARTBEAT']
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await self._send_body(send, 'retry: 5000\n\n')
+
+        disconnect = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            while True:
+                event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait([event, disconnect], timeout=heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    event.cancel()
+                    return
+                if event in done:
+                    data = event.result()
+                    await self._send_body(send, f'event: {data["type"]}\ndata: {json.dumps(data)}\n\n')
+                else:
+                    event.cancel()
+                    await self._send_body(send, ': heartbeat\n\n')
+        finally:
+            disconnect.cancel()
+
+    async def _wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    async def _send_body(self, send, text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    async def _send_response(self, send, status, body, headers=()):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain')] + list(headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _get_author_id(self, path) -> str:
+        match = INBOX_EVENTS_PATH.match(path)
+        try:
+            return str(uuid.UUID(match.group('author_id')))
+        except (AttributeError, ValueError):
+            return None
+
+    async def _get_user_id(self, scope) -> str:
+        '''Returns the id of the author signed in with the session cookie of the request, or None.'''
+        cookie = b''
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookie = value
+        session_key = parse_cookie(cookie.decode('latin-1')).get(settings.SESSION_COOKIE_NAME)
+        if session_key is None:
+            return None
+        return await sync_to_async(self._get_session_user_id)(session_key)
+
+    def _get_session_user_id(self, session_key) -> str:
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = get_user(SimpleNamespace(session=session))
+        return str(user.id) if user.is_authenticated else None
+
+
+inbox_events_application = InboxEventsApp()
@@ -0,0 +1,135 @@
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from datetime import datetime, timezone
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from service.federation import federation_client
+
+
+DEFAULT_SETTINGS = {
+    # max number of requests in flight per fan-out
+    'MAX_WORKERS': 10,
+    # seconds all requests of a fan-out must finish in
+    'DEADLINE': 10,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class FanOut():
+    '''
+    Runs requests to other nodes concurrently in a bounded thread pool.
+
+    All requests share one deadline. Requests that fail or do not finish before the deadline
+    are dropped, so the results can be partial.
+
+    Example Usage:
+
+        with FanOut() as fan_out:
+            futures = [fan_out.submit(get_items, url, node) for url in urls]
+            for future, items in fan_out.as_completed(futures):
+                ...
+    '''
+
+    def __init__(self, deadline=None, max_workers=None):
+        config = {**DEFAULT_SETTINGS, **getattr(settings, 'FANOUT', {})}
+        self.deadline = time.monotonic() + (deadline if deadline is not None else config['DEADLINE'])
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config['MAX_WORKERS'])
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def get_remaining(self) -> float:
+        '''Returns the seconds left until the deadline.'''
+        return max(self.deadline - time.monotonic(), 0)
+
+    def submit(self, fn, *args, **kwargs):
+        '''Schedules fn(*args, **kwargs) and returns its Future.'''
+        future = self._executor.submit(fn, *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def as_completed(self, futures):
+        '''
+        Yields (future, result) for each future in futures that succeeds before the deadline,
+        in the order they complete.
+        '''
+        try:
+            for future in as_completed(futures, timeout=self.get_remaining()):
+                try:
+                    yield future, future.result()
+                except Exception as e:
+                    logger.warning('Request failed: %r', e)
+        except TimeoutError:
+            logger.warning('Deadline exceeded, %d requests dropped', len([f for f in futures if not f.done()]))
+
+    def shutdown(self):
+        '''Drops pending requests and lets running requests finish in the background.'''
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+def get_items(url, node) -> list:
+    '''Makes a GET request to a paginated list of node and returns its items.'''
+    response = federation_client.get(url, node=node)
+    response.raise_for_status()
+    return response.json()['items']
+
+
+def fetch_author_lists(nodes, deadline=None) -> dict:
+    '''
+    Returns a dict that maps the id of each node in nodes to the list of its authors.
+
+    Nodes that fail or do not respond before the deadline are left out.
+    '''
+    with FanOut(deadline) as fan_out:
+        futures = {fan_out.submit(get_items, f'{node.host}/authors/', node): node for node in nodes}
+        return {futures[future].id: authors for future, authors in fan_out.as_completed(futures)}
+
+
+def fetch_posts(nodes, author_filter=None, deadline=None) -> list:
+    '''
+    Returns the posts of the authors of nodes, ordered from the newest to the oldest.
+
+    The author list of every node and the post list of every author are requested concurrently.
+    If author_filter is given, only the posts of the authors for which it returns True are requested.
+    Nodes and authors that fail or do not respond before the deadline are left out.
+    '''
+    posts = []
+    with FanOut(deadline) as fan_out:
+        author_futures = {fan_out.submit(get_items, f'{node.host}/authors/', node): node for node in nodes}
+        post_futures = []
+        for future, authors in fan_out.as_completed(author_futures):
+            node = author_futures[future]
+            for author in authors:
+                if author_filter is None or author_filter(author):
+                    post_futures.append(fan_out.submit(get_items, author['url'] + '/posts/', node))
+
+        for future, items in fan_out.as_completed(post_futures):
+            posts.extend(items)
+
+    return sort_by_published(posts)
+
+
+def sort_by_published(objects) -> list:
+    '''Returns objects ordered by their "published" field, from the newest to the oldest.'''
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+
+    def get_published(obj):
+        try:
+            published = parse_datetime(obj.get('published') or '')
+        except ValueError:
+            published = None
+        if published is None:
+            return oldest
+        return published if published.tzinfo else published.replace(tzinfo=timezone.utc)
+
+    return sorted(objects, key=get_published, reverse=True)
@@ -0,0 +1,140 @@
+import threading
+import requests
+
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+from service.dispatch import dispatch_local, resolve_local
+from service.models import ServerNode
+from service.nodes import server_node_index
+from service.requests import get_server_node
+
+
+DEFAULT_SETTINGS = {
+    # retries of idempotent requests (GET, HEAD, OPTIONS) on connection errors and 502/503/504
+    'MAX_RETRIES': 2,
+    # sleep between retries is BACKOFF_FACTOR * (2 ** (retry - 1)) seconds
+    'BACKOFF_FACTOR': 0.3,
+}
+
+
+class FederationClient():
+    '''
+    HTTP client for all requests to other nodes.
+
+    Each node gets its own requests.Session, so connections are kept alive and reused.
+    The timeouts, the size of the connection pool and the max number of concurrent requests
+    are taken from the ServerNode of the url. Requests to a ServerNode are authorized with
+    its sending credential.
+
+    Requests to the service api of the local ServerNode are dispatched to the view in this
+    process instead, see service/dispatch.py.
+
+    Example Usage:
+
+        response = federation_client.get(url)
+        response = federation_client.post(url, json=data)
+    '''
+
+    IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS']
+
+    def __init__(self, **options):
+        config = {**DEFAULT_SETTINGS, **getattr(settings, 'FEDERATION_CLIENT', {}), **options}
+        self.max_retries = config['MAX_RETRIES']
+        self.backoff_factor = config['BACKOFF_FACTOR']
+
+        self._sessions = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs) -> requests.Response:
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def request(self, method, url, node=None, **kwargs) -> requests.Response:
+        '''
+        Makes a request to url and returns the response.
+
+        If node is not given, it is looked up from the url. Unless auth or an Authorization header
+        is given, the request is authorized with the sending credential of the node.
+        If the node is local, the service view of the url is called without a socket.
+
+        Raises requests.RequestException if the request fails.
+        '''
+        if node is None:
+            node = get_server_node(url)
+
+        if node and node.is_local:
+            match = resolve_local(url)
+            if match is not None:
+                # no loopback request, which could wait for a worker held by this request
+                return dispatch_local(method, url, node, match=match, **kwargs)
+
+        max_connections = node.max_connections if node else ServerNode.DEFAULT_MAX_CONNECTIONS
+        if node:
+            kwargs.setdefault('timeout', (node.connect_timeout, node.read_timeout))
+            headers = kwargs.get('headers') or {}
+            if 'auth' not in kwargs and 'Authorization' not in headers:
+                kwargs['headers'] = {**headers, 'Authorization': server_node_index.get_authorization_header(node)}
+        else:
+            kwargs.setdefault('timeout', (ServerNode.DEFAULT_CONNECT_TIMEOUT, ServerNode.DEFAULT_READ_TIMEOUT))
+
+        key = self._get_key(url)
+        session = self._get_session(key, max_connections)
+        with self._get_semaphore(key, max_connections):
+            return session.request(method, url, **kwargs)
+
+    def close(self):
+        '''Closes all sessions and their connections.'''
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._semaphores.clear()
+
+    def _get_key(self, url) -> str:
+        o = urlparse(url)
+        return f'{o.scheme}://{o.netloc}'
+
+    def _get_session(self, key, max_connections) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                retry = Retry(total=self.max_retries,
+                              backoff_factor=self.backoff_factor,
+                              status_forcelist=[502, 503, 504],
+                              allowed_methods=self.IDEMPOTENT_METHODS,
+                              raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=max_connections,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+            return session
+
+    def _get_semaphore(self, key, max_connections) -> threading.BoundedSemaphore:
+        with self._lock:
+            size, semaphore = self._semaphores.get(key, (None, None))
+            if size != max_connections:
+                # the cap of the node was changed
+                semaphore = threading.BoundedSemaphore(max_connections)
+                self._semaphores[key] = (max_connections, semaphore)
+            return semaphore
+
+
+federation_client = FederationClient()
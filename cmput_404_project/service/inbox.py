@@ -0,0 +1,564 @@
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, DatabaseError
+from django.db.models import Q, F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from service.events import notify_inbox
+from service.models import InboxJournalEntry
+from social_distribution.friends import friends_cache
+from social_distribution.models import Author, Follower, Post, Like, Comment, Inbox, InboxItem, FollowRequest
+
+
+VALID_OBJECT_TYPES = {
+    'post': 'POST',
+    'comment': 'COMMENT',
+    'follow': 'FOLLOW',
+    'like': 'LIKE',
+}
+
+# max length of the urls saved with an object, see InboxItem.object_url
+URL_MAX_LENGTH = InboxItem._meta.get_field('object_url').max_length
+
+DEFAULT_SETTINGS = {
+    # if True, objects sent to an inbox are journaled and saved later by the process_inbox command.
+    # A request can also ask for it with the "Prefer: respond-async" header.
+    'ASYNC': False,
+    # max number of journaled objects processed per run
+    'BATCH_SIZE': 100,
+    # seconds an item is kept in an inbox, or None to keep items forever
+    'MAX_AGE': 60 * 60 * 24 * 90,
+    # max number of items kept in an inbox, or None for no limit. The oldest items are removed first.
+    'MAX_ITEMS': 1000,
+    # number of items removed per DELETE, so that a purge never locks the table for long
+    'PURGE_CHUNK_SIZE': 500,
+}
+
+
+def get_config() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'INBOX', {})}
+
+
+def get_inbox(author) -> Inbox:
+    '''Returns the inbox of the author, and creates it if it doesn't exist.'''
+    inbox = Inbox.objects.filter(author=author).first()
+    if inbox is None:
+        inbox = Inbox.objects.create(author=author)
+    return inbox
+
+
+def get_object_type(data) -> str:
+    '''
+    Returns the InboxItem object type of the object in data.
+
+    Raises ValueError if the type is invalid.
+    '''
+    t = data['type'].strip().lower()
+    if t not in VALID_OBJECT_TYPES:
+        raise ValueError('The type of the object is invalid')
+    return VALID_OBJECT_TYPES[t]
+
+
+def save_inbox_object(data, author=None):
+    '''
+    Validates the object in data sent to the inbox of author, and saves it if it is a like or a follow.
+
+    Returns (object_type, object_id, object_url) of the InboxItem of the object.
+    object_id is the id of the object if it is on this server, otherwise object_url is its id url.
+
+    Raises KeyError or ValueError if the object is invalid.
+    '''
+    object_type = get_object_type(data)
+
+    if object_type in ['POST', 'COMMENT']:
+        model = Post if object_type == 'POST' else Comment
+        obj = model.objects.filter(id=_parse_uuid(data['id'])).first()
+        if obj is not None:
+            return object_type, obj.id, obj.get_id_url()
+        return object_type, None, data['id']
+
+    if object_type == 'FOLLOW':
+        if author is None:
+            raise ValueError('A follow object must be sent to the inbox of the followed author')
+        return object_type, create_follow_request(data, author).id, None
+
+    return object_type, create_like(data).id, None
+
+
+def save_inbox_objects(data_list, author) -> list:
+    '''
+    Saves the objects in data_list sent to the inbox of author, and adds them to the inbox.
+
+    The objects are checked like in save_inbox_object, but the existence checks and the inserts
+    of all objects are made in bulk, with a constant number of queries. If the database rejects
+    the inserts, the objects are saved again one by one, each in its own savepoint.
+
+    Returns a list with a {'status', 'message'} dict per object of data_list. status is 201 if
+    the object is added to the inbox, 200 if it is already in the inbox, including when it was
+    added concurrently, and 400 if it is invalid.
+    '''
+    results = [None] * len(data_list)
+    items = {}
+    for i, data in enumerate(data_list):
+        try:
+            items[i] = _parse_inbox_object(data, author)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            results[i] = _get_error_result(e)
+
+    # the local objects and authors the objects refer to
+    object_ids = {item['object_id'] for item in items.values()} - {None}
+    posts = Post.objects.select_related('author').in_bulk(object_ids)
+    comments = Comment.objects.select_related('post__author').in_bulk(object_ids - set(posts))
+    authors = Author.objects.in_bulk({item.get('author_id') for item in items.values()} - {None})
+    followed = FollowRequest.objects.filter(to_author=author,
+                                            from_author_url__in=[item['actor_url'] for item in items.values()
+                                                                 if item['type'] == 'FOLLOW'])
+    followed = set(followed.values_list('from_author_url', flat=True))
+
+    entries = {}
+    likes = {}
+    follow_requests = []
+    for i, item in items.items():
+        object_type, object_id = item['type'], item['object_id']
+        if object_type in ['POST', 'COMMENT']:
+            obj = (posts if object_type == 'POST' else comments).get(object_id)
+            entries[i] = (object_type, obj.id, obj.get_id_url()) if obj is not None else (object_type, None, item['url'])
+
+        elif object_type == 'LIKE':
+            if object_id in posts:
+                like_type = Like.OBJECT_TYPE_CHOICES[0][0]
+            elif object_id in comments:
+                like_type = Like.OBJECT_TYPE_CHOICES[1][0]
+            else:
+                results[i] = _get_error_result(
+                    ValueError('object id: %s is not associated with this author' % item['url'].split('/')[-1]))
+                continue
+            likes[i] = Like(object_type=like_type,
+                            object_id=object_id,
+                            object_url=item['url'],
+                            author=authors.get(item['author_id']),
+                            author_url=item['author_url'])
+
+        else:
+            if item['actor_url'] in followed:
+                results[i] = _get_error_result(ValueError('Follow request is already sent'))
+                continue
+            followed.add(item['actor_url'])
+            follow_request = FollowRequest(from_author=authors.get(item['author_id']),
+                                           from_author_url=item['actor_url'],
+                                           to_author=author,
+                                           to_author_url=author.get_id_url())
+            follow_requests.append(follow_request)
+            entries[i] = (object_type, follow_request.id, None)
+
+    try:
+        with transaction.atomic():
+            saved_likes = Like.objects.create_likes(list(likes.values()))
+            for i, (like, created) in zip(likes, saved_likes):
+                entries[i] = ('LIKE', like.id, None)
+            FollowRequest.objects.bulk_create(follow_requests)
+            if follow_requests:
+                # bulk_create does not send post_save
+                friends_cache.invalidate([author.id] + [f.from_author_id for f in follow_requests])
+
+            inbox = get_inbox(author)
+            existing = InboxItem.objects.filter(inbox=inbox) \
+                                        .filter(Q(object_id__in=[e[1] for e in entries.values() if e[1] is not None]) |
+                                                Q(object_url__in=[e[2] for e in entries.values() if e[1] is None]))
+            existing = {object_id or object_url for object_id, object_url in existing.values_list('object_id', 'object_url')}
+
+            # the items of this insert are told apart from the items added concurrently by their date_created
+            now = timezone.now()
+            inbox_items = {}
+            for i, (object_type, object_id, object_url) in sorted(entries.items()):
+                key = object_id or object_url
+                if key in existing:
+                    results[i] = {'status': 200, 'message': 'The object is already in the inbox'}
+                    continue
+                existing.add(key)
+                inbox_items[i] = InboxItem(inbox=inbox, object_type=object_type, object_id=object_id,
+                                           object_url=object_url, date_created=now)
+            # items added concurrently are ignored
+            InboxItem.objects.bulk_create(list(inbox_items.values()), ignore_conflicts=True)
+            if inbox_items:
+                inserted = InboxItem.objects.filter(inbox=inbox, date_created=now).values_list('object_id', 'object_url')
+                inserted = {object_id or object_url for object_id, object_url in inserted}
+                for i, item in inbox_items.items():
+                    if (item.object_id or item.object_url) in inserted:
+                        results[i] = {'status': 201, 'message': 'The object is added to the inbox'}
+                    else:
+                        results[i] = {'status': 200, 'message': 'The object is already in the inbox'}
+                if inserted:
+                    add_unread_counts({inbox.id: len(inserted)})
+                    notify_inbox([author.id])
+
+    except DatabaseError:
+        if len(items) <= 1:
+            for i in items:
+                results[i] = _get_error_result(ValueError('The object could not be saved'))
+            return results
+        # an object that passed the checks above was rejected by the database, and the inserts
+        # of the batch were rolled back: save the objects one by one, so that only it fails
+        for i in items:
+            results[i] = save_inbox_objects([data_list[i]], author)[0]
+
+    return results
+
+
+def get_object_key(data) -> str:
+    '''
+    Returns the idempotency key of the object in data: the sha256 of the id of the object,
+    or of the whole object if it is invalid.
+    '''
+    try:
+        object_type = get_object_type(data)
+        if object_type in ['POST', 'COMMENT']:
+            key = f"{object_type} {data['id']}"
+        elif object_type == 'LIKE':
+            key = f"{object_type} {data['author']['id']} {data['object']}"
+        else:
+            key = f"{object_type} {data['actor']['url']}"
+    except (KeyError, ValueError, TypeError, AttributeError):
+        key = json.dumps(data, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def journal_inbox_objects(data_list, author, node=None):
+    '''
+    Journals the objects in data_list sent to the inbox of author by node, to be saved by process_journal.
+    Objects that are already journaled for author are skipped.
+    '''
+    entries = [InboxJournalEntry(author=author, node=node, key=get_object_key(data), payload=json.dumps(data))
+               for data in data_list]
+    InboxJournalEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def process_journal(batch_size=None) -> dict:
+    '''
+    Saves the oldest pending journaled objects with save_inbox_objects, one batch per author.
+
+    The entries are locked while they are processed, so that other workers skip them.
+    An entry whose object raises an error is marked FAILED, and the other entries are saved.
+    Returns the number of done and failed entries.
+    '''
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    counts = {'done': 0, 'failed': 0}
+    with transaction.atomic():
+        entries = InboxJournalEntry.objects.select_for_update(skip_locked=True, of=('self',)) \
+                                           .select_related('author') \
+                                           .filter(status='PENDING') \
+                                           .order_by('date_created')[:batch_size]
+        by_author = {}
+        for entry in entries:
+            by_author.setdefault(entry.author_id, []).append(entry)
+
+        now = timezone.now()
+        for author_entries in by_author.values():
+            results = _save_journal_entries(author_entries)
+            for entry, result in zip(author_entries, results):
+                entry.status = 'DONE' if result['status'] < 400 else 'FAILED'
+                entry.error = result['message'] if entry.status == 'FAILED' else ''
+                entry.date_processed = now
+                counts[entry.status.lower()] += 1
+
+        InboxJournalEntry.objects.bulk_update([e for entries in by_author.values() for e in entries],
+                                              ['status', 'error', 'date_processed'])
+    return counts
+
+
+def _save_journal_entries(entries) -> list:
+    '''
+    Saves the objects of the journaled entries of one author in a savepoint, and returns their results.
+    If that raises an error, the objects are saved one by one, each in its own savepoint, and the
+    result of an object that raises is a 400 with the error.
+    '''
+    author = entries[0].author
+    try:
+        with transaction.atomic():
+            return save_inbox_objects([json.loads(entry.payload) for entry in entries], author)
+    except Exception as e:
+        if len(entries) == 1:
+            return [_get_error_result(e)]
+
+    results = []
+    for entry in entries:
+        try:
+            with transaction.atomic():
+                results += save_inbox_objects([json.loads(entry.payload)], author)
+        except Exception as e:
+            results.append(_get_error_result(e))
+    return results
+
+
+def _parse_inbox_object(data, author) -> dict:
+    '''
+    Returns the fields of the object in data sent to the inbox of author, without any query.
+
+    Raises KeyError or ValueError if the object is invalid.
+    '''
+    object_type = get_object_type(data)
+    if object_type in ['POST', 'COMMENT']:
+        return {'type': object_type, 'object_id': _parse_uuid(data['id']), 'url': _get_url(data['id'])}
+
+    if object_type == 'LIKE':
+        context = data['@context']
+        if context != Like.context:
+            raise ValueError('Invalid context: %s' % context)
+        return {'type': object_type,
+                'object_id': _parse_uuid(data['object']),
+                'url': _get_url(data['object']),
+                'author_id': _parse_uuid(data['author']['id']),
+                'author_url': _get_url(data['author']['id'])}
+
+    if _parse_uuid(data['object']['id']) != author.id:
+        raise ValueError('Target author and to_author in follow object must be equal')
+    return {'type': object_type,
+            'object_id': None,
+            'author_id': _parse_uuid(data['actor']['id']),
+            'actor_url': _get_url(data['actor']['url'])}
+
+
+def _get_url(url) -> str:
+    '''
+    Returns url if it can be saved as a url of an object.
+
+    Raises ValueError if it is missing or too long.
+    '''
+    if not isinstance(url, str) or not url:
+        raise ValueError('A url of the object is missing')
+    if len(url) > URL_MAX_LENGTH:
+        raise ValueError(f'A url of the object is longer than {URL_MAX_LENGTH} characters')
+    return url
+
+
+def _get_error_result(e) -> dict:
+    return {'status': 400, 'message': str(e) if str(e) != '' else 'The object is invalid'}
+
+
+def _parse_uuid(url):
+    '''Returns the uuid at the end of url, or None if it is not a uuid of this server.'''
+    try:
+        return uuid.UUID(url.rstrip('/').split('/')[-1])
+    except ValueError:
+        return None
+
+
+def create_like(data_dict) -> Like:
+    '''
+    Create a Like from data_dict, and increment the like count of the liked object.
+    If the author already liked the object, the existing Like is returned.
+
+    Raises ValueError if
+        - @context is invalid, or
+        - object id in data_dict is not associated with the author
+    '''
+
+    context = data_dict['@context']
+    if context != Like.context:
+        raise ValueError('Invalid context: %s' % context)
+    like_author_id = data_dict['author']['id'].split('/')[-1]
+    like_author = None  # can be local or remote author
+    if Author.objects.filter(id=like_author_id).exists():
+        # is a local author
+        like_author = Author.objects.get(id=like_author_id)
+    like_author_url = data_dict['author']['id']
+    object_url = data_dict['object']
+
+    # object id must exist in our database
+    object_id = object_url.split('/')[-1]
+
+    if Post.objects.filter(id=object_id).exists():
+        object_type = Like.OBJECT_TYPE_CHOICES[0][0]
+    elif Comment.objects.filter(id=object_id).exists():
+        object_type = Like.OBJECT_TYPE_CHOICES[1][0]
+    else:
+        raise ValueError('object id: %s is not associated with this author' % object_id)
+
+    like, created = Like.objects.create_like(object_type=object_type,
+                                             object_id=object_id,
+                                             author_url=like_author_url,
+                                             author=like_author,
+                                             object_url=object_url)
+    return like
+
+
+def create_follow_request(data_dict, author: Author) -> FollowRequest:
+    '''
+    Creates a FollowRequest between the two authors in data_dict.
+
+    Raises a ValueError if
+        - FollowRequest between the two authors already exists, or
+        - author in the request and author in the data_dict are not equal.
+    '''
+    # from_author can be from remote server
+    from_author_id = data_dict['actor']['id'].split('/')[-1]
+    if Author.objects.filter(id=from_author_id).exists():
+        from_author = Author.objects.get(id=from_author_id)
+    else:
+        from_author = None
+    from_author_url = data_dict['actor']['url']
+
+    to_author_id = data_dict['object']['id'].split('/')[-1]
+    to_author = get_object_or_404(Author, id=to_author_id)
+    if author != to_author:
+        # assert target author is the author in the request
+        raise ValueError('Target author and to_author in follow object must be equal')
+
+    if FollowRequest.objects.filter(from_author_url=from_author_url, to_author=author).exists():
+        # raise an exception if follow request between the two author already exists
+        raise ValueError('Follow request is already sent')
+
+    return FollowRequest.objects.create(from_author=from_author,
+                                        from_author_url=from_author_url,
+                                        to_author=author,
+                                        to_author_url=author.get_id_url())
+
+
+def add_to_inboxes(authors, object_type, object_id, object_url) -> int:
+    '''
+    Adds the object to the inboxes of authors with one bulk insert.
+    Inboxes that already have the object are skipped. Returns the number of created InboxItems.
+    '''
+    inboxes = {inbox.author_id: inbox for inbox in Inbox.objects.filter(author__in=authors)}
+    missing = [Inbox(author=author) for author in authors if author.id not in inboxes]
+    if missing:
+        Inbox.objects.bulk_create(missing)
+        inboxes.update((inbox.author_id, inbox) for inbox in Inbox.objects.filter(author__in=[i.author for i in missing]))
+
+    if object_id is not None:
+        existing = InboxItem.objects.filter(inbox__in=inboxes.values(), object_id=object_id)
+    else:
+        existing = InboxItem.objects.filter(inbox__in=inboxes.values(), object_url=object_url)
+    existing = set(existing.values_list('inbox_id', flat=True))
+
+    # the items of this insert are told apart from the items added concurrently by their date_created
+    now = timezone.now()
+    items = [InboxItem(inbox=inbox, object_type=object_type, object_id=object_id, object_url=object_url,
+                       date_created=now)
+             for inbox in inboxes.values() if inbox.id not in existing]
+    # items added concurrently are ignored
+    InboxItem.objects.bulk_create(items, ignore_conflicts=True)
+    if not items:
+        return 0
+
+    inserted = InboxItem.objects.filter(inbox__in=[item.inbox for item in items], date_created=now)
+    if object_id is not None:
+        inserted = inserted.filter(object_id=object_id)
+    else:
+        inserted = inserted.filter(object_url=object_url)
+    inserted = set(inserted.values_list('inbox_id', flat=True))
+    add_unread_counts({inbox_id: 1 for inbox_id in inserted})
+    notify_inbox({inbox.author_id for inbox in inboxes.values() if inbox.id in inserted})
+    return len(inserted)
+
+
+def get_local_followers(author_url) -> list:
+    '''
+    Returns the local authors that follow the author of author_url.
+
+    A local author follows a local author through a Follower or Author.followers, and follows
+    a remote author by having sent them a FollowRequest.
+    '''
+    author_url = author_url.rstrip('/')
+    author = Author.objects.filter(id=_parse_uuid(author_url)).first()
+    if author is None:
+        return list(Author.objects.filter(follow_request_from__to_author_url=author_url).distinct())
+
+    follower_ids = Follower.objects.filter(target_author=author, source_author_id__isnull=False) \
+                                   .values_list('source_author_id', flat=True)
+    return list(Author.objects.filter(Q(id__in=follower_ids) | Q(followers=author)).distinct())
+
+
+def delete_in_chunks(queryset, chunk_size=None) -> int:
+    '''
+    Deletes the InboxItems of queryset with one short DELETE per chunk_size items.
+    Returns the number of deleted items.
+    '''
+    chunk_size = chunk_size or get_config()['PURGE_CHUNK_SIZE']
+    num_deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return num_deleted
+        num_deleted += InboxItem.objects.filter(id__in=ids).delete()[0]
+
+
+def clear_inbox(inbox) -> int:
+    '''Removes all items of inbox, in chunks. Returns the number of removed items.'''
+    num_deleted = delete_in_chunks(InboxItem.objects.filter(inbox=inbox))
+    recount_unread(Inbox.objects.filter(id=inbox.id))
+    return num_deleted
+
+
+def purge_inboxes(chunk_size=None) -> dict:
+    '''
+    Enforces the retention policy: removes the items older than MAX_AGE, and the oldest items
+    of the inboxes that have more than MAX_ITEMS items.
+
+    Returns the number of expired items and of items over the cap that were removed.
+    '''
+    config = get_config()
+    counts = {'expired': 0, 'over_cap': 0}
+    if config['MAX_AGE'] is not None:
+        oldest = timezone.now() - timedelta(seconds=config['MAX_AGE'])
+        counts['expired'] = delete_in_chunks(InboxItem.objects.filter(date_created__lt=oldest), chunk_size)
+
+    if config['MAX_ITEMS'] is not None:
+        inbox_ids = InboxItem.objects.values('inbox').annotate(num_items=Count('id')) \
+                                     .filter(num_items__gt=config['MAX_ITEMS']).values_list('inbox', flat=True)
+        for inbox_id in list(inbox_ids):
+            q = InboxItem.objects.filter(inbox_id=inbox_id).order_by('-date_created', '-id')[config['MAX_ITEMS']:]
+            counts['over_cap'] += delete_in_chunks(q, chunk_size)
+
+    if any(counts.values()):
+        recount_unread(Inbox.objects.filter(unread_count__gt=0))
+    return counts
+
+
+def add_unread_counts(counts):
+    '''Adds counts[inbox_id] new items to the unread count of each inbox, with one UPDATE per distinct count.'''
+    inbox_ids = {}
+    for inbox_id, n in counts.items():
+        inbox_ids.setdefault(n, []).append(inbox_id)
+    for n, ids in inbox_ids.items():
+        Inbox.objects.filter(id__in=ids).update(unread_count=F('unread_count') + n)
+
+
+def recount_unread(inboxes):
+    '''Sets the unread count of inboxes to the number of their items after the read marker, with one UPDATE.'''
+    counts = InboxItem.objects.filter(inbox=OuterRef('pk'), id__gt=OuterRef('last_read_id')) \
+                              .order_by().values('inbox').annotate(num_items=Count('id')).values('num_items')
+    inboxes.update(unread_count=Coalesce(Subquery(counts), 0))
+
+
+def mark_read(inbox, item_id=None) -> Inbox:
+    '''
+    Marks the items of inbox up to item_id as read, or all of its items if item_id is None.
+    Returns the inbox with its updated read marker and unread count.
+    '''
+    with transaction.atomic():
+        # inserts wait for the marker to be saved, so that the count stays exact
+        inbox = Inbox.objects.select_for_update().get(id=inbox.id)
+        if item_id is None:
+            item_id = InboxItem.objects.filter(inbox=inbox).order_by('-id').values_list('id', flat=True).first() or 0
+        if item_id > inbox.last_read_id:
+            inbox.last_read_id = item_id
+            inbox.last_read_at = timezone.now()
+            inbox.unread_count = InboxItem.objects.filter(inbox=inbox, id__gt=item_id).count()
+            inbox.save(update_fields=['last_read_id', 'last_read_at', 'unread_count'])
+    return inbox
+
+
+@receiver(post_save, sender=InboxItem)
+def count_new_inbox_item(sender, instance, created, **kwargs):
+    '''Upon InboxItem creation, increment the unread count of its inbox.'''
+    if created:
+        add_unread_counts({instance.inbox_id: 1})
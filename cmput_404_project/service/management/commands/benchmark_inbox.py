@@ -0,0 +1,70 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction, IntegrityError
+
+from service.inbox import get_inbox, save_inbox_object, save_inbox_objects
+from social_distribution.models import Author, Post, InboxItem
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Measures how many inbox objects per second are saved one by one and in batches, '
+            'as when a node catches up after downtime. All changes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of objects sent to the inbox.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of objects per batch.')
+
+    def handle(self, *args, **options):
+        count, batch_size = options['count'], options['batch_size']
+        try:
+            with transaction.atomic():
+                author = Author.objects.create_user(username=f'benchmark-{uuid.uuid4()}', password='benchmark')
+                post = Post.objects.create(author=author, title='benchmark', content='benchmark')
+                inbox = get_inbox(author)
+
+                elapsed = self.run(self.get_objects(post, count), lambda objects: [
+                    self.save_one(inbox, author, data) for data in objects])
+                self.stdout.write(f'one by one: {count / elapsed:.0f} objects/s')
+
+                elapsed = self.run(self.get_objects(post, count), lambda objects: [
+                    save_inbox_objects(objects[i:i + batch_size], author) for i in range(0, len(objects), batch_size)])
+                self.stdout.write(f'batches of {batch_size}: {count / elapsed:.0f} objects/s')
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def get_objects(self, post, count) -> list:
+        '''Returns count likes and posts of remote authors, half of each.'''
+        objects = []
+        for i in range(count):
+            author_url = f'http://benchmark.example.com/service/authors/{uuid.uuid4()}'
+            if i % 2:
+                objects.append({'type': 'post', 'id': f'{author_url}/posts/{uuid.uuid4()}'})
+            else:
+                objects.append({'@context': 'https://www.w3.org/ns/activitystreams',
+                                'type': 'Like',
+                                'author': {'id': author_url},
+                                'object': post.get_id_url()})
+        return objects
+
+    def run(self, objects, save) -> float:
+        '''Returns the seconds save takes to save objects.'''
+        start = time.perf_counter()
+        save(objects)
+        return time.perf_counter() - start
+
+    def save_one(self, inbox, author, data):
+        '''Saves data the way InboxView saves a single object.'''
+        object_type, object_id, object_url = save_inbox_object(data, author)
+        try:
+            with transaction.atomic():
+                InboxItem.objects.create(inbox=inbox, object_type=object_type, object_id=object_id,
+                                         object_url=object_url)
+        except IntegrityError:
+            pass
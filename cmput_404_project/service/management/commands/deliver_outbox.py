@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.outbox import expand_activities, deliver_due
+
+
+class Command(BaseCommand):
+    help = 'Sends the new posts, comments, likes and follows of local authors to the inboxes of their recipients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds to wait between runs. If 0, drains the outbox once and exits.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Max number of activities expanded and deliveries sent per run.')
+        parser.add_argument('--deadline', type=float, default=None,
+                            help='Seconds the deliveries of one run must finish in.')
+
+    def handle(self, *args, **options):
+        while True:
+            while True:
+                num_expanded = expand_activities(options['batch_size'])
+                counts = deliver_due(options['batch_size'], options['deadline'])
+                if num_expanded or any(counts.values()):
+                    self.stdout.write(f'expanded {num_expanded} activities, delivered {counts["delivered"]}, '
+                                      f'retried {counts["retried"]}, dead {counts["dead"]}')
+                else:
+                    break
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
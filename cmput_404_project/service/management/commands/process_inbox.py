@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.inbox import process_journal
+
+
+class Command(BaseCommand):
+    help = 'Saves the objects that were accepted by the inboxes of local authors with 202.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds to wait between runs. If 0, drains the journal once and exits.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Max number of journaled objects processed per run.')
+
+    def handle(self, *args, **options):
+        while True:
+            while True:
+                counts = process_journal(options['batch_size'])
+                if any(counts.values()):
+                    self.stdout.write(f'processed {counts["done"]} objects, failed {counts["failed"]}')
+                else:
+                    break
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.inbox import purge_inboxes
+
+
+class Command(BaseCommand):
+    help = 'Removes the inbox items that are older than INBOX["MAX_AGE"] or over INBOX["MAX_ITEMS"] per inbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds to wait between runs. If 0, purges once and exits.')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Max number of items removed per DELETE.')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = purge_inboxes(options['chunk_size'])
+            if any(counts.values()):
+                self.stdout.write(f'removed {counts["expired"]} expired items, {counts["over_cap"]} items over the cap')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
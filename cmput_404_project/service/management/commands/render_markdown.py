@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from service.models import RemotePost
+from social_distribution.models import Post
+from social_distribution.rendering import render_all
+
+
+class Command(BaseCommand):
+    help = 'Renders the markdown content of the posts and remote posts that were saved before it was rendered upon save.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of posts read and updated at once.')
+        parser.add_argument('--force', action='store_true',
+                            help='Render all posts again, e.g. after MARKDOWN_RENDERER["PRESET"] was changed.')
+
+    def handle(self, *args, **options):
+        num_posts = render_all(Post.objects.all(),
+                               lambda post: (post.content_type, post.content),
+                               options['batch_size'], options['force'])
+        num_remote_posts = render_all(RemotePost.objects.all(),
+                                      lambda post: (post.data.get('contentType'), post.data.get('content')),
+                                      options['batch_size'], options['force'])
+        self.stdout.write(f'rendered {num_posts} posts, {num_remote_posts} remote posts')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from service.models import ServerNode
+from service.timeline import sync_node
+
+
+class Command(BaseCommand):
+    help = 'Pulls the new public posts of the remote nodes into the local RemotePost table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds to wait between syncs. If 0, syncs once and exits.')
+        parser.add_argument('--deadline', type=float, default=None,
+                            help='Seconds the sync of one node must finish in.')
+
+    def handle(self, *args, **options):
+        while True:
+            for node in ServerNode.objects.filter(is_local=False):
+                sync = sync_node(node, options['deadline'])
+                if sync.last_succeeded is not None and sync.last_succeeded >= sync.last_started:
+                    self.stdout.write(f'{node}: synced, watermark = {sync.watermark}')
+                else:
+                    self.stderr.write(f'{node}: {sync.last_error}')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-18 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0003_auto_20220325_1146'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servernode',
+            name='connect_timeout',
+            field=models.FloatField(default=3.05),
+        ),
+        migrations.AddField(
+            model_name='servernode',
+            name='max_connections',
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AddField(
+            model_name='servernode',
+            name='read_timeout',
+            field=models.FloatField(default=10),
+        ),
+    ]
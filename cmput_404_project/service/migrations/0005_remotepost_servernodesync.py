@@ -0,0 +1,53 @@
+# Generated by Django 3.2.12 on 2026-10-18 20:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0004_servernode_request_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServerNodeSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watermark', models.DateTimeField(default=None, null=True)),
+                ('last_started', models.DateTimeField(default=None, null=True)),
+                ('last_finished', models.DateTimeField(default=None, null=True)),
+                ('last_succeeded', models.DateTimeField(default=None, null=True)),
+                ('num_synced_posts', models.PositiveIntegerField(default=0)),
+                ('num_runs', models.PositiveIntegerField(default=0)),
+                ('num_errors', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('node', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync', to='service.servernode')),
+            ],
+            options={
+                'verbose_name': 'ServerNodeSync',
+            },
+        ),
+        migrations.CreateModel(
+            name='RemotePost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1000, unique=True)),
+                ('author_url', models.URLField(max_length=1000)),
+                ('published', models.DateTimeField()),
+                ('unlisted', models.BooleanField(default=False)),
+                ('data', models.JSONField(default=dict)),
+                ('date_synced', models.DateTimeField(default=django.utils.timezone.now)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='remote_posts', to='service.servernode')),
+            ],
+            options={
+                'verbose_name': 'RemotePost',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='remotepost',
+            index=models.Index(fields=['unlisted', '-published'], name='remotepost_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('service', '0005_remotepost_servernodesync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('POST', 'Post'), ('COMMENT', 'Comment'), ('LIKE', 'Like'), ('FOLLOW', 'Follow')], max_length=7)),
+                ('object_id', models.UUIDField()),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_expanded', models.BooleanField(db_index=True, default=False)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'OutboxActivity',
+                'verbose_name_plural': 'OutboxActivities',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inbox_url', models.URLField(max_length=1000)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DELIVERED', 'Delivered'), ('DEAD', 'Dead')], default='PENDING', max_length=9)),
+                ('num_attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('date_delivered', models.DateTimeField(default=None, null=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='service.outboxactivity')),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_deliveries', to='service.servernode')),
+            ],
+            options={
+                'verbose_name': 'OutboxDelivery',
+                'verbose_name_plural': 'OutboxDeliveries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxdelivery',
+            index=models.Index(fields=['status', 'next_attempt'], name='outboxdelivery_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='outboxdelivery',
+            constraint=models.UniqueConstraint(fields=('activity', 'inbox_url'), name='outboxdelivery_unique_inbox'),
+        ),
+    ]
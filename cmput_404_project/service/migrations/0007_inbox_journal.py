@@ -0,0 +1,43 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('service', '0006_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxJournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('payload', models.TextField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=7)),
+                ('error', models.TextField(blank=True, default='')),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_processed', models.DateTimeField(default=None, null=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_journal', to=settings.AUTH_USER_MODEL)),
+                ('node', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inbox_journal', to='service.servernode')),
+            ],
+            options={
+                'verbose_name': 'InboxJournalEntry',
+                'verbose_name_plural': 'InboxJournalEntries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inboxjournalentry',
+            index=models.Index(fields=['status', 'date_created'], name='inboxjournal_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='inboxjournalentry',
+            constraint=models.UniqueConstraint(fields=('author', 'key'), name='inboxjournal_unique_key'),
+        ),
+    ]
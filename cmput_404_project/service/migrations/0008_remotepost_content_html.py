@@ -0,0 +1,23 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0007_inbox_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remotepost',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='remotepost',
+            name='content_html',
+            field=models.TextField(default='', editable=False),
+        ),
+    ]
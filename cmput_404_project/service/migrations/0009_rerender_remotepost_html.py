@@ -0,0 +1,21 @@
+from django.db import migrations
+
+from social_distribution.rendering import render_all
+
+
+def rerender_remote_post_html(apps, schema_editor):
+    '''Renders the markdown remote posts again, so that the raw html stored in their content_html is escaped.'''
+    RemotePost = apps.get_model('service', 'RemotePost')
+    render_all(RemotePost.objects.exclude(content_hash=''),
+               lambda post: (post.data.get('contentType'), post.data.get('content')), force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0008_remotepost_content_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(rerender_remote_post_html, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.12 on 2026-10-18 22:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0009_rerender_remotepost_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servernodesync',
+            name='last_reconciled',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='servernodesync',
+            name='num_removed_posts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
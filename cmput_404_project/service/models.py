@@ -2,6 +2,7 @@ from django.db import models
 from django.dispatch import receiver 
 from django.db.models.signals import post_save 
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
 
 
 class ServerNode(models.Model):
@@ -9,16 +10,190 @@ class ServerNode(models.Model):
     class Meta:
         verbose_name = 'ServerNode'
 
+    DEFAULT_CONNECT_TIMEOUT = 3.05
+    DEFAULT_READ_TIMEOUT = 10
+    DEFAULT_MAX_CONNECTIONS = 10
+
     host = models.CharField(max_length=500, null=False)
     receiving_username = models.CharField(max_length=100, null=False, blank=True)
     receiving_password = models.CharField(max_length=128, null=False, blank=True)
     sending_username = models.CharField(max_length=100, null=False, blank=True)
     sending_password = models.CharField(max_length=128, null=False, blank=True)
     is_local = models.BooleanField(default=False)
+    # settings of outgoing requests to this node, see service/federation.py
+    connect_timeout = models.FloatField(default=DEFAULT_CONNECT_TIMEOUT)
+    read_timeout = models.FloatField(default=DEFAULT_READ_TIMEOUT)
+    max_connections = models.PositiveIntegerField(default=DEFAULT_MAX_CONNECTIONS)
 
     def __str__(self):
         return self.host
-    
+
+
+class RemotePost(models.Model):
+    '''
+    Local copy of a public post of a remote node. 
+
+    Remote posts are pulled by the sync_remote_posts command, so that the home feed
+    does not make requests to remote nodes.
+    '''
+
+    class Meta:
+        verbose_name = 'RemotePost'
+        indexes = [
+            models.Index(fields=['unlisted', '-published'], name='remotepost_feed_idx'),
+        ]
+
+    node = models.ForeignKey(ServerNode, on_delete=models.CASCADE, related_name='remote_posts')
+    # id url of the post in the remote node
+    url = models.URLField(max_length=1000, unique=True)
+    author_url = models.URLField(max_length=1000)
+    published = models.DateTimeField()
+    unlisted = models.BooleanField(default=False)
+    # post object as returned by the remote node
+    data = models.JSONField(default=dict)
+    # html of markdown content, rendered when the post is pulled, see social_distribution/rendering.py
+    content_html = models.TextField(default='', editable=False)
+    content_hash = models.CharField(max_length=64, default='', editable=False)
+    date_synced = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.url
+
+
+class ServerNodeSync(models.Model):
+    '''State and stats of the sync of remote posts from a node.'''
+
+    class Meta:
+        verbose_name = 'ServerNodeSync'
+
+    node = models.OneToOneField(ServerNode, on_delete=models.CASCADE, related_name='sync')
+    # newest published date of the posts pulled from the node
+    watermark = models.DateTimeField(null=True, default=None)
+    last_started = models.DateTimeField(null=True, default=None)
+    last_finished = models.DateTimeField(null=True, default=None)
+    last_succeeded = models.DateTimeField(null=True, default=None)
+    # start of the last sync that pulled all posts of the node and removed the missing ones
+    last_reconciled = models.DateTimeField(null=True, default=None)
+    num_synced_posts = models.PositiveIntegerField(default=0)
+    num_removed_posts = models.PositiveIntegerField(default=0)
+    num_runs = models.PositiveIntegerField(default=0)
+    num_errors = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+
+    def get_lag(self):
+        '''Returns the time since the last successful sync, or None if it never succeeded.'''
+        if self.last_succeeded is None:
+            return None
+        return timezone.now() - self.last_succeeded
+
+    def __str__(self):
+        return f'{self.node} (lag: {self.get_lag()})'
+
+
+class OutboxActivity(models.Model):
+    '''
+    A post, comment, like or follow created on this server that must be sent to the inboxes
+    of its recipients.
+
+    Creating an activity is the only cost paid by the request that created the object.
+    The deliver_outbox command expands it into one OutboxDelivery per remote inbox,
+    and adds it to the local inboxes directly.
+    '''
+
+    OBJECT_TYPE_CHOICES = [
+        ('POST', 'Post'),
+        ('COMMENT', 'Comment'),
+        ('LIKE', 'Like'),
+        ('FOLLOW', 'Follow'),
+    ]
+
+    class Meta:
+        verbose_name = 'OutboxActivity'
+        verbose_name_plural = 'OutboxActivities'
+
+    object_type = models.CharField(max_length=7, choices=OBJECT_TYPE_CHOICES)
+    object_id = models.UUIDField()
+    author = models.ForeignKey('social_distribution.Author', on_delete=models.CASCADE, related_name='outbox')
+    date_created = models.DateTimeField(default=timezone.now)
+    # True once the deliveries of the activity are created
+    is_expanded = models.BooleanField(default=False, db_index=True)
+
+    def __str__(self):
+        return f'{self.object_type} {self.object_id}'
+
+
+class OutboxDelivery(models.Model):
+    '''Delivery of an OutboxActivity to the inbox of a remote author.'''
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DELIVERED', 'Delivered'),
+        ('DEAD', 'Dead'),
+    ]
+
+    class Meta:
+        verbose_name = 'OutboxDelivery'
+        verbose_name_plural = 'OutboxDeliveries'
+        indexes = [
+            # due deliveries
+            models.Index(fields=['status', 'next_attempt'], name='outboxdelivery_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'inbox_url'], name='outboxdelivery_unique_inbox'),
+        ]
+
+    activity = models.ForeignKey(OutboxActivity, on_delete=models.CASCADE, related_name='deliveries')
+    node = models.ForeignKey(ServerNode, on_delete=models.CASCADE, related_name='outbox_deliveries')
+    inbox_url = models.URLField(max_length=1000)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='PENDING')
+    num_attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    date_delivered = models.DateTimeField(null=True, default=None)
+
+    def __str__(self):
+        return f'{self.activity} to {self.inbox_url} ({self.status})'
+
+
+class InboxJournalEntry(models.Model):
+    '''
+    An object sent to the inbox of a local author, accepted with 202 and not processed yet.
+
+    The process_inbox command saves the pending entries in batches. An object is journaled at
+    most once per author, so resending it before or after it is processed has no effect.
+    '''
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    class Meta:
+        verbose_name = 'InboxJournalEntry'
+        verbose_name_plural = 'InboxJournalEntries'
+        indexes = [
+            # pending entries, oldest first
+            models.Index(fields=['status', 'date_created'], name='inboxjournal_pending_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'key'], name='inboxjournal_unique_key'),
+        ]
+
+    author = models.ForeignKey('social_distribution.Author', on_delete=models.CASCADE, related_name='inbox_journal')
+    # the node that sent the object
+    node = models.ForeignKey(ServerNode, on_delete=models.SET_NULL, null=True, related_name='inbox_journal')
+    # sha256 of the id of the object
+    key = models.CharField(max_length=64)
+    payload = models.TextField()
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(blank=True, default='')
+    date_created = models.DateTimeField(default=timezone.now)
+    date_processed = models.DateTimeField(null=True, default=None)
+
+    def __str__(self):
+        return f'{self.key} to {self.author_id} ({self.status})'
+
 
 
 @receiver(post_save, sender=ServerNode)
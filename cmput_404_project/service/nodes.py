@@ -0,0 +1,135 @@
+import base64
+import threading
+import time
+
+from urllib.parse import urlparse
+from django.conf import settings
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from service.models import ServerNode
+
+
+DEFAULT_PORTS = {
+    'http': 80,
+    'https': 443,
+}
+
+
+def get_host_key(url: str) -> str:
+    '''
+    Returns the normalized scheme and netloc of url, which is used as the key of its node.
+    A url without a scheme is assumed to be http.
+
+    Example:
+        - get_host_key('HTTPS://Example.com:443/service/authors') returns 'https://example.com'
+        - get_host_key('testserver') returns 'http://testserver'
+    '''
+    if '://' not in url:
+        url = f'http://{url}'
+    o = urlparse(url)
+    scheme = o.scheme.lower()
+    netloc = (o.hostname or '').lower()
+    if o.port and o.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{o.port}'
+    return f'{scheme}://{netloc}'
+
+
+class ServerNodeIndex():
+    '''
+    In-memory index of the ServerNode table.
+
+    The index is loaded with one query and then answers lookups without queries.
+    Nodes can be looked up by their receiving credential or by the host of a url.
+    It is reloaded after a ServerNode is saved or deleted in this process, or after
+    SERVER_NODE_INDEX_TIMEOUT seconds so that changes made by other processes are seen.
+    '''
+
+    DEFAULT_TIMEOUT = 60
+
+    def __init__(self):
+        self._credentials = None
+        self._hosts = None
+        self._netlocs = None
+        self._auth_headers = None
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def get_by_credential(self, username, password):
+        '''
+        Returns the ServerNode whose receiving credential is username and password.
+        If there is no such ServerNode, it returns None.
+        '''
+        self._load_if_expired()
+        return self._credentials.get((username, password))
+
+    def get_by_url(self, url):
+        '''
+        Returns the ServerNode that url belongs to.
+        If there is no such ServerNode, it returns None.
+
+        A node matches if its scheme and host are the ones of the url. If no node matches,
+        a node with the same host but another scheme is returned.
+        '''
+        self._load_if_expired()
+        key = get_host_key(url)
+        node = self._hosts.get(key)
+        if node is None:
+            node = self._netlocs.get(key.split('://', 1)[1])
+        return node
+
+    def get_authorization_header(self, node) -> str:
+        '''
+        Returns a string with base64 encoded sending username and password of node
+        that can be used to put in "Authorization:" header.
+        '''
+        self._load_if_expired()
+        header = self._auth_headers.get(node.id)
+        if header is None:
+            # node is not in the index yet
+            header = self._encode_credential(node)
+        return header
+
+    def invalidate(self):
+        '''Makes the next lookup reload the index.'''
+        with self._lock:
+            self._credentials = None
+
+    def _load_if_expired(self):
+        with self._lock:
+            if self._credentials is None or self._expires < time.monotonic():
+                self._load()
+
+    def _load(self):
+        timeout = getattr(settings, 'SERVER_NODE_INDEX_TIMEOUT', self.DEFAULT_TIMEOUT)
+        credentials = {}
+        hosts = {}
+        netlocs = {}
+        auth_headers = {}
+        # the oldest node wins if two nodes share a credential or a host
+        for node in ServerNode.objects.all().order_by('-id'):
+            credentials[(node.receiving_username, node.receiving_password)] = node
+            key = get_host_key(node.host)
+            hosts[key] = node
+            netlocs[key.split('://', 1)[1]] = node
+            auth_headers[node.id] = self._encode_credential(node)
+
+        self._credentials = credentials
+        self._hosts = hosts
+        self._netlocs = netlocs
+        self._auth_headers = auth_headers
+        self._expires = time.monotonic() + timeout
+
+    def _encode_credential(self, node) -> str:
+        credential = f"{node.sending_username}:{node.sending_password}".encode("utf-8")
+        return f"Basic {base64.b64encode(credential).decode('utf-8')}"
+
+
+server_node_index = ServerNodeIndex()
+
+
+@receiver(post_save, sender=ServerNode)
+@receiver(post_delete, sender=ServerNode)
+def invalidate_server_node_index(sender, **kwargs):
+    '''Upon ServerNode change, reload the index on the next lookup.'''
+    server_node_index.invalidate()
@@ -0,0 +1,228 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from service.fanout import FanOut
+from service.federation import federation_client
+from service.inbox import add_to_inboxes
+from service.models import OutboxActivity, OutboxDelivery
+from service.nodes import server_node_index
+from social_distribution.friends import friends_cache
+from social_distribution.models import Author, Follower, Post, Comment, Like, FollowRequest
+from social_distribution.serializers import get_posts_detail_dicts
+
+
+DEFAULT_SETTINGS = {
+    # max number of activities expanded or deliveries sent per run
+    'BATCH_SIZE': 100,
+    # a delivery is dead-lettered after this many failed attempts
+    'MAX_ATTEMPTS': 8,
+    # seconds before the first retry, doubled after each failed attempt
+    'BACKOFF': 30,
+    'MAX_BACKOFF': 60 * 60 * 6,
+    # seconds a claimed delivery is hidden from other workers
+    'LEASE': 60 * 5,
+    # seconds all deliveries of a run must finish in
+    'DEADLINE': 30,
+}
+
+
+def get_config() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'OUTBOX', {})}
+
+
+def enqueue(object_type, obj, author) -> OutboxActivity:
+    '''
+    Schedules obj to be sent to the inboxes of its recipients by the deliver_outbox command.
+
+    object_type is one of 'POST', 'COMMENT', 'LIKE' and 'FOLLOW'.
+    '''
+    return OutboxActivity.objects.create(object_type=object_type, object_id=obj.id, author=author)
+
+
+def get_object(activity):
+    '''Returns the object of activity, or None if it was deleted.'''
+    model = {'POST': Post, 'COMMENT': Comment, 'LIKE': Like, 'FOLLOW': FollowRequest}[activity.object_type]
+    return model.objects.filter(id=activity.object_id).first()
+
+
+def get_recipients(activity, obj) -> list:
+    '''
+    Returns a list of (author_url, author) for the recipients of the object of activity.
+    author is the local Author of the recipient, or None if the recipient is remote.
+    '''
+    recipients = []
+    if activity.object_type == 'POST':
+        if obj.visibility == 'FRIENDS':
+            # only the friends, never the followers that are not friends
+            friends = friends_cache.get_friends(obj.author_id)
+            recipients = [(None, a) for a in Author.objects.filter(id__in=friends['local'])]
+            recipients += [(url, None) for url in friends['remote']]
+        elif obj.visibility == 'PRIVATE':
+            recipients = [(None, a) for a in Author.objects.filter(audience_posts__post=obj)]
+        else:
+            followers = list(Follower.objects.filter(target_author=obj.author))
+            local_authors = Author.objects.in_bulk([f.source_author_id for f in followers if f.source_author_id])
+            recipients = [(f.source_author_url, local_authors.get(f.source_author_id)) for f in followers]
+            recipients += [(None, a) for a in obj.author.followers.all()]
+
+    elif activity.object_type == 'COMMENT':
+        recipients = [(None, obj.post.author)]
+
+    elif activity.object_type == 'LIKE':
+        liked = Like.get_object_model(obj.object_type).objects.filter(id=obj.object_id).first()
+        if liked is not None:
+            recipients = [(getattr(liked, 'author_url', None), liked.author)]
+
+    else:
+        recipients = [(obj.to_author_url, obj.to_author)]
+
+    # remove duplicates and the author of the activity
+    unique = {}
+    for author_url, author in recipients:
+        if author is not None:
+            if author.id != activity.author_id:
+                unique[author.get_id_url()] = (author_url, author)
+        elif author_url:
+            unique.setdefault(author_url.rstrip('/'), (author_url.rstrip('/'), None))
+    return list(unique.values())
+
+
+@transaction.atomic
+def expand_activity(activity) -> int:
+    '''
+    Adds the object of activity to the inboxes of its local recipients and creates
+    an OutboxDelivery for each remote recipient. Returns the number of created deliveries.
+    '''
+    obj = get_object(activity)
+    recipients = get_recipients(activity, obj) if obj is not None else []
+
+    deliveries = []
+    local_authors = []
+    for author_url, author in recipients:
+        if author is not None:
+            local_authors.append(author)
+            continue
+        node = server_node_index.get_by_url(author_url)
+        if node is None or node.is_local:
+            # unknown nodes are not authorized to receive our objects
+            continue
+        deliveries.append(OutboxDelivery(activity=activity, node=node, inbox_url=f'{author_url}/inbox'))
+
+    add_to_inboxes(local_authors, activity.object_type, activity.object_id, None)
+    OutboxDelivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    activity.is_expanded = True
+    activity.save(update_fields=['is_expanded'])
+    return len(deliveries)
+
+
+def expand_activities(batch_size=None) -> int:
+    '''Expands the activities that are not expanded yet. Returns the number of expanded activities.'''
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    activities = list(OutboxActivity.objects.filter(is_expanded=False).order_by('date_created')[:batch_size])
+    for activity in activities:
+        expand_activity(activity)
+    return len(activities)
+
+
+def claim_due_deliveries(batch_size) -> list:
+    '''
+    Returns the pending deliveries that are due, oldest first.
+
+    The deliveries are leased for LEASE seconds, so that other workers do not send them at the same time.
+    '''
+    config = get_config()
+    now = timezone.now()
+    with transaction.atomic():
+        q = OutboxDelivery.objects.select_for_update(skip_locked=True, of=('self',)) \
+                                  .select_related('node') \
+                                  .filter(status='PENDING', next_attempt__lte=now) \
+                                  .order_by('next_attempt')[:batch_size]
+        deliveries = list(q)
+        OutboxDelivery.objects.filter(id__in=[d.id for d in deliveries]) \
+                              .update(next_attempt=now + timedelta(seconds=config['LEASE']))
+    return deliveries
+
+
+def get_activity_data(activity, obj) -> dict:
+    '''Returns the object of activity as it is sent to inboxes.'''
+    if activity.object_type == 'POST':
+        return get_posts_detail_dicts([obj])[0]
+    return obj.get_detail_dict()
+
+
+def send(delivery, data) -> int:
+    '''Posts data to the inbox of delivery and returns the status code of the response.'''
+    response = federation_client.post(delivery.inbox_url, node=delivery.node, json=data)
+    return response.status_code
+
+
+def deliver_due(batch_size=None, deadline=None) -> dict:
+    '''
+    Sends the due deliveries concurrently and records their result.
+
+    Deliveries to the same node are sent in one batch, interleaved with the other nodes, and
+    the requests to a node are capped by its max_connections. A failed delivery is retried with
+    exponential backoff, and is dead-lettered after MAX_ATTEMPTS attempts or on a 4xx response.
+
+    Returns the number of delivered, retried and dead deliveries.
+    '''
+    config = get_config()
+    deliveries = claim_due_deliveries(batch_size or config['BATCH_SIZE'])
+    counts = {'delivered': 0, 'retried': 0, 'dead': 0}
+    if not deliveries:
+        return counts
+
+    activities = OutboxActivity.objects.in_bulk({d.activity_id for d in deliveries})
+    data = {}
+    for activity in activities.values():
+        obj = get_object(activity)
+        data[activity.id] = get_activity_data(activity, obj) if obj is not None else None
+
+    status_codes = {}
+    with FanOut(deadline if deadline is not None else config['DEADLINE']) as fan_out:
+        futures = {}
+        for delivery in _interleave_by_node(deliveries):
+            if data[delivery.activity_id] is not None:
+                futures[fan_out.submit(send, delivery, data[delivery.activity_id])] = delivery
+        for future, status_code in fan_out.as_completed(futures):
+            status_codes[futures[future].id] = status_code
+
+    now = timezone.now()
+    for delivery in deliveries:
+        delivery.num_attempts += 1
+        status_code = status_codes.get(delivery.id)
+        if data[delivery.activity_id] is None:
+            delivery.status = 'DEAD'
+            delivery.last_error = 'The object was deleted'
+        elif status_code is not None and 200 <= status_code < 300:
+            delivery.status = 'DELIVERED'
+            delivery.date_delivered = now
+            delivery.last_error = ''
+        else:
+            delivery.last_error = f'HTTP {status_code}' if status_code else 'No response before the deadline'
+            permanent = status_code is not None and 400 <= status_code < 500 and status_code not in [408, 429]
+            if permanent or delivery.num_attempts >= config['MAX_ATTEMPTS']:
+                delivery.status = 'DEAD'
+            else:
+                backoff = min(config['BACKOFF'] * 2 ** (delivery.num_attempts - 1), config['MAX_BACKOFF'])
+                delivery.next_attempt = now + timedelta(seconds=backoff)
+        counts[{'DELIVERED': 'delivered', 'DEAD': 'dead', 'PENDING': 'retried'}[delivery.status]] += 1
+
+    OutboxDelivery.objects.bulk_update(deliveries, ['status', 'num_attempts', 'next_attempt',
+                                                    'last_error', 'date_delivered'])
+    return counts
+
+
+def _interleave_by_node(deliveries) -> list:
+    '''Returns deliveries ordered round-robin by node, so that a slow node does not delay the others.'''
+    by_node = {}
+    for delivery in deliveries:
+        by_node.setdefault(delivery.node_id, []).append(delivery)
+    queues = list(by_node.values())
+    ordered = []
+    while queues:
+        ordered.extend(queue.pop(0) for queue in queues)
+        queues = [queue for queue in queues if queue]
+    return ordered
@@ -0,0 +1,94 @@
+import base64
+import json
+
+from django.core.exceptions import BadRequest, ValidationError
+from django.db.models import Q
+
+
+def is_cursor_request(request) -> bool:
+    '''Returns True if the request asks for cursor pagination with ?cursor=.'''
+    return 'cursor' in request.GET
+
+
+def encode_cursor(values) -> str:
+    '''Returns an opaque cursor token that holds values.'''
+    data = json.dumps([str(v) for v in values]).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('utf-8').rstrip('=')
+
+
+def decode_cursor(cursor) -> list:
+    '''
+    Returns the values held by a cursor token.
+
+    Raises ValueError if the cursor is invalid.
+    '''
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def get_keyset_page(queryset, keys, cursor, size):
+    '''
+    Returns (items, next_cursor) of the page of queryset that starts after cursor.
+
+    keys are the field names the queryset is ordered by, e.g. ['-date_created', '-id'].
+    The last key must be unique. An empty cursor returns the first page.
+    next_cursor is None on the last page.
+
+    Unlike OFFSET pagination, the cost of a page does not grow with its depth.
+
+    Raises ValueError if the cursor or size is invalid.
+    '''
+    if size < 1:
+        raise ValueError('Invalid size')
+
+    queryset = queryset.order_by(*keys)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError('Invalid cursor')
+        queryset = queryset.filter(_get_after_q(queryset.model, keys, values))
+
+    items = list(queryset[:size + 1])
+    if len(items) <= size:
+        return items, None
+
+    items = items[:size]
+    last = items[-1]
+    next_cursor = encode_cursor([getattr(last, key.lstrip('-')) for key in keys])
+    return items, next_cursor
+
+
+def get_keyset_page_or_400(queryset, keys, request, size, param='cursor'):
+    '''
+    Same as get_keyset_page with the cursor in the param query parameter of the request,
+    but raises BadRequest if it is invalid.
+    '''
+    try:
+        return get_keyset_page(queryset, keys, request.GET.get(param, ''), size)
+    except (ValueError, ValidationError) as e:
+        raise BadRequest(str(e))
+
+
+def _get_after_q(model, keys, values) -> Q:
+    '''
+    Returns a Q that selects the rows that come after values in the order of keys.
+
+    For keys ['-a', '-b'], it is (a < va) OR (a = va AND b < vb).
+    '''
+    fields = [key.lstrip('-') for key in keys]
+    values = [model._meta.get_field(f).to_python(v) for f, v in zip(fields, values)]
+
+    q = Q()
+    for i, key in enumerate(keys):
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        condition = Q(**{f'{fields[i]}__{lookup}': values[i]})
+        for field, value in zip(fields[:i], values[:i]):
+            condition &= Q(**{field: value})
+        q |= condition
+    return q
@@ -1,6 +1,16 @@
-import base64
+from service.nodes import server_node_index
+
+
+def get_server_node(url: str):
+    '''
+    Returns the ServerNode that url belongs to.
+    If there is no such ServerNode, it returns None.
+
+    Example url:
+        - https://cmput-404-w22-project-group09.herokuapp.com/service/authors/
+    '''
+    return server_node_index.get_by_url(url)
 
-from service.models import ServerNode
 
 def get_b64_server_credential(server_host: str):
     '''
@@ -23,16 +33,10 @@ def get_b64_server_credential(server_host: str):
             headers['Authorization'] = b64_authorization
 
     '''
-    q = ServerNode.objects.filter(host__contains=server_host)
-    node = None
-    if q.exists():
-        node = q.get()
+    node = get_server_node(server_host)
     
-    # server_host does not exist or is a local server
+    # server_host does not exist
     if node is None:
         return None 
 
-    credential = f"{node.sending_username}:{node.sending_password}".encode("utf-8")
-    b64_crediential = base64.b64encode(credential)
-
-    return f"Basic {b64_crediential.decode('utf-8')}"
\ No newline at end of file
+    return server_node_index.get_authorization_header(node)
@@ -5,6 +5,7 @@ from django.http.request import HttpRequest
 from django.conf import settings
 
 from service.models import ServerNode
+from service.nodes import server_node_index
 
 
 def get_401_response() -> HttpResponse:
@@ -22,35 +23,40 @@ def is_server_authorized(request: HttpRequest) -> ServerNode:
 
     The server is authorized if Authorization header is included with valid credentials.
     '''
+    return get_request_server_node(request)
 
-    auth_header = request.META.get('HTTP_AUTHORIZATION', None)
-    if auth_header is None:
-        return None
 
-    auth_type, auth_info = auth_header.split(' ')
+def is_local_server(request: HttpRequest) -> bool:
+    '''
+    Returns True if the server is a local server. Otherwise, False.
+    '''
+    node = get_request_server_node(request)
+    return node if node is not None and node.is_local else None
 
-    if auth_type.lower() != "basic":
-        return None
 
-    auth_info = auth_info.encode('utf-8')
-    try:
-        username, password = base64.b64decode(auth_info).decode('utf-8').split(':')
-    except ValueError:
-        return None
-    node_q = ServerNode.objects.filter(receiving_username=username, receiving_password=password)
+def get_request_server_node(request: HttpRequest) -> ServerNode:
+    '''
+    Returns the ServerNode authorized by the Authorization header of the request, or None.
 
-    return node_q.get() if node_q.exists() else None
+    The resolved node is kept in request.server_node, so the header is only checked once per request.
+    '''
+    if not hasattr(request, 'server_node'):
+        request.server_node = _get_server_node(request)
+    return request.server_node
 
 
-def is_local_server(request: HttpRequest) -> bool:
+def _get_server_node(request: HttpRequest) -> ServerNode:
     '''
-    Returns True if the server is a local server. Otherwise, False.
+    Returns the ServerNode whose receiving credential is in the Authorization header, or None.
     '''
     auth_header = request.META.get('HTTP_AUTHORIZATION', None)
     if auth_header is None:
         return None
 
-    auth_type, auth_info = auth_header.split(' ')
+    try:
+        auth_type, auth_info = auth_header.split(' ')
+    except ValueError:
+        return None
 
     if auth_type.lower() != "basic":
         return None
@@ -60,6 +66,5 @@ def is_local_server(request: HttpRequest) -> bool:
         username, password = base64.b64decode(auth_info).decode('utf-8').split(':')
     except ValueError:
         return None
-    node_q = ServerNode.objects.filter(receiving_username=username, receiving_password=password, is_local=True)
 
-    return node_q.get() if node_q.exists() else None
+    return server_node_index.get_by_credential(username, password)
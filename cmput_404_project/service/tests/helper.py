@@ -1,6 +1,14 @@
+import base64
+
 from social_distribution.models import Author, Post, Comment, Like
 
 
+def get_basic_auth_header(username='', password=''):
+    '''Returns a value for the Authorization header with the given server credential.'''
+    credential = base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('utf-8')
+    return f'Basic {credential}'
+
+
 def create_dummy_authors(n):
     '''Creates n dummy authors.'''
     for i in range(n):
@@ -87,19 +95,21 @@ def create_dummy_comments(n, author, post):
 def create_dummy_likes_to_post(like_authors, post):
     '''Creates likes from like_authors to the post'''
     for like_author in like_authors:
-        Like.objects.create(author=like_author,
-                            author_url = like_author.get_id_url(),
-                            object_type='POST',
-                            object_url=post.get_id_url())
+        Like.objects.create_like(author=like_author,
+                                 author_url = like_author.get_id_url(),
+                                 object_type='POST',
+                                 object_id=post.id,
+                                 object_url=post.get_id_url())
 
 
 def create_dummy_likes_to_comment(like_authors, comment):
     '''Creates likes from like_authors to the comment'''
     for like_author in like_authors:
-        Like.objects.create(author=like_author,
-                            author_url = like_author.get_id_url(),
-                            object_type='COMMENT',
-                            object_url=comment.get_id_url())
+        Like.objects.create_like(author=like_author,
+                                 author_url = like_author.get_id_url(),
+                                 object_type='COMMENT',
+                                 object_id=comment.id,
+                                 object_url=comment.get_id_url())
 
     
 
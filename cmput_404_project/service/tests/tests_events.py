@@ -0,0 +1,189 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from service.events import InboxNotifier, InboxEventsApp, TooManyConnections, inbox_notifier, get_backend
+from service.inbox import add_to_inboxes
+from service.models import ServerNode
+from social_distribution.models import Author, Inbox, InboxItem
+from .helper import create_dummy_authors
+
+
+AUTHOR_ID = '9de17f29-c12e-4f97-bcbb-d34cc908f1ba'
+
+
+class InboxNotifierTestCase(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.notifier = InboxNotifier()
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def subscribe(self, author_id=AUTHOR_ID):
+        async def subscribe():
+            return self.notifier.subscribe(author_id)
+        return self.loop.run_until_complete(subscribe())
+
+    def get_event(self, subscription):
+        return self.loop.run_until_complete(asyncio.wait_for(subscription.get(), 1))
+
+    def test_publish(self):
+        subscription = self.subscribe()
+        other = self.subscribe('other')
+
+        # published from another thread, like a sync view
+        thread = threading.Thread(target=self.notifier.publish, args=(AUTHOR_ID, {'type': 'inbox'}))
+        thread.start()
+        thread.join()
+        self.assertDictEqual(self.get_event(subscription), {'type': 'inbox'})
+        self.assertTrue(other.queue.empty())
+
+        self.notifier.unsubscribe(subscription)
+        self.notifier.unsubscribe(other)
+        self.assertEqual(self.notifier.get_num_connections(), 0)
+
+    @override_settings(EVENTS={'QUEUE_SIZE': 2})
+    def test_overflow(self):
+        subscription = self.subscribe()
+        for i in range(5):
+            self.notifier.publish(AUTHOR_ID, {'type': 'inbox'})
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        # the events of a client that fell behind are replaced by a reset
+        self.assertDictEqual(self.get_event(subscription), {'type': 'reset'})
+        self.assertTrue(subscription.queue.empty())
+        self.notifier.publish(AUTHOR_ID, {'type': 'inbox'})
+        self.assertDictEqual(self.get_event(subscription), {'type': 'inbox'})
+
+    @override_settings(EVENTS={'MAX_CONNECTIONS': 1})
+    def test_max_connections(self):
+        subscription = self.subscribe()
+        with self.assertRaises(TooManyConnections):
+            self.subscribe()
+        self.notifier.unsubscribe(subscription)
+        self.subscribe()
+
+
+@mock.patch('service.events.inbox_notifier.publish')
+class InboxNotifyTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+
+    def test_notify_on_save(self, mock_publish):
+        author = Author.objects.get(username='test0')
+        with self.captureOnCommitCallbacks(execute=True):
+            InboxItem.objects.create(inbox=Inbox.objects.create(author=author), object_url='http://remote.example.com/1')
+        mock_publish.assert_called_once_with(str(author.id), {'type': 'inbox'})
+
+    def test_notify_on_bulk_insert(self, mock_publish):
+        authors = list(Author.objects.all())
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_inboxes(authors, 'POST', None, 'http://remote.example.com/1')
+        self.assertSetEqual({args[0] for args, kwargs in mock_publish.call_args_list}, {str(a.id) for a in authors})
+
+        # nothing is added the second time
+        mock_publish.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_inboxes(authors, 'POST', None, 'http://remote.example.com/1')
+        mock_publish.assert_not_called()
+
+
+class EventsBackendTestCase(TestCase):
+
+    @override_settings(EVENTS={'BACKEND': None})
+    def test_database_backend(self):
+        with mock.patch('service.events.connections') as mock_connections:
+            mock_connections.__getitem__.return_value.vendor = 'postgresql'
+            self.assertEqual(get_backend(), 'postgres')
+            mock_connections.__getitem__.return_value.vendor = 'sqlite'
+            self.assertEqual(get_backend(), 'local')
+
+    @override_settings(EVENTS={'BACKEND': 'local'})
+    def test_configured_backend(self):
+        with mock.patch('service.events.connections') as mock_connections:
+            mock_connections.__getitem__.return_value.vendor = 'postgresql'
+            self.assertEqual(get_backend(), 'local')
+
+
+class InboxEventsAppTestCase(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.app = InboxEventsApp()
+        self.scope = {'type': 'http', 'method': 'GET', 'path': f'/service/authors/{AUTHOR_ID}/inbox/events',
+                      'headers': []}
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_app(self, user_id, until):
+        '''Runs the app until the until coroutine returns, then disconnects. Returns the sent messages.'''
+        messages = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        async def get_user_id(scope):
+            return user_id
+
+        async def run():
+            app = asyncio.ensure_future(self.app(self.scope, receive, send))
+            await until(messages)
+            disconnected.set()
+            await asyncio.wait_for(app, 1)
+
+        with mock.patch.object(self.app, '_get_user_id', get_user_id):
+            self.loop.run_until_complete(run())
+        return messages
+
+    def get_body(self, messages) -> str:
+        return ''.join(m['body'].decode('utf-8') for m in messages if m['type'] == 'http.response.body')
+
+    @override_settings(EVENTS={'HEARTBEAT': 0.01})
+    def test_stream(self):
+        async def until(messages):
+            while inbox_notifier.get_num_connections() == 0:
+                await asyncio.sleep(0.01)
+            inbox_notifier.publish(AUTHOR_ID, {'type': 'inbox'})
+            while ': heartbeat' not in self.get_body(messages) or 'event: inbox' not in self.get_body(messages):
+                await asyncio.sleep(0.01)
+
+        messages = self.run_app(AUTHOR_ID, until)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        self.assertIn('event: inbox\ndata: {"type": "inbox"}\n\n', self.get_body(messages))
+        # the subscription is closed with the connection
+        self.assertEqual(inbox_notifier.get_num_connections(), 0)
+
+    def test_forbidden(self):
+        async def until(messages):
+            pass
+
+        messages = self.run_app(None, until)
+        self.assertEqual(messages[0]['status'], 403)
+
+        messages = self.run_app('another-author', until)
+        self.assertEqual(messages[0]['status'], 403)
+
+    @override_settings(EVENTS={'MAX_CONNECTIONS': 0})
+    def test_max_connections(self):
+        async def until(messages):
+            pass
+
+        messages = self.run_app(AUTHOR_ID, until)
+        self.assertEqual(messages[0]['status'], 503)
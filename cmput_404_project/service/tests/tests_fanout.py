@@ -0,0 +1,66 @@
+import time
+
+from unittest import mock
+
+from django.test import TestCase
+
+from service.models import ServerNode
+from service.fanout import fetch_posts, fetch_author_lists
+
+
+def get_mock_response(items):
+    '''Returns a mock of requests.Response of a paginated list'''
+    response = mock.Mock()
+    response.status_code = 200
+    response.json.return_value = {'items': items}
+    return response
+
+
+def mock_get(url, node=None, **kwargs):
+    '''Mock of FederationClient.get for a fast node and a slow node'''
+    if 'slow.example.com' in url:
+        time.sleep(1)
+    host = url.split('/authors')[0]
+    if url.endswith('/authors/'):
+        return get_mock_response([{'id': f'{host}/authors/{i}', 'url': f'{host}/authors/{i}'} for i in range(3)])
+    author_num = int(url.split('/')[-3])
+    return get_mock_response([{'id': f'{url}{author_num}', 'published': f'2022-03-0{author_num + 1}T10:00:00+00:00'}])
+
+
+@mock.patch('service.fanout.federation_client.get', side_effect=mock_get)
+class FanOutTestCase(TestCase):
+
+    def setUp(self):
+        self.fast_node = ServerNode.objects.create(host='http://fast.example.com')
+        self.slow_node = ServerNode.objects.create(host='http://slow.example.com')
+
+    def test_fetch_posts(self, mock_request):
+        posts = fetch_posts([self.fast_node])
+        self.assertEqual(len(posts), 3)
+
+        # merged posts are ordered by published
+        published = [post['published'] for post in posts]
+        self.assertEqual(published, sorted(published, reverse=True))
+
+        # only the posts of the filtered authors are requested
+        posts = fetch_posts([self.fast_node], author_filter=lambda a: a['id'].endswith('/1'))
+        self.assertEqual(len(posts), 1)
+
+
+    def test_deadline(self, mock_request):
+        # the slow node does not respond before the deadline, so only the fast node's posts are returned
+        start = time.monotonic()
+        with self.assertLogs('service.fanout', 'WARNING') as logs:
+            posts = fetch_posts([self.fast_node, self.slow_node], deadline=0.5)
+        self.assertIn('Deadline exceeded', logs.output[0])
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(posts), 3)
+
+        author_lists = fetch_author_lists([self.fast_node, self.slow_node], deadline=0.5)
+        self.assertEqual(list(author_lists.keys()), [self.fast_node.id])
+
+    def test_error(self, mock_request):
+        mock_request.side_effect = ConnectionError('refused')
+        with self.assertLogs('service.fanout', 'WARNING') as logs:
+            self.assertEqual(fetch_author_lists([self.fast_node]), {})
+        self.assertIn('refused', logs.output[0])
@@ -0,0 +1,126 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from service.models import ServerNode
+from service.federation import FederationClient
+from social_distribution.models import Author, Post, Like
+from social_distribution.remote_cache import RemoteObjectCache
+from .helper import get_basic_auth_header, create_dummy_authors, create_dummy_post
+
+
+@mock.patch('service.federation.requests.Session.request')
+class FederationClientTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='http://remote.example.com',
+                                  sending_username='user',
+                                  sending_password='pass',
+                                  connect_timeout=1,
+                                  read_timeout=2,
+                                  max_connections=3)
+
+    def test_request_to_node(self, mock_request):
+        client = FederationClient()
+        client.get('http://remote.example.com/service/authors')
+
+        # auth and timeouts are taken from the ServerNode
+        args, kwargs = mock_request.call_args
+        self.assertEqual(args, ('GET', 'http://remote.example.com/service/authors'))
+        self.assertEqual(kwargs['headers']['Authorization'], get_basic_auth_header('user', 'pass'))
+        self.assertEqual(kwargs['timeout'], (1, 2))
+
+
+    def test_session_per_node(self, mock_request):
+        client = FederationClient()
+        client.get('http://remote.example.com/service/authors')
+        client.post('http://remote.example.com/service/authors/1/inbox', json={})
+        client.get('http://other.example.com/service/authors')
+
+        # connections to the same node share a session
+        self.assertEqual(len(client._sessions), 2)
+        session = client._sessions['http://remote.example.com']
+        adapter = session.get_adapter('http://remote.example.com')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertIn('GET', adapter.max_retries.allowed_methods)
+        self.assertNotIn('POST', adapter.max_retries.allowed_methods)
+
+        # unknown hosts are not authorized
+        args, kwargs = mock_request.call_args
+        self.assertNotIn('auth', kwargs)
+        self.assertNotIn('headers', kwargs)
+        self.assertEqual(kwargs['timeout'], (ServerNode.DEFAULT_CONNECT_TIMEOUT, ServerNode.DEFAULT_READ_TIMEOUT))
+
+
+    def test_explicit_auth(self, mock_request):
+        client = FederationClient()
+        client.get('http://remote.example.com/service/authors', auth=('other', 'secret'))
+        args, kwargs = mock_request.call_args
+        self.assertEqual(kwargs['auth'], ('other', 'secret'))
+
+
+@mock.patch('service.federation.requests.Session.request')
+class LocalDispatchTestCase(TestCase):
+
+    def setUp(self):
+        # the credentials are not needed in this process
+        self.node = ServerNode.objects.create(host='http://testserver', is_local=True)
+        create_dummy_authors(1)
+        self.author = Author.objects.get(username='test0')
+        self.url = f'http://testserver/service/authors/{self.author.id}'
+
+    def test_get(self, mock_request):
+        client = FederationClient()
+        response = client.get(self.url)
+        mock_request.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.author.get_id_url())
+        response.raise_for_status()
+
+        response = client.get(f'{self.url}/followers', params={'page': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['type'], 'followers')
+
+        response = client.get('http://testserver/service/authors/9de17f29-c12e-4f97-bcbb-d34cc908f1ba')
+        self.assertEqual(response.status_code, 404)
+
+    def test_post(self, mock_request):
+        client = FederationClient()
+        create_dummy_post(self.author)
+        post = Post.objects.get(author=self.author)
+        like = {
+            'type': 'Like',
+            '@context': 'https://www.w3.org/ns/activitystreams',
+            'summary': 'test0 Likes your post',
+            'author': {'type': 'author', 'id': 'http://remote.example.com/service/authors/0b3d3d5e-9f4c-4d8a-8f0e-5b8e4c9c1a2f'},
+            'object': post.get_id_url(),
+        }
+        response = client.post(f'{self.url}/inbox', json=like)
+        mock_request.assert_not_called()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Like.objects.filter(object_url=post.get_id_url()).exists())
+
+    def test_user(self, mock_request):
+        # views that check the logged in user see an anonymous one
+        client = FederationClient()
+        self.assertEqual(client.get(f'{self.url}/inbox').status_code, 403)
+        self.assertEqual(client.post(f'{self.url}/inbox/read').status_code, 403)
+        mock_request.assert_not_called()
+
+    def test_not_service(self, mock_request):
+        # other pages of the local node are still requested over http
+        FederationClient().get('http://testserver/authors/')
+        mock_request.assert_called_once()
+
+    def test_remote_object_cache(self, mock_request):
+        cache = RemoteObjectCache()
+        self.assertEqual(cache.get(self.url)['id'], self.author.get_id_url())
+        data = cache.get_many([self.url], deadline=1)
+        self.assertEqual(data[self.url]['id'], self.author.get_id_url())
+        mock_request.assert_not_called()
+
+        # local objects are not cached
+        self.assertEqual(cache.get_stats()['size'], 0)
+        self.author.first_name = 'changed'
+        self.author.save()
+        self.assertEqual(cache.get(self.url)['displayName'], self.author.get_full_name())
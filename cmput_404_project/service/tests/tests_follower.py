@@ -1,10 +1,13 @@
-from django.test import TestCase, Client
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 
-from social_distribution.models import Author
+from social_distribution.friends import friends_cache
+from social_distribution.models import Author, Friends, Follower, FollowRequest
 from service.models import ServerNode
-from .helper import create_dummy_author_with_followers, create_dummy_authors
+from .helper import get_basic_auth_header, create_dummy_author_with_followers, create_dummy_authors
 
 
 class FollowersViewTestCase(TestCase):
@@ -143,3 +146,79 @@ class FollowersViewTestCase(TestCase):
 
     
 
+
+
+REMOTE_FRIEND_URL = 'http://remote.example.com/service/authors/9de17f29-c12e-4f97-bcbb-d34cc908f1ba'
+
+
+class FriendsTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(4)
+        self.author, self.friend, self.followed, self.follower = \
+            [Author.objects.get(username=f'test{i}') for i in range(4)]
+
+        # friends through accepted requests in both directions
+        Friends.objects.create(sender=self.author, receiver=self.friend, status='accepted')
+        Friends.objects.create(sender=self.friend, receiver=self.author, status='accepted')
+        # a request in one direction only
+        Friends.objects.create(sender=self.author, receiver=self.followed, status='accepted')
+        Friends.objects.create(sender=self.followed, receiver=self.author, status='send')
+        # friends through followers in both directions
+        Follower.objects.create(target_author=self.author, source_author_id=self.follower.id,
+                                source_author_url=self.follower.get_id_url())
+        Follower.objects.create(target_author=self.follower, source_author_id=self.author.id,
+                                source_author_url=self.author.get_id_url())
+        # a remote author the author follows back, and one it doesn't
+        Follower.objects.create(target_author=self.author, source_author_url=REMOTE_FRIEND_URL)
+        FollowRequest.objects.create(from_author=self.author, from_author_url=self.author.get_id_url(),
+                                     to_author_url=REMOTE_FRIEND_URL)
+        Follower.objects.create(target_author=self.author, source_author_url='http://remote.example.com/service/authors/1')
+
+    # an in-process cache, so that only the queries of the friend sets are counted
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_friends(self):
+        with self.assertNumQueries(2):
+            friends = friends_cache.get_friends(self.author.id)
+        self.assertSetEqual(set(friends['local']), {self.friend.id, self.follower.id})
+        self.assertListEqual(friends['remote'], [REMOTE_FRIEND_URL])
+
+        # cached
+        with self.assertNumQueries(0):
+            friends_cache.get_friends(self.author.id)
+
+        self.assertListEqual(friends_cache.get_local_ids(self.friend.id), [self.author.id])
+        self.assertListEqual(friends_cache.get_local_ids(self.followed.id), [])
+
+    def test_invalidate(self):
+        friends_cache.get_friends(self.author.id)
+        Friends.objects.filter(sender=self.friend).delete()
+        Follower.objects.filter(target_author=self.follower).delete()
+        self.assertListEqual(friends_cache.get_local_ids(self.author.id), [])
+
+        Friends.objects.filter(sender=self.followed).update(status='accepted')
+        friends_cache.invalidate([self.author.id])
+        self.assertListEqual(friends_cache.get_local_ids(self.author.id), [self.followed.id])
+
+    def test_invalidate_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follower.objects.filter(target_author=self.follower).delete()
+            # another process loads the friends before the change is committed
+            friends_cache.cache.set(f'{friends_cache.KEY_PREFIX}{self.author.id}',
+                                    {'local': [str(self.friend.id), str(self.follower.id)], 'remote': []})
+        self.assertListEqual(friends_cache.get_local_ids(self.author.id), [self.friend.id])
+
+    @mock.patch('social_distribution.serializers.remote_object_cache.get_many')
+    def test_friends_view(self, mock_get_many):
+        mock_get_many.return_value = {REMOTE_FRIEND_URL: {'type': 'author', 'id': REMOTE_FRIEND_URL}}
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        response = c.get(f'/service/authors/{self.author.id}/friends')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['type'], 'friends')
+        self.assertSetEqual({item['id'] for item in data['items']},
+                            {self.friend.get_id_url(), self.follower.get_id_url(), REMOTE_FRIEND_URL})
+
+        response = Client().get(f'/service/authors/{self.author.id}/friends')
+        self.assertEqual(response.status_code, 401)
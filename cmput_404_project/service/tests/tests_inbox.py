@@ -1,12 +1,20 @@
 import uuid
 import json
+from datetime import timedelta
 
-from django.test import TestCase, Client
+from unittest import mock
+from django.db import connection, IntegrityError
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 
 from social_distribution.models import Author, Post, Inbox, InboxItem, FollowRequest, Like, Comment
-from service.models import ServerNode
-from .helper import create_dummy_authors, create_dummy_post, create_dummy_posts, create_dummy_comments
+from social_distribution.remote_cache import remote_object_cache
+from social_distribution.serializers import get_inbox_items_detail_dicts
+from service.inbox import process_journal, purge_inboxes, clear_inbox, add_to_inboxes, get_inbox, journal_inbox_objects
+from service.models import ServerNode, InboxJournalEntry
+from .helper import get_basic_auth_header, create_dummy_authors, create_dummy_post, create_dummy_posts, create_dummy_comments
 
 
 class InboxViewTestCase(TestCase):
@@ -148,3 +156,557 @@ class InboxViewTestCase(TestCase):
 
 
 
+
+
+@mock.patch('social_distribution.remote_cache.federation_client.get')
+class InboxItemsSerializationTestCase(TestCase):
+
+    REMOTE_AUTHOR_URL = 'http://remote.example.com/service/authors/9de17f29-c12e-4f97-bcbb-d34cc908f1ba'
+
+    def setUp(self):
+        remote_object_cache.clear()
+        create_dummy_authors(2)
+        self.sender = Author.objects.get(username='test0')
+        self.receiver = Author.objects.get(username='test1')
+        self.inbox = Inbox.objects.create(author=self.receiver)
+
+    def tearDown(self):
+        remote_object_cache.clear()
+
+    def add_items(self, n):
+        '''Adds n items of each object type to the inbox.'''
+        for i in range(n):
+            create_dummy_post(self.sender)
+            post = Post.objects.filter(author=self.sender).order_by('-published')[0]
+            comment = Comment.objects.create(author=None, author_url=self.REMOTE_AUTHOR_URL, post=post, content='Test')
+            follow_request = FollowRequest.objects.create(from_author=None,
+                                                          from_author_url=f'{self.REMOTE_AUTHOR_URL}{i}',
+                                                          to_author=self.receiver,
+                                                          to_author_url=self.receiver.get_id_url())
+            like = Like.objects.create(author=self.sender, author_url=self.sender.get_id_url(),
+                                       object_type='POST', object_id=post.id, object_url=post.get_id_url())
+            for object_type, object_id in [('POST', post.id), ('COMMENT', comment.id),
+                                           ('FOLLOW', follow_request.id), ('LIKE', like.id)]:
+                InboxItem.objects.create(inbox=self.inbox, object_type=object_type, object_id=object_id)
+            InboxItem.objects.create(inbox=self.inbox, object_type='POST',
+                                     object_url=f'{self.REMOTE_AUTHOR_URL}/posts/{uuid.uuid4()}')
+
+    def test_num_queries(self, mock_get):
+        mock_get.return_value = mock.Mock(status_code=200, headers={}, json=lambda: {'type': 'author'})
+
+        # the number of queries does not depend on the number of items
+        num_queries = []
+        for n in [1, 3]:
+            self.add_items(n)
+            inbox_items = list(InboxItem.objects.filter(inbox=self.inbox))
+            with CaptureQueriesContext(connection) as ctx:
+                items = get_inbox_items_detail_dicts(inbox_items)
+            num_queries.append(len(ctx.captured_queries))
+        self.assertEqual(num_queries[0], num_queries[1])
+
+        # the output is the same as the one of serializing items one by one
+        self.assertEqual(items, [item.get_detail_dict() for item in inbox_items])
+        self.assertEqual(len(items), 5 * 4)
+
+
+class SharedInboxViewTestCase(TestCase):
+
+    NUM_AUTHORS = 5
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(self.NUM_AUTHORS)
+
+    def test_send_to_recipients(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        post_data = {'type': 'post', 'id': 'http://remote.example.com/service/authors/1/posts/2'}
+        recipients = [author.get_id_url() for author in Author.objects.all()]
+        recipients.append(f'http://remote.example.com/service/authors/{uuid.uuid4()}')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = c.post('/service/inbox', json.dumps({'object': post_data, 'recipients': recipients}),
+                              content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertDictEqual(response.json(), {'type': 'inbox', 'recipients': self.NUM_AUTHORS, 'created': self.NUM_AUTHORS})
+        self.assertEqual(InboxItem.objects.filter(object_url=post_data['id']).count(), self.NUM_AUTHORS)
+        num_queries = len(ctx.captured_queries)
+
+        # sending again does not duplicate items, and does not cost more queries
+        with CaptureQueriesContext(connection) as ctx:
+            response = c.post('/service/inbox', json.dumps({'object': post_data, 'recipients': recipients}),
+                              content_type='application/json')
+        self.assertEqual(response.json()['created'], 0)
+        self.assertLessEqual(len(ctx.captured_queries), num_queries)
+        self.assertEqual(InboxItem.objects.filter(object_url=post_data['id']).count(), self.NUM_AUTHORS)
+
+    def test_send_to_followers(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        remote_author_url = 'http://remote.example.com/service/authors/1'
+        followers = Author.objects.all()[:2]
+        for follower in followers:
+            FollowRequest.objects.create(from_author=follower, from_author_url=follower.get_id_url(),
+                                         to_author_url=remote_author_url)
+
+        post_data = {'type': 'post', 'id': f'{remote_author_url}/posts/2'}
+        response = c.post('/service/inbox', json.dumps({'object': post_data, 'followersOf': remote_author_url}),
+                          content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(InboxItem.objects.filter(object_url=post_data['id']).values_list('inbox__author', flat=True)),
+                         {follower.id for follower in followers})
+
+    def test_invalid(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        post_data = {'type': 'post', 'id': 'http://remote.example.com/service/authors/1/posts/2'}
+        response = c.post('/service/inbox', json.dumps({'object': post_data}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # a follow has a single recipient, so it must be sent to the author's inbox
+        follow_data = {'type': 'follow', 'actor': {}, 'object': {}}
+        response = c.post('/service/inbox', json.dumps({'object': follow_data, 'recipients': ['x']}),
+                          content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(InboxItem.objects.exists())
+
+
+class InboxBatchTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+        self.receiver = Author.objects.get(username='test0')
+        self.sender = Author.objects.get(username='test1')
+        create_dummy_post(self.receiver)
+        self.post = Post.objects.get(author=self.receiver)
+
+    def get_like_data(self, author_url):
+        return {
+            '@context': 'https://www.w3.org/ns/activitystreams',
+            'type': 'Like',
+            'author': {'id': author_url},
+            'object': self.post.get_id_url(),
+        }
+
+    def get_objects(self, n):
+        '''Returns n likes of the post and n remote posts, each from a different remote author.'''
+        objects = []
+        for i in range(n):
+            author_url = f'http://remote.example.com/service/authors/{uuid.uuid4()}'
+            objects.append(self.get_like_data(author_url))
+            objects.append({'type': 'post', 'id': f'{author_url}/posts/{uuid.uuid4()}'})
+        return objects
+
+    def post_batch(self, objects):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        return c.post(f'/service/authors/{self.receiver.id}/inbox', json.dumps(objects), content_type='application/json')
+
+    def test_send_batch(self):
+        follow_data = {
+            'type': 'Follow',
+            'actor': self.sender.get_detail_dict(),
+            'object': self.receiver.get_detail_dict(),
+        }
+        like_data = self.get_like_data(self.sender.get_id_url())
+        objects = [
+            {'type': 'post', 'id': self.post.get_id_url()},
+            like_data,
+            follow_data,
+            like_data,
+            follow_data,
+            {'type': 'unknown'},
+        ]
+        response = self.post_batch(objects)
+        self.assertEqual(response.status_code, 200)
+        statuses = [item['status'] for item in response.json()['items']]
+        self.assertListEqual(statuses, [201, 201, 201, 200, 400, 400])
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        like = Like.objects.get(author=self.sender, object_id=self.post.id)
+        follow_request = FollowRequest.objects.get(from_author=self.sender, to_author=self.receiver)
+        inbox_items = InboxItem.objects.filter(inbox__author=self.receiver)
+        self.assertSetEqual(set(inbox_items.values_list('object_id', flat=True)), {self.post.id, like.id, follow_request.id})
+
+        # sending the like and post again does not change anything
+        response = self.post_batch(objects[:2])
+        self.assertListEqual([item['status'] for item in response.json()['items']], [200, 200])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(inbox_items.count(), 3)
+
+    def test_invalid_urls(self):
+        follow_data = {
+            'type': 'Follow',
+            'actor': {**self.sender.get_detail_dict(), 'url': None},
+            'object': self.receiver.get_detail_dict(),
+        }
+        post_data = {'type': 'post', 'id': self.post.get_id_url()}
+        long_post_data = {'type': 'post', 'id': 'http://remote.example.com/' + 'a' * 1000}
+        response = self.post_batch([post_data, follow_data, long_post_data])
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['status'] for item in response.json()['items']], [201, 400, 400])
+        self.assertTrue(InboxItem.objects.filter(inbox__author=self.receiver, object_id=self.post.id).exists())
+        self.assertFalse(FollowRequest.objects.exists())
+
+    def test_rejected_by_database(self):
+        follow_data = {
+            'type': 'Follow',
+            'actor': self.sender.get_detail_dict(),
+            'object': self.receiver.get_detail_dict(),
+        }
+        objects = [{'type': 'post', 'id': self.post.get_id_url()}, follow_data, self.get_like_data(self.sender.get_id_url())]
+        bulk_create = FollowRequest.objects.bulk_create
+
+        def reject(follow_requests, **kwargs):
+            if follow_requests:
+                raise IntegrityError('rejected')
+            return bulk_create(follow_requests, **kwargs)
+
+        # the follow request is rejected by the database, but not the other objects
+        with mock.patch.object(FollowRequest.objects, 'bulk_create', side_effect=reject):
+            response = self.post_batch(objects)
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['status'] for item in response.json()['items']], [201, 400, 201])
+        self.assertEqual(InboxItem.objects.filter(inbox__author=self.receiver).count(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_send_ndjson(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        objects = self.get_objects(2)
+        lines = [json.dumps(data) for data in objects]
+        lines.insert(1, '{invalid')
+        response = c.post(f'/service/authors/{self.receiver.id}/inbox', '\n'.join(lines) + '\n',
+                          content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['status'] for item in response.json()['items']], [201, 400, 201, 201, 201])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    def test_num_queries(self):
+        # creates the inbox
+        self.post_batch(self.get_objects(1))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.post_batch(self.get_objects(2))
+        num_queries = len(ctx.captured_queries)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_batch(self.get_objects(20))
+        self.assertEqual(len(ctx.captured_queries), num_queries)
+        self.assertEqual(len(response.json()['items']), 40)
+        self.assertEqual(InboxItem.objects.filter(inbox__author=self.receiver).count(), 46)
+
+    def test_batch_too_large(self):
+        with mock.patch('service.views.views_inbox.InboxView.MAX_BATCH_SIZE', 3):
+            response = self.post_batch(self.get_objects(2))
+        self.assertEqual(response.status_code, 400)
+
+
+class InboxAsyncTestCase(TestCase):
+
+    def setUp(self):
+        self.node = ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+        self.receiver = Author.objects.get(username='test0')
+        self.sender = Author.objects.get(username='test1')
+        create_dummy_post(self.receiver)
+        self.post = Post.objects.get(author=self.receiver)
+        self.like_data = {
+            '@context': 'https://www.w3.org/ns/activitystreams',
+            'type': 'Like',
+            'author': self.sender.get_detail_dict(),
+            'object': self.post.get_id_url(),
+        }
+
+    def test_accept(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header(), HTTP_PREFER='respond-async')
+        for i in range(2):
+            # the like is journaled once
+            response = c.post(f'/service/authors/{self.receiver.id}/inbox', json.dumps(self.like_data),
+                              content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+        entry = InboxJournalEntry.objects.get()
+        self.assertEqual(entry.node, self.node)
+        self.assertEqual(entry.status, 'PENDING')
+        self.assertFalse(Like.objects.exists())
+
+        self.assertDictEqual(process_journal(), {'done': 1, 'failed': 0})
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'DONE')
+        like = Like.objects.get(author=self.sender, object_id=self.post.id)
+        self.assertTrue(InboxItem.objects.filter(inbox__author=self.receiver, object_id=like.id).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        # nothing is left to process
+        self.assertDictEqual(process_journal(), {'done': 0, 'failed': 0})
+
+    @override_settings(INBOX={'ASYNC': True})
+    def test_accept_batch(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        objects = [self.like_data, {'type': 'post', 'id': self.post.get_id_url()}, {'type': 'unknown'}]
+        response = c.post(f'/service/authors/{self.receiver.id}/inbox', json.dumps(objects),
+                          content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(InboxJournalEntry.objects.count(), 3)
+
+        self.assertDictEqual(process_journal(), {'done': 2, 'failed': 1})
+        self.assertEqual(InboxItem.objects.filter(inbox__author=self.receiver).count(), 2)
+        self.assertEqual(InboxJournalEntry.objects.get(status='FAILED').error, 'The type of the object is invalid')
+
+
+    def test_bad_entry(self):
+        follow_data = {
+            'type': 'Follow',
+            'actor': self.sender.get_detail_dict(),
+            'object': self.receiver.get_detail_dict(),
+        }
+        objects = [self.like_data, {**follow_data, 'actor': {**follow_data['actor'], 'url': None}},
+                   {'type': 'post', 'id': self.post.get_id_url()}]
+        journal_inbox_objects(objects, self.receiver)
+        self.assertDictEqual(process_journal(), {'done': 2, 'failed': 1})
+        self.assertEqual(InboxItem.objects.filter(inbox__author=self.receiver).count(), 2)
+
+        # an object that raises an error does not keep the others from being saved
+        bulk_create = FollowRequest.objects.bulk_create
+
+        def fail(follow_requests, **kwargs):
+            if follow_requests:
+                raise RuntimeError('failed')
+            return bulk_create(follow_requests, **kwargs)
+
+        post_data = {'type': 'post', 'id': f'http://remote.example.com/service/authors/1/posts/{uuid.uuid4()}'}
+        journal_inbox_objects([follow_data, post_data], self.receiver)
+        with mock.patch.object(FollowRequest.objects, 'bulk_create', side_effect=fail):
+            self.assertDictEqual(process_journal(), {'done': 1, 'failed': 1})
+        self.assertEqual(InboxJournalEntry.objects.filter(status='FAILED', error='failed').count(), 1)
+        self.assertTrue(InboxItem.objects.filter(inbox__author=self.receiver, object_url=post_data['id']).exists())
+        self.assertDictEqual(process_journal(), {'done': 0, 'failed': 0})
+
+
+class InboxDedupTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(3)
+        create_dummy_post(Author.objects.get(username='test0'))
+        self.post = Post.objects.get()
+        self.data = {'type': 'post', 'id': self.post.get_id_url()}
+
+    def send(self, receiver):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        return c.post(f'/service/authors/{receiver.id}/inbox', json.dumps(self.data), content_type='application/json')
+
+    def test_send_to_many_authors(self):
+        receivers = Author.objects.exclude(username='test0')
+        for receiver in receivers:
+            self.assertEqual(self.send(receiver).status_code, 201)
+        # the post is in the inbox of every receiver
+        self.assertEqual(InboxItem.objects.filter(object_id=self.post.id).count(), len(receivers))
+
+    def test_send_again(self):
+        receiver = Author.objects.get(username='test1')
+        self.send(receiver)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.send(receiver).status_code, 201)
+        self.assertEqual(InboxItem.objects.filter(inbox__author=receiver).count(), 1)
+
+        # the duplicate is dropped by the insert itself
+        inbox_item_queries = [q['sql'] for q in ctx.captured_queries if 'social_distribution_inboxitem' in q['sql']]
+        self.assertEqual(len(inbox_item_queries), 1)
+        self.assertIn('INSERT', inbox_item_queries[0])
+
+    def test_unique(self):
+        inbox = Inbox.objects.create(author=Author.objects.get(username='test1'))
+        InboxItem.objects.create(inbox=inbox, object_id=self.post.id, object_url=self.post.get_id_url())
+        with self.assertRaises(IntegrityError):
+            InboxItem.objects.create(inbox=inbox, object_id=self.post.id)
+
+
+@override_settings(INBOX={'MAX_AGE': 60 * 60, 'MAX_ITEMS': 3, 'PURGE_CHUNK_SIZE': 2})
+class InboxRetentionTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+        self.inboxes = [Inbox.objects.create(author=author) for author in Author.objects.all()]
+
+    def create_items(self, inbox, n, age=0):
+        now = timezone.now()
+        return InboxItem.objects.bulk_create([
+            InboxItem(inbox=inbox, object_url=f'http://remote.example.com/posts/{uuid.uuid4()}',
+                      date_created=now - timedelta(seconds=age + i))
+            for i in range(n)])
+
+    def test_purge(self):
+        self.create_items(self.inboxes[0], 2, age=60 * 60 * 2)
+        kept = self.create_items(self.inboxes[0], 2)
+        newest = self.create_items(self.inboxes[1], 3)
+        self.create_items(self.inboxes[1], 3, age=60)
+
+        self.assertDictEqual(purge_inboxes(), {'expired': 2, 'over_cap': 3})
+        self.assertSetEqual(set(InboxItem.objects.values_list('object_url', flat=True)),
+                            {item.object_url for item in kept + newest})
+        self.assertDictEqual(purge_inboxes(), {'expired': 0, 'over_cap': 0})
+
+    def test_clear_inbox(self):
+        self.create_items(self.inboxes[0], 5)
+        self.create_items(self.inboxes[1], 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(clear_inbox(self.inboxes[0]), 5)
+        # 3 chunks and a last query that finds nothing
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]), 4)
+        self.assertEqual(InboxItem.objects.count(), 1)
+
+
+class InboxDeltaTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(1)
+        self.author = Author.objects.get(username='test0')
+        self.inbox = Inbox.objects.create(author=self.author)
+        self.client = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        self.client.login(username=self.author.username, password='temporary')
+        self.url = f'/service/authors/{self.author.id}/inbox'
+
+    def add_items(self, n) -> list:
+        urls = []
+        for i in range(n):
+            post = Post.objects.create(author=self.author, title=f'post {i}')
+            InboxItem.objects.create(inbox=self.inbox, object_type='POST', object_id=post.id)
+            urls.append(post.get_id_url())
+        return urls
+
+    def get_urls(self, data) -> list:
+        return [item['id'] for item in data['items']]
+
+    def test_since(self):
+        self.add_items(2)
+        response = self.client.get(self.url)
+        since = response.json()['since']
+
+        # nothing is new
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, 304)
+
+        new_urls = self.add_items(3)
+        response = self.client.get(self.url, {'since': since, 'size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # the oldest new items come first, and are listed newest first
+        self.assertListEqual(self.get_urls(data), new_urls[1::-1])
+        self.assertTrue(data['more'])
+
+        response = self.client.get(self.url, {'since': data['since'], 'size': 2})
+        data = response.json()
+        self.assertListEqual(self.get_urls(data), new_urls[2:])
+        self.assertFalse(data['more'])
+        self.assertEqual(self.client.get(self.url, {'since': data['since']}).status_code, 304)
+
+    def test_invalid_since(self):
+        response = self.client.get(self.url, {'since': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        # a blank watermark does not list the inbox from its oldest item
+        self.add_items(1)
+        response = self.client.get(self.url, {'since': ''})
+        self.assertEqual(response.status_code, 400)
+
+    def test_since_empty_inbox(self):
+        since = self.client.get(self.url).json()['since']
+        self.assertEqual(self.client.get(self.url, {'since': since}).status_code, 304)
+
+        new_urls = self.add_items(2)
+        response = self.client.get(self.url, {'since': since})
+        self.assertListEqual(self.get_urls(response.json()), new_urls[::-1])
+
+
+class InboxUnreadTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+        self.author = Author.objects.get(username='test0')
+        self.client = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        self.client.login(username=self.author.username, password='temporary')
+        self.url = f'/service/authors/{self.author.id}/inbox'
+
+    def send(self, data):
+        return self.client.post(self.url, json.dumps(data), content_type='application/json')
+
+    def get_unread(self) -> int:
+        with mock.patch.object(InboxItem, 'get_detail_dict') as mock_get_detail_dict:
+            response = self.client.get(f'{self.url}/read')
+        mock_get_detail_dict.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        return response.json()['unread']
+
+    def get_post_data(self) -> dict:
+        return {'type': 'post', 'id': f'http://remote.example.com/service/authors/1/posts/{uuid.uuid4()}'}
+
+    def test_unread_count(self):
+        self.assertEqual(self.get_unread(), 0)
+        post_data = self.get_post_data()
+        self.send(post_data)
+        # a duplicate is not counted
+        self.send(post_data)
+        self.client.post(self.url, json.dumps([self.get_post_data(), self.get_post_data(), post_data]),
+                         content_type='application/json')
+        add_to_inboxes(Author.objects.all(), 'POST', None, 'http://remote.example.com/service/authors/1/posts/1')
+        self.assertEqual(self.get_unread(), 4)
+        self.assertEqual(Inbox.objects.get(author=Author.objects.get(username='test1')).unread_count, 1)
+
+    def test_concurrent_insert(self):
+        inbox = get_inbox(self.author)
+        other_inbox = get_inbox(Author.objects.get(username='test1'))
+        post_data = [self.get_post_data(), self.get_post_data()]
+        bulk_create = InboxItem.objects.bulk_create
+
+        def add_concurrently(items, **kwargs):
+            # the first object is added by another request between the existence check and the insert
+            InboxItem.objects.create(inbox=inbox, object_url=post_data[0]['id'])
+            return bulk_create(items, **kwargs)
+
+        with mock.patch.object(InboxItem.objects, 'bulk_create', side_effect=add_concurrently):
+            response = self.client.post(self.url, json.dumps(post_data), content_type='application/json')
+        self.assertEqual([item['status'] for item in response.json()['items']], [200, 201])
+        self.assertEqual(self.get_unread(), 2)
+
+        url = 'http://remote.example.com/service/authors/1/posts/1'
+        def add_concurrently(items, **kwargs):
+            InboxItem.objects.create(inbox=other_inbox, object_url=url)
+            return bulk_create(items, **kwargs)
+
+        with mock.patch.object(InboxItem.objects, 'bulk_create', side_effect=add_concurrently):
+            self.assertEqual(add_to_inboxes(Author.objects.all(), 'POST', None, url), 1)
+        self.assertEqual(self.get_unread(), 3)
+        other_inbox.refresh_from_db()
+        self.assertEqual(other_inbox.unread_count, 1)
+
+    def test_mark_read(self):
+        for i in range(2):
+            self.send(self.get_post_data())
+        since = self.client.get(self.url).json()['since']
+        self.send(self.get_post_data())
+
+        # the item added after the page was loaded stays unread
+        response = self.client.post(f'{self.url}/read', json.dumps({'since': since}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unread'], 1)
+        self.assertEqual(response.json()['lastRead'], since)
+        self.assertEqual(self.get_unread(), 1)
+
+        self.send(self.get_post_data())
+        self.assertEqual(self.get_unread(), 2)
+        response = self.client.post(f'{self.url}/read')
+        self.assertEqual(response.json()['unread'], 0)
+
+        self.send(self.get_post_data())
+        self.client.delete(self.url)
+        self.assertEqual(self.get_unread(), 0)
+
+    def test_invalid_watermark(self):
+        response = self.client.post(f'{self.url}/read', json.dumps({'since': 'invalid'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'{self.url}/read', json.dumps({'since': ''}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
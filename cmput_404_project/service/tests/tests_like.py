@@ -1,6 +1,8 @@
+import uuid
+
 from django.test import TestCase, Client
 
-from .helper import create_dummy_authors, create_dummy_post, create_dummy_comments, create_dummy_likes_to_post, create_dummy_likes_to_comment
+from .helper import get_basic_auth_header, create_dummy_authors, create_dummy_post, create_dummy_comments, create_dummy_likes_to_post, create_dummy_likes_to_comment
 from service.models import ServerNode
 from social_distribution.models import Author, Post, Comment, Like
 
@@ -201,3 +203,81 @@ class LikedViewTestCase(TestCase):
 
         
 
+
+
+class LikeCountsViewTestCase(TestCase):
+    NUM_LIKE_AUTHORS = 3
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True) 
+        create_dummy_authors(self.NUM_LIKE_AUTHORS + 1)
+        author = Author.objects.get(username='test0')
+        create_dummy_post(author, visibility='PUBLIC')
+        create_dummy_comments(1, author, Post.objects.get(author=author))
+
+    def test_create_like(self):
+        author = Author.objects.get(username='test0')
+        post = Post.objects.get(author=author)
+        like_authors = Author.objects.all().exclude(id=author.id)
+        create_dummy_likes_to_post(like_authors, post)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.NUM_LIKE_AUTHORS)
+
+        # an author likes an object only once
+        like, created = Like.objects.create_like(author=like_authors[0],
+                                                 author_url=like_authors[0].get_id_url(),
+                                                 object_type='POST',
+                                                 object_id=post.id,
+                                                 object_url=post.get_id_url())
+        self.assertFalse(created)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.NUM_LIKE_AUTHORS)
+        self.assertEqual(Like.objects.filter(object_id=post.id).count(), self.NUM_LIKE_AUTHORS)
+
+        Like.objects.delete_like(like)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.NUM_LIKE_AUTHORS - 1)
+
+    def test_delete_likes(self):
+        author = Author.objects.get(username='test0')
+        post = Post.objects.get(author=author)
+        comment = Comment.objects.get(post=post)
+        like_authors = Author.objects.all().exclude(id=author.id)
+        create_dummy_likes_to_post(like_authors, post)
+        create_dummy_likes_to_comment(like_authors, comment)
+
+        # likes deleted by QuerySet.delete() are not counted
+        Like.objects.filter(object_id=post.id, author=like_authors[0]).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, self.NUM_LIKE_AUTHORS - 1)
+
+        # nor are likes deleted with their author
+        Author.objects.get(id=like_authors[1].id).delete()
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(post.like_count, self.NUM_LIKE_AUTHORS - 2)
+        self.assertEqual(comment.like_count, self.NUM_LIKE_AUTHORS - 1)
+        self.assertEqual(post.like_count, Like.objects.filter(object_id=post.id).count())
+
+    def test_get(self):
+        author = Author.objects.get(username='test0')
+        post = Post.objects.get(author=author)
+        comment = Comment.objects.get(post=post)
+        like_authors = Author.objects.all().exclude(id=author.id)
+        create_dummy_likes_to_post(like_authors, post)
+        create_dummy_likes_to_comment(like_authors[:1], comment)
+
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        unknown_url = f'{author.get_id_url()}/posts/{uuid.uuid4()}'
+        response = c.get('/service/like-counts', {'object': [post.get_id_url(), comment.get_id_url(), unknown_url],
+                                                  'author': like_authors[1].get_id_url()})
+        self.assertEqual(response.status_code, 200)
+        items = response.json()['items']
+        self.assertDictEqual(items, {
+            post.get_id_url(): {'count': self.NUM_LIKE_AUTHORS, 'liked': True},
+            comment.get_id_url(): {'count': 1, 'liked': False},
+        })
+
+        # no objects
+        response = c.get('/service/like-counts')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from service.models import ServerNode, OutboxActivity, OutboxDelivery
+from service.outbox import enqueue, expand_activities, deliver_due, get_config
+from social_distribution.models import Author, Post, Follower, FollowRequest, InboxItem
+from .helper import create_dummy_authors, create_dummy_post
+
+
+REMOTE_AUTHOR_URL = 'http://remote.example.com/service/authors/9de17f29-c12e-4f97-bcbb-d34cc908f1ba'
+
+
+@mock.patch('service.outbox.federation_client.post')
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        self.node = ServerNode.objects.create(host='http://remote.example.com')
+        create_dummy_authors(3)
+        self.author = Author.objects.get(username='test0')
+        self.local_follower = Author.objects.get(username='test1')
+        Follower.objects.create(target_author=self.author,
+                                source_author_id=self.local_follower.id,
+                                source_author_url=self.local_follower.get_id_url())
+        Follower.objects.create(target_author=self.author, source_author_url=REMOTE_AUTHOR_URL)
+        # a follower on an unknown node
+        Follower.objects.create(target_author=self.author, source_author_url='http://unknown.example.com/authors/1')
+
+        create_dummy_post(self.author)
+        self.post = Post.objects.get(author=self.author)
+        enqueue('POST', self.post, self.author)
+
+    def test_deliver(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=201)
+        self.assertEqual(expand_activities(), 1)
+        self.assertTrue(OutboxActivity.objects.get().is_expanded)
+
+        # the local follower gets the post in its inbox without a request
+        self.assertTrue(InboxItem.objects.filter(inbox__author=self.local_follower, object_id=self.post.id).exists())
+        delivery = OutboxDelivery.objects.get()
+        self.assertEqual(delivery.inbox_url, f'{REMOTE_AUTHOR_URL}/inbox')
+
+        counts = deliver_due()
+        self.assertEqual(counts, {'delivered': 1, 'retried': 0, 'dead': 0})
+        args, kwargs = mock_post.call_args
+        self.assertEqual(args, (f'{REMOTE_AUTHOR_URL}/inbox',))
+        self.assertEqual(kwargs['json']['id'], self.post.get_id_url())
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, 'DELIVERED')
+
+        # nothing is left to send
+        self.assertEqual(deliver_due(), {'delivered': 0, 'retried': 0, 'dead': 0})
+
+    def test_retry(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=503)
+        expand_activities()
+
+        for i in range(get_config()['MAX_ATTEMPTS']):
+            OutboxDelivery.objects.update(next_attempt=timezone.now())
+            counts = deliver_due()
+        delivery = OutboxDelivery.objects.get()
+        self.assertEqual(counts['dead'], 1)
+        self.assertEqual(delivery.status, 'DEAD')
+        self.assertEqual(delivery.num_attempts, get_config()['MAX_ATTEMPTS'])
+        self.assertEqual(delivery.last_error, 'HTTP 503')
+
+    def test_backoff(self, mock_post):
+        mock_post.return_value = mock.Mock(status_code=503)
+        expand_activities()
+
+        self.assertEqual(deliver_due()['retried'], 1)
+        delivery = OutboxDelivery.objects.get()
+        self.assertEqual(delivery.status, 'PENDING')
+        self.assertGreater(delivery.next_attempt, timezone.now())
+
+        # not due yet
+        self.assertEqual(deliver_due()['retried'], 0)
+
+    def test_rejected(self, mock_post):
+        # a 4xx response is not retried
+        mock_post.return_value = mock.Mock(status_code=400)
+        expand_activities()
+        self.assertEqual(deliver_due()['dead'], 1)
+
+    def test_friends_post(self, mock_post):
+        # test2 and the remote author are friends of the author, test1 and the unknown author only follow it
+        friend = Author.objects.get(username='test2')
+        Follower.objects.create(target_author=self.author, source_author_id=friend.id,
+                                source_author_url=friend.get_id_url())
+        Follower.objects.create(target_author=friend, source_author_id=self.author.id,
+                                source_author_url=self.author.get_id_url())
+        FollowRequest.objects.create(from_author=self.author, to_author_url=REMOTE_AUTHOR_URL)
+
+        OutboxActivity.objects.all().delete()
+        Post.objects.filter(id=self.post.id).update(visibility='FRIENDS')
+        enqueue('POST', Post.objects.get(id=self.post.id), self.author)
+        expand_activities()
+
+        self.assertTrue(InboxItem.objects.filter(inbox__author=friend, object_id=self.post.id).exists())
+        self.assertFalse(InboxItem.objects.filter(inbox__author=self.local_follower, object_id=self.post.id).exists())
+        self.assertEqual([d.inbox_url for d in OutboxDelivery.objects.all()], [f'{REMOTE_AUTHOR_URL}/inbox'])
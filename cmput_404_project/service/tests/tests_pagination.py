@@ -0,0 +1,89 @@
+import base64
+
+from django.test import TestCase, Client
+from django.utils import timezone
+
+from social_distribution.models import Author, Post, Comment
+from service.models import ServerNode
+from service.pagination import encode_cursor, decode_cursor, get_keyset_page
+from .helper import get_basic_auth_header, create_dummy_authors, create_dummy_posts, create_dummy_comments
+
+
+class KeysetPaginationTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(1)
+
+    def test_cursor(self):
+        values = ['2022-03-01 12:00:00+00:00', 'a/b']
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+        self.assertRaises(ValueError, decode_cursor, 'not a cursor')
+        # not a list of values
+        self.assertRaises(ValueError, decode_cursor, base64.urlsafe_b64encode(b'{}').decode('utf-8'))
+
+
+    def test_get_keyset_page(self):
+        author = Author.objects.get(username='test0')
+        create_dummy_posts(7, author)
+        # rows with equal keys are ordered by id
+        Post.objects.update(modified=timezone.now())
+        expected = list(Post.objects.order_by('-modified', '-id'))
+
+        items = []
+        cursor = ''
+        for i in range(3):
+            page, cursor = get_keyset_page(Post.objects.all(), ['-modified', '-id'], cursor, 3)
+            items.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(i, 2)
+        self.assertEqual(items, expected)
+
+
+    def test_posts_cursor(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        author = Author.objects.get(username='test0')
+        create_dummy_posts(5, author, visibility='PUBLIC')
+        create_dummy_posts(2, author, visibility='FRIENDS')
+
+        url = f'/service/authors/{author.id}/posts'
+        response = c.get(url, {'cursor': '', 'size': 3})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['items']), 3)
+        self.assertIsNotNone(data['next'])
+
+        response = c.get(url, {'cursor': data['next'], 'size': 3})
+        self.assertEqual(response.status_code, 200)
+        next_data = response.json()
+        self.assertEqual(len(next_data['items']), 2)
+        self.assertIsNone(next_data['next'])
+
+        # the pages are the same as the ones of page/size pagination
+        items = c.get(url, {'page': 1, 'size': 5}).json()['items']
+        self.assertEqual(data['items'] + next_data['items'], items)
+
+        # invalid cursor
+        response = c.get(url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_comments_cursor(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        author = Author.objects.get(username='test0')
+        create_dummy_posts(1, author)
+        post = Post.objects.get(author=author)
+        create_dummy_comments(4, author, post)
+
+        url = f'/service/authors/{author.id}/posts/{post.id}/comments'
+        ids = []
+        cursor = ''
+        while cursor is not None:
+            data = c.get(url, {'cursor': cursor, 'size': 3}).json()
+            self.assertNotIn('page', data)
+            ids.extend(comment['id'] for comment in data['comments'])
+            cursor = data['next']
+
+        expected = Comment.objects.filter(post=post).order_by('-date_created', '-id')
+        self.assertEqual(ids, [comment.get_id_url() for comment in expected])
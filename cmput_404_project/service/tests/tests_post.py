@@ -1,11 +1,19 @@
 import uuid
 import json
+from unittest import mock
 
 from django.test import TestCase, Client
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ObjectDoesNotExist
-
-from social_distribution.models import Author, Post
-from .helper import create_dummy_authors, create_dummy_post, create_dummy_posts
+from django.db import connection
+
+from social_distribution.models import Author, Post, PostAudience, Friends
+from service.outbox import get_recipients
+from social_distribution.serializers import get_posts_detail_dicts
+from social_distribution.rendering import MarkdownRenderer
+from service.models import OutboxActivity
+from .helper import create_dummy_authors, create_dummy_post, create_dummy_posts, create_dummy_comments, get_basic_auth_header
 from service.models import ServerNode
 
 
@@ -208,6 +216,33 @@ class PostsViewTestCase(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+    def test_get_num_queries(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        author = Author.objects.get(username='test0')
+        num_posts = 15
+        create_dummy_posts(num_posts, author, visibility='PUBLIC')
+        for post in Post.objects.filter(author=author):
+            create_dummy_comments(Post.DEFAULT_COMMENTS_SIZE + 1, author, post)
+
+        # the number of queries must not depend on the page size
+        c.get(f'/service/authors/{author.id}/posts?page=1&size=1')
+        num_queries = []
+        for size in [1, 5, num_posts]:
+            with CaptureQueriesContext(connection) as ctx:
+                response = c.get(f'/service/authors/{author.id}/posts?page=1&size={size}')
+            self.assertEqual(response.status_code, 200)
+            num_queries.append(len(ctx.captured_queries))
+        self.assertEqual(len(set(num_queries)), 1)
+
+        # the bulk serialized posts must be equal to the ones serialized one by one
+        data = response.json()
+        self.assertEqual(len(data['items']), num_posts)
+        for post_data in data['items']:
+            post = Post.objects.get(id=post_data['id'].split('/')[-1])
+            self.assertEqual(len(post_data['commentsSrc']['comments']), Post.DEFAULT_COMMENTS_SIZE)
+            self.assertDictEqual(post_data, post.get_detail_dict())
+
+
     def test_head(self):
         c = Client()
         author = Author.objects.get(username='test0')
@@ -254,3 +289,259 @@ class PostsViewTestCase(TestCase):
 
 
 
+
+
+class PostAudienceTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(4)
+        self.author, self.friend1, self.friend2, self.stranger = \
+            [Author.objects.get(username=f'test{i}') for i in range(4)]
+        for friend in [self.friend1, self.friend2]:
+            Friends.objects.create(sender=self.author, receiver=friend, status='accepted')
+            Friends.objects.create(sender=friend, receiver=self.author, status='accepted')
+
+    def new_post(self, visibility):
+        c = Client()
+        c.login(username='test0', password='temporary')
+        response = c.post('/posts/new_post/', {
+            'title': 'Friends Post',
+            'description': 'description',
+            'content_type': 'text/plain',
+            'content': 'content',
+            'image': '',
+            'categories': 'test',
+            'visibility': visibility,
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def get_private_posts(self, author) -> list:
+        c = Client()
+        c.login(username=author.username, password='temporary')
+        response = c.get('/posts/private_posts')
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['posts'])
+
+    def test_friends_post(self):
+        self.new_post('FRIENDS')
+
+        # saved once, and read by the friends of the author
+        post = Post.objects.get(author=self.author)
+        self.assertEqual(post.visibility, 'FRIENDS')
+        self.assertFalse(post.audience.exists())
+
+        self.assertListEqual(self.get_private_posts(self.friend1), [post])
+        self.assertListEqual(self.get_private_posts(self.stranger), [])
+
+        # an edit is seen by every friend
+        Post.objects.filter(id=post.id).update(title='Edited')
+        self.assertEqual(self.get_private_posts(self.friend2)[0].title, 'Edited')
+
+        activity = OutboxActivity.objects.get(object_id=post.id)
+        recipients = get_recipients(activity, post)
+        self.assertSetEqual({author.id for _, author in recipients}, {self.friend1.id, self.friend2.id})
+
+    def get_post_data(self, visibility) -> dict:
+        return {
+            'title': 'Friends Post',
+            'description': 'description',
+            'content_type': 'text/plain',
+            'content': 'content',
+            'image': '',
+            'categories': 'test',
+            'visibility': visibility,
+        }
+
+    def test_api_friends_post(self):
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        c.login(username='test0', password='temporary')
+        data = self.get_post_data('FRIENDS')
+        response = c.post(f'/service/authors/{self.author.id}/posts', json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        post = Post.objects.get(author=self.author)
+        self.assertListEqual(self.get_private_posts(self.friend1), [post])
+        self.assertListEqual(self.get_private_posts(self.stranger), [])
+
+        # a post created with an id
+        post_id = uuid.uuid4()
+        response = c.put(f'/service/authors/{self.author.id}/posts/{post_id}', json.dumps(data),
+                         content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.get_private_posts(self.friend2)), 2)
+
+        # both posts are sent to the inboxes of the friends
+        self.assertEqual(OutboxActivity.objects.filter(object_id__in=[post.id, post_id]).count(), 2)
+
+    def test_edit_to_private(self):
+        self.new_post('FRIENDS')
+        post = Post.objects.get(author=self.author)
+
+        # through the API
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        c.login(username='test0', password='temporary')
+        response = c.put(f'/service/authors/{self.author.id}/posts/{post.id}',
+                         json.dumps(self.get_post_data('PRIVATE')), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(self.get_private_posts(self.friend1), [])
+
+        # a PRIVATE post made FRIENDS is no longer read by its recipient
+        PostAudience.objects.create(post=post, recipient=self.stranger)
+        self.assertListEqual(self.get_private_posts(self.stranger), [post])
+        c = Client()
+        c.login(username='test0', password='temporary')
+        c.post(f'/posts/own_posts/{post.id}/', self.get_post_data('FRIENDS'))
+        self.assertListEqual(self.get_private_posts(self.stranger), [])
+        self.assertListEqual(self.get_private_posts(self.friend1), [post])
+
+        c.post(f'/posts/own_posts/{post.id}/', self.get_post_data('PRIVATE'))
+        self.assertListEqual(self.get_private_posts(self.friend1), [])
+
+    def test_unfriend(self):
+        self.new_post('FRIENDS')
+        post = Post.objects.get(author=self.author)
+
+        # a former friend loses access
+        Friends.objects.filter(sender=self.friend1, receiver=self.author).delete()
+        self.assertListEqual(self.get_private_posts(self.friend1), [])
+
+        # a new friend can read the posts saved before
+        Friends.objects.create(sender=self.author, receiver=self.stranger, status='accepted')
+        Friends.objects.create(sender=self.stranger, receiver=self.author, status='accepted')
+        self.assertListEqual(self.get_private_posts(self.stranger), [post])
+
+    def test_share_friends_post(self):
+        create_dummy_post(self.friend1, visibility='FRIENDS')
+        post = Post.objects.get(author=self.friend1)
+
+        c = Client()
+        c.login(username='test0', password='temporary')
+        c.post(f'/posts/share_post/{post.id}/')
+
+        shared = Post.objects.get(author=self.author)
+        self.assertEqual(shared.share_from, self.friend1)
+        self.assertEqual(shared.visibility, 'FRIENDS')
+        self.assertIn(shared, self.get_private_posts(self.friend2))
+        self.assertListEqual(self.get_private_posts(self.stranger), [])
+
+
+class PostShareTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(3)
+        self.author, self.sharer1, self.sharer2 = [Author.objects.get(username=f'test{i}') for i in range(3)]
+        create_dummy_post(self.author)
+        self.post = Post.objects.get(author=self.author)
+
+    def share(self, author, post):
+        c = Client()
+        c.login(username=author.username, password='temporary')
+        c.post(f'/posts/share_post/{post.id}/')
+        return Post.objects.get(author=author, shared_post=post.get_content_post())
+
+    def test_origin(self):
+        self.assertEqual(self.post.source, self.post.get_id_url())
+        self.assertEqual(self.post.origin, self.post.get_id_url())
+
+    def test_share(self):
+        share = self.share(self.sharer1, self.post)
+        self.assertEqual(share.shared_post, self.post)
+        self.assertEqual(share.share_from, self.author)
+        self.assertEqual(share.content, '')
+        self.assertEqual(share.source, self.post.get_id_url())
+        self.assertEqual(share.origin, self.post.get_id_url())
+
+        # sharing again does not make another share
+        self.share(self.sharer1, self.post)
+        self.assertEqual(Post.objects.filter(author=self.sharer1).count(), 1)
+
+        # a share of a share refers to the original post
+        share2 = self.share(self.sharer2, share)
+        self.assertEqual(share2.shared_post, self.post)
+        self.assertEqual(share2.share_from, self.sharer1)
+        self.assertEqual(share2.source, share.get_id_url())
+        self.assertEqual(share2.origin, self.post.get_id_url())
+
+    def test_get_detail_dict(self):
+        share = self.share(self.sharer1, self.post)
+        Post.objects.filter(id=self.post.id).update(content='Edited content')
+
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        response = c.get(f'/service/authors/{self.sharer1.id}/posts/{share.id}')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['id'], share.get_id_url())
+        self.assertEqual(data['title'], 'Test Post')
+        self.assertEqual(data['content'], 'Edited content')
+        self.assertEqual(data['origin'], self.post.get_id_url())
+        self.assertEqual(data['share_from']['id'], self.author.get_id_url())
+
+        # the original posts of a page of shares are loaded in one query:
+        # posts, authors, shared-from authors, original posts and comments
+        self.share(self.sharer1, Post.objects.create(author=self.author, title='Another Post'))
+        posts = Post.objects.filter(author=self.sharer1)
+        with self.assertNumQueries(5):
+            get_posts_detail_dicts(posts)
+
+
+class PostRenderTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        create_dummy_authors(2)
+        self.author = Author.objects.get(username='test0')
+
+    def test_render_on_save(self):
+        create_dummy_post(self.author, content_type='text/markdown')
+        post = Post.objects.get(author=self.author)
+        self.assertEqual(post.content_html, '<p>Test post content</p>\n')
+
+        post.content = '**bold**'
+        post.save(update_fields=['content'])
+        self.assertEqual(Post.objects.get(id=post.id).content_html, '<p><strong>bold</strong></p>\n')
+
+        post.content_type = 'text/plain'
+        post.save()
+        post = Post.objects.get(id=post.id)
+        self.assertEqual(post.content_html, '')
+        self.assertEqual(post.content_hash, '')
+
+    def test_raw_html(self):
+        create_dummy_post(self.author, content_type='text/markdown')
+        post = Post.objects.get(author=self.author)
+        post.content = '<script>alert(1)</script>\n\n<img src=x onerror=alert(1)> **bold**'
+        post.save()
+        self.assertEqual(Post.objects.get(id=post.id).content_html,
+                         '<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>\n'
+                         '<p>&lt;img src=x onerror=alert(1)&gt; <strong>bold</strong></p>\n')
+
+    def test_unchanged_content(self):
+        create_dummy_post(self.author, content_type='text/markdown')
+        post = Post.objects.get(author=self.author)
+        with mock.patch('social_distribution.rendering.markdown_renderer.render') as mock_render:
+            post.title = 'Edited'
+            post.save()
+            mock_render.assert_not_called()
+
+    def test_backfill(self):
+        create_dummy_post(self.author, content_type='text/markdown')
+        Post.objects.update(content_html='', content_hash='')
+        call_command('render_markdown', stdout=mock.Mock())
+        self.assertEqual(Post.objects.get().content_html, '<p>Test post content</p>\n')
+
+
+class MarkdownRendererTestCase(TestCase):
+
+    def test_lru(self):
+        renderer = MarkdownRenderer(MAX_ENTRIES=2)
+        self.assertEqual(renderer.render('a'), '<p>a</p>\n')
+        renderer.render('b')
+        with mock.patch('markdown_it.MarkdownIt.render', return_value='') as mock_render:
+            renderer.render('a')
+            mock_render.assert_not_called()
+            # 'b' is the least recently used
+            renderer.render('c')
+            renderer.render('b')
+            self.assertEqual(mock_render.call_count, 2)
@@ -0,0 +1,62 @@
+import uuid
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from social_distribution.models import Author, Post, Comment, Like, Inbox, InboxItem, Follower, FollowRequest
+from .helper import create_dummy_authors, create_dummy_post
+
+
+def get_query_plan(queryset) -> str:
+    '''Returns the EXPLAIN output of queryset.'''
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # tables of the test database are tiny, so the planner would pick a sequential scan anyway
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    return queryset.explain()
+
+
+def is_full_scan(plan) -> bool:
+    '''Returns True if the EXPLAIN output of SQLite or PostgreSQL reads a whole table.'''
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' in plan
+    # SQLite prints rows of "<id> <parent> <notused> <detail>", where the detail is
+    # "SEARCH <table> USING INDEX ..." for index lookups and "SCAN <table> ..." otherwise
+    return any(line.split(maxsplit=3)[-1].startswith('SCAN') for line in plan.splitlines() if line.strip())
+
+
+class QueryPlanTestCase(TestCase):
+    '''
+    Asserts that the hot lookups of the service are answered from an index.
+
+    Add the query here when adding an index for a new access pattern.
+    '''
+
+    def setUp(self):
+        create_dummy_authors(1)
+        self.author = Author.objects.get(username='test0')
+        create_dummy_post(self.author)
+        self.post = Post.objects.get(author=self.author)
+        self.inbox = Inbox.objects.create(author=self.author)
+
+    def get_hot_queries(self) -> dict:
+        url = self.author.get_id_url()
+        return {
+            'likes of a post': Like.objects.filter(object_type='POST', object_url=self.post.get_id_url()),
+            'likes of an author': Like.objects.filter(author=self.author, author_url=url),
+            'inbox items': InboxItem.objects.filter(inbox=self.inbox).order_by('-date_created'),
+            'inbox item of an object': InboxItem.objects.filter(object_id=uuid.uuid4()),
+            'expired inbox items': InboxItem.objects.filter(date_created__lt=timezone.now()),
+            'follower': Follower.objects.filter(target_author=self.author, source_author_id=uuid.uuid4()),
+            'follow request': FollowRequest.objects.filter(from_author_url=url, to_author=self.author),
+            'public posts': Post.objects.filter(author=self.author, visibility='PUBLIC').order_by('-modified'),
+            'posts sent to an author': Post.objects.filter(audience__recipient=self.author).order_by('-published'),
+            'comments of a post': Comment.objects.filter(post=self.post).order_by('-date_created'),
+        }
+
+    def test_no_full_scan(self):
+        for name, queryset in self.get_hot_queries().items():
+            with self.subTest(name):
+                plan = get_query_plan(queryset)
+                self.assertFalse(is_full_scan(plan), f'{name} is a full scan:\n{plan}')
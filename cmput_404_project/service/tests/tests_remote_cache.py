@@ -0,0 +1,133 @@
+import threading
+
+from unittest import mock
+
+from django.test import TestCase, Client
+
+from service.models import ServerNode
+from social_distribution.remote_cache import RemoteObjectCache
+from .helper import get_basic_auth_header
+
+
+REMOTE_AUTHOR_URL = 'http://remote.example.com/service/authors/9de17f29-c12e-4f97-bcbb-d34cc908f1ba'
+REMOTE_POST_URL = f'{REMOTE_AUTHOR_URL}/posts/de305d54-75b4-431b-adb2-eb6b9e546013'
+
+
+def get_mock_response(status_code=200, data=None, headers=None):
+    '''Returns a mock of requests.Response'''
+    response = mock.Mock()
+    response.status_code = status_code
+    response.json.return_value = data if data is not None else {}
+    response.headers = headers if headers is not None else {}
+    return response
+
+
+@mock.patch('social_distribution.remote_cache.federation_client.get')
+class RemoteObjectCacheTestCase(TestCase):
+
+    def test_get(self, mock_get):
+        cache = RemoteObjectCache()
+        data = {'type': 'author', 'id': REMOTE_AUTHOR_URL}
+        mock_get.return_value = get_mock_response(data=data)
+
+        # only the first lookup makes a request
+        for i in range(3):
+            self.assertDictEqual(cache.get(REMOTE_AUTHOR_URL), data)
+        self.assertEqual(mock_get.call_count, 1)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+
+
+    def test_copy(self, mock_get):
+        cache = RemoteObjectCache()
+        mock_get.return_value = get_mock_response(data={'type': 'post', 'author': {'displayName': 'test'}})
+
+        # changes made by a caller are not seen by the next callers
+        data = cache.get(REMOTE_POST_URL)
+        data['content'] = '<p>rendered</p>'
+        data['author']['displayName'] = 'changed'
+        self.assertDictEqual(cache.get(REMOTE_POST_URL), {'type': 'post', 'author': {'displayName': 'test'}})
+        cache.get_many([REMOTE_POST_URL])[REMOTE_POST_URL]['type'] = 'changed'
+        self.assertEqual(cache.get(REMOTE_POST_URL)['type'], 'post')
+
+
+    def test_negative(self, mock_get):
+        cache = RemoteObjectCache()
+        mock_get.return_value = get_mock_response(status_code=404)
+
+        for i in range(3):
+            self.assertDictEqual(cache.get(REMOTE_POST_URL), {})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(cache.get_stats()['negative_hits'], 2)
+
+
+    def test_revalidate(self, mock_get):
+        cache = RemoteObjectCache(TIMEOUTS={'post': 0})
+        data = {'type': 'post', 'id': REMOTE_POST_URL}
+        mock_get.return_value = get_mock_response(data=data, headers={'ETag': '"v1"'})
+        self.assertDictEqual(cache.get(REMOTE_POST_URL), data)
+
+        # expired post is revalidated with its ETag
+        mock_get.return_value = get_mock_response(status_code=304)
+        self.assertDictEqual(cache.get(REMOTE_POST_URL), data)
+        self.assertEqual(mock_get.call_args[1]['headers']['If-None-Match'], '"v1"')
+        self.assertEqual(cache.get_stats()['revalidations'], 1)
+
+
+    def test_eviction(self, mock_get):
+        cache = RemoteObjectCache(MAX_ENTRIES=2)
+        mock_get.return_value = get_mock_response(data={'type': 'post'})
+
+        for i in range(3):
+            cache.get(f'{REMOTE_AUTHOR_URL}/posts/{i}')
+        stats = cache.get_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 1)
+
+        # the least recently used post was evicted
+        cache.get(f'{REMOTE_AUTHOR_URL}/posts/0')
+        self.assertEqual(mock_get.call_count, 4)
+
+
+    def test_get_many(self, mock_get):
+        cache = RemoteObjectCache()
+        slow_url = f'{REMOTE_AUTHOR_URL}/posts/slow'
+        done = threading.Event()
+
+        def get(url, **kwargs):
+            if url == slow_url:
+                done.wait(5)
+            return get_mock_response(data={'id': url})
+        mock_get.side_effect = get
+
+        data = cache.get_many([REMOTE_AUTHOR_URL, REMOTE_POST_URL, slow_url], deadline=0.5)
+        self.assertDictEqual(data, {
+            REMOTE_AUTHOR_URL: {'id': REMOTE_AUTHOR_URL},
+            REMOTE_POST_URL: {'id': REMOTE_POST_URL},
+            slow_url: {},
+        })
+
+        # the late object is not waited for again
+        self.assertDictEqual(cache.get(slow_url), {})
+        done.set()
+
+
+class RemoteCacheViewTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+
+    def test_get(self):
+        c = Client()
+        response = c.get('/service/remote-cache')
+        self.assertEqual(response.status_code, 401)
+
+        c = Client(HTTP_AUTHORIZATION=get_basic_auth_header())
+        response = c.get('/service/remote-cache')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['type'], 'remote-cache')
+        for key in ['hits', 'misses', 'negative_hits', 'revalidations', 'evictions', 'errors', 'size']:
+            self.assertIn(key, data)
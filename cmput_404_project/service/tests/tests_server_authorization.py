@@ -0,0 +1,73 @@
+from django.test import TestCase, RequestFactory
+
+from service.models import ServerNode
+from service.server_authorization import is_server_authorized, is_local_server
+from service.requests import get_server_node, get_b64_server_credential
+from .helper import get_basic_auth_header
+
+
+class ServerAuthorizationTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='testserver', is_local=True)
+        ServerNode.objects.create(host='http://remote.example.com', receiving_username='remote', receiving_password='pwd')
+        self.factory = RequestFactory()
+
+    def test_authorize(self):
+        # warm up the index
+        is_server_authorized(self.factory.get('/service/authors', HTTP_AUTHORIZATION=get_basic_auth_header()))
+
+        with self.assertNumQueries(0):
+            request = self.factory.get('/service/authors', HTTP_AUTHORIZATION=get_basic_auth_header('remote', 'pwd'))
+            node = is_server_authorized(request)
+            self.assertEqual(node.host, 'http://remote.example.com')
+            self.assertIsNone(is_local_server(request))
+            self.assertEqual(request.server_node, node)
+
+            request = self.factory.get('/service/authors', HTTP_AUTHORIZATION=get_basic_auth_header())
+            self.assertTrue(is_local_server(request))
+
+            request = self.factory.get('/service/authors', HTTP_AUTHORIZATION=get_basic_auth_header('remote', 'wrong'))
+            self.assertIsNone(is_server_authorized(request))
+
+            request = self.factory.get('/service/authors', HTTP_AUTHORIZATION='Basic')
+            self.assertIsNone(is_server_authorized(request))
+
+
+    def test_invalidate(self):
+        header = get_basic_auth_header('remote', 'pwd')
+        self.assertTrue(is_server_authorized(self.factory.get('/', HTTP_AUTHORIZATION=header)))
+
+        # changed credential is seen by the next request
+        node = ServerNode.objects.get(receiving_username='remote')
+        node.receiving_password = 'new'
+        node.save()
+        self.assertIsNone(is_server_authorized(self.factory.get('/', HTTP_AUTHORIZATION=header)))
+        header = get_basic_auth_header('remote', 'new')
+        self.assertTrue(is_server_authorized(self.factory.get('/', HTTP_AUTHORIZATION=header)))
+
+        # deleted node is not authorized anymore
+        node.delete()
+        self.assertIsNone(is_server_authorized(self.factory.get('/', HTTP_AUTHORIZATION=header)))
+
+
+class ServerNodeIndexTestCase(TestCase):
+
+    def setUp(self):
+        ServerNode.objects.create(host='https://remote.example.com/', sending_username='user', sending_password='pass')
+        ServerNode.objects.create(host='http://127.0.0.1:5000')
+
+    def test_get_server_node(self):
+        # warm up the index
+        get_server_node('http://127.0.0.1:5000')
+
+        with self.assertNumQueries(0):
+            node = get_server_node('https://Remote.Example.com:443/service/authors/1')
+            self.assertEqual(node.host, 'https://remote.example.com/')
+            self.assertEqual(get_server_node('http://remote.example.com/service/authors'), node)
+            self.assertEqual(get_server_node('http://127.0.0.1:5000/service/authors').host, 'http://127.0.0.1:5000')
+            self.assertIsNone(get_server_node('http://127.0.0.1:8000/service/authors'))
+            self.assertIsNone(get_server_node('https://example.com/service/authors'))
+
+            self.assertEqual(get_b64_server_credential('https://remote.example.com'), get_basic_auth_header('user', 'pass'))
+            self.assertIsNone(get_b64_server_credential('https://example.com'))
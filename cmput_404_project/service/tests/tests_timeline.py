@@ -0,0 +1,176 @@
+import requests
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from service.models import ServerNode, RemotePost, ServerNodeSync
+from service.timeline import sync_node, save_remote_posts
+from social_distribution.rendering import get_content_hash
+
+
+REMOTE_HOST = 'http://remote.example.com'
+
+
+def get_mock_response(items):
+    '''Returns a mock of requests.Response of a paginated list'''
+    response = mock.Mock()
+    response.status_code = 200
+    response.json.return_value = {'items': items}
+    return response
+
+
+def get_remote_post(author_num, day):
+    '''Returns a post object of a remote author'''
+    author_url = f'{REMOTE_HOST}/service/authors/{author_num}'
+    return {
+        'type': 'post',
+        'id': f'{author_url}/posts/{author_num}-{day}',
+        'author': {'id': author_url, 'url': author_url},
+        'visibility': 'PUBLIC',
+        'unlisted': False,
+        'published': f'2022-03-{day:02d}T10:00:00+00:00',
+    }
+
+
+class SyncRemotePostsTestCase(TestCase):
+
+    def setUp(self):
+        self.node = ServerNode.objects.create(host=REMOTE_HOST)
+        self.remote_posts = {0: [get_remote_post(0, 1)], 1: [get_remote_post(1, 2)]}
+
+    def mock_get(self, url, node=None, **kwargs):
+        '''Mock of FederationClient.get that serves the remote posts'''
+        if '/authors/?' in url:
+            authors = [{'id': f'{REMOTE_HOST}/service/authors/{i}', 'url': f'{REMOTE_HOST}/service/authors/{i}'}
+                       for i in self.remote_posts]
+            return get_mock_response(authors)
+        author_num = int(url.split('/posts/')[0].split('/')[-1])
+        return get_mock_response(sorted(self.remote_posts[author_num], key=lambda p: p['published'], reverse=True))
+
+    def test_sync(self):
+        with mock.patch('service.fanout.federation_client.get', side_effect=self.mock_get):
+            sync_node(self.node)
+            self.assertEqual(RemotePost.objects.count(), 2)
+            sync = ServerNodeSync.objects.get(node=self.node)
+            self.assertEqual(sync.watermark.day, 2)
+            self.assertIsNotNone(sync.get_lag())
+            self.assertEqual(sync.num_errors, 0)
+
+            # only the posts newer than the watermark are saved
+            self.remote_posts[0].append(get_remote_post(0, 3))
+            sync = sync_node(self.node)
+            self.assertEqual(RemotePost.objects.count(), 3)
+            self.assertEqual(sync.num_synced_posts, 3)
+            self.assertEqual(sync.watermark.day, 3)
+
+        feed = RemotePost.objects.filter(unlisted=False).order_by('-published')
+        self.assertEqual([p.data['published'][:10] for p in feed], ['2022-03-03', '2022-03-02', '2022-03-01'])
+
+
+    @override_settings(REMOTE_TIMELINE={'PAGE_SIZE': 1})
+    def test_sync_page_error(self):
+        self.remote_posts[0].append(get_remote_post(0, 3))
+
+        def mock_get(url, node=None, **kwargs):
+            if '/posts/' in url and 'page=2' in url:
+                response = get_mock_response([])
+                response.status_code = 503
+                response.raise_for_status.side_effect = requests.HTTPError(response=response)
+                return response
+            # one item per page
+            page = int(url.split('page=')[1].split('&')[0])
+            response = self.mock_get(url, node)
+            response.json.return_value = {'items': response.json.return_value['items'][page - 1:page]}
+            return response
+
+        with mock.patch('service.fanout.federation_client.get', side_effect=mock_get):
+            sync = sync_node(self.node)
+
+        # the second page of author 0 failed, so the watermark does not move past its posts
+        self.assertIsNone(sync.watermark)
+        self.assertIsNone(sync.last_succeeded)
+        self.assertEqual(sync.num_errors, 1)
+
+
+    @override_settings(REMOTE_TIMELINE={'PAGE_SIZE': 1, 'MAX_PAGES': 1})
+    def test_sync_max_pages(self):
+        self.remote_posts[0].append(get_remote_post(0, 3))
+        RemotePost.objects.create(node=self.node, url=f'{REMOTE_HOST}/service/authors/0/posts/deleted',
+                                  author_url=f'{REMOTE_HOST}/service/authors/0', published=timezone.now())
+
+        with mock.patch('service.fanout.federation_client.get', side_effect=self.mock_get):
+            sync = sync_node(self.node)
+
+        # the posts of author 0 were cut at the first page, so they are not known to be complete
+        self.assertIsNone(sync.watermark)
+        self.assertIsNone(sync.last_reconciled)
+        self.assertEqual(sync.num_errors, 1)
+        self.assertTrue(RemotePost.objects.filter(url__endswith='/posts/deleted').exists())
+
+    def test_hidden_post(self):
+        with mock.patch('service.fanout.federation_client.get', side_effect=self.mock_get):
+            sync_node(self.node)
+            self.assertEqual(RemotePost.objects.count(), 2)
+
+            # a post made FRIENDS after the watermark is removed without a full sync
+            self.remote_posts[0][0].update({'visibility': 'FRIENDS', 'modified': '2022-03-05T10:00:00+00:00'})
+            sync = sync_node(self.node)
+        self.assertEqual(RemotePost.objects.count(), 1)
+        self.assertEqual(sync.num_errors, 0)
+
+    def test_reconcile(self):
+        with mock.patch('service.fanout.federation_client.get', side_effect=self.mock_get):
+            sync = sync_node(self.node)
+            self.assertIsNotNone(sync.last_reconciled)
+
+            # deleted posts are only seen by a full sync
+            del self.remote_posts[0][0]
+            sync = sync_node(self.node)
+            self.assertEqual(RemotePost.objects.count(), 2)
+
+            with override_settings(REMOTE_TIMELINE={'RECONCILE_INTERVAL': 0}):
+                sync = sync_node(self.node)
+        self.assertEqual([p.url for p in RemotePost.objects.all()], [get_remote_post(1, 2)['id']])
+        self.assertEqual(sync.num_removed_posts, 1)
+        self.assertEqual(sync.num_errors, 0)
+        self.assertEqual(sync.watermark.day, 2)
+
+    def test_sync_error(self):
+        with mock.patch('service.fanout.federation_client.get', side_effect=ConnectionError('refused')):
+            call_command('sync_remote_posts', stdout=mock.Mock(), stderr=mock.Mock())
+        sync = ServerNodeSync.objects.get(node=self.node)
+        self.assertEqual(sync.num_errors, 1)
+        self.assertIsNone(sync.last_succeeded)
+        self.assertIsNone(sync.watermark)
+
+
+class RemotePostRenderTestCase(TestCase):
+
+    def setUp(self):
+        self.node = ServerNode.objects.create(host=REMOTE_HOST)
+        self.post = {**get_remote_post(0, 1), 'contentType': 'text/markdown', 'content': '# Title'}
+
+    def test_render_on_save(self):
+        save_remote_posts(self.node, [self.post, {**get_remote_post(1, 1), 'contentType': 'text/plain', 'content': '# Plain'}])
+        remote_post = RemotePost.objects.get(url=self.post['id'])
+        self.assertEqual(remote_post.content_html, '<h1>Title</h1>\n')
+        self.assertEqual(remote_post.content_hash, get_content_hash('# Title'))
+        self.assertEqual(RemotePost.objects.get(url=get_remote_post(1, 1)['id']).content_html, '')
+
+        # unchanged content is not rendered again
+        with mock.patch('social_distribution.rendering.markdown_renderer.render') as mock_render:
+            save_remote_posts(self.node, [self.post])
+            mock_render.assert_not_called()
+        self.assertEqual(RemotePost.objects.get(url=self.post['id']).content_html, '<h1>Title</h1>\n')
+
+        save_remote_posts(self.node, [{**self.post, 'content': '*changed*'}])
+        self.assertEqual(RemotePost.objects.get(url=self.post['id']).content_html, '<p><em>changed</em></p>\n')
+
+    def test_backfill(self):
+        RemotePost.objects.create(node=self.node, url=self.post['id'], author_url='', published=timezone.now(),
+                                  data=self.post)
+        call_command('render_markdown', batch_size=1, stdout=mock.Mock())
+        self.assertEqual(RemotePost.objects.get().content_html, '<h1>Title</h1>\n')
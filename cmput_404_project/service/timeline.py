@@ -0,0 +1,198 @@
+import requests
+
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from service.fanout import FanOut, get_items
+from service.models import RemotePost, ServerNodeSync
+from social_distribution.rendering import render_content
+
+
+DEFAULT_SETTINGS = {
+    # size of the pages requested from remote nodes
+    'PAGE_SIZE': 15,
+    # max number of pages requested per author list or post list
+    'MAX_PAGES': 10,
+    # seconds the sync of one node must finish in
+    'DEADLINE': 60,
+    # seconds between two syncs that pull all posts of a node, and remove the posts
+    # that were deleted or are no longer public
+    'RECONCILE_INTERVAL': 60 * 60,
+    # number of posts removed per query
+    'DELETE_BATCH_SIZE': 500,
+}
+
+
+def get_config() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'REMOTE_TIMELINE', {})}
+
+
+def get_post_timestamp(post):
+    '''Returns the modified date of a post object, or its published date if it has none.'''
+    for key in ['modified', 'published']:
+        try:
+            timestamp = parse_datetime(post.get(key) or '')
+        except ValueError:
+            timestamp = None
+        if timestamp is not None:
+            return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=dt_timezone.utc)
+    return None
+
+
+def get_paginated_items(url, node, watermark=None) -> tuple:
+    '''
+    Returns (items, complete) where items are the items of all pages of a paginated list of node,
+    and complete is False if the list was cut at MAX_PAGES.
+
+    If watermark is given, it stops at the first page that only contains posts
+    that are not newer than the watermark.
+
+    The list ends at a short or empty page, or at a page that is not found. Any other failure
+    is raised, so that the items of the failed page are not taken as missing.
+    '''
+    config = get_config()
+    items = []
+    for page in range(1, config['MAX_PAGES'] + 1):
+        try:
+            page_items = get_items(f"{url}?page={page}&size={config['PAGE_SIZE']}", node)
+        except requests.HTTPError as e:
+            if page > 1 and e.response is not None and e.response.status_code == 404:
+                break   # past the last page
+            raise
+        items.extend(page_items)
+
+        if len(page_items) < config['PAGE_SIZE']:
+            break
+        if watermark is not None and all((get_post_timestamp(p) or watermark) <= watermark for p in page_items):
+            break
+    else:
+        return items, False
+    return items, True
+
+
+def fetch_new_posts(node, watermark=None, deadline=None):
+    '''
+    Returns (posts, complete) where posts are the posts of node that are newer than the watermark,
+    and complete is False if the authors or the posts of some authors failed, were cut at MAX_PAGES,
+    or could not be fetched before the deadline.
+    '''
+    deadline = deadline if deadline is not None else get_config()['DEADLINE']
+    posts = []
+    with FanOut(deadline) as fan_out:
+        future = fan_out.submit(get_paginated_items, f'{node.host}/authors/', node)
+        results = list(fan_out.as_completed([future]))
+        if not results:
+            raise RuntimeError(f'Failed to get authors from {node.host}')
+        authors, complete = results[0][1]
+
+        futures = [fan_out.submit(get_paginated_items, author['url'] + '/posts/', node, watermark)
+                   for author in authors]
+        num_done = 0
+        for future, (items, items_complete) in fan_out.as_completed(futures):
+            posts.extend(items)
+            if items_complete:
+                num_done += 1
+
+    if watermark is not None:
+        posts = [p for p in posts if (get_post_timestamp(p) or watermark) > watermark]
+    return posts, complete and num_done == len(futures)
+
+
+@transaction.atomic
+def save_remote_posts(node, posts) -> int:
+    '''
+    Inserts or updates the public posts of node in RemotePost, and removes the posts
+    that are no longer public. Returns the number of saved posts.
+
+    Markdown content is rendered into html, unless it is unchanged since the post was last pulled.
+    '''
+    now = timezone.now()
+    remote_posts = {}
+    hidden_urls = []
+    for post in posts:
+        published = get_post_timestamp({'published': post.get('published')})
+        if post.get('visibility') != 'PUBLIC' and post.get('id'):
+            hidden_urls.append(post['id'])
+        if post.get('visibility') != 'PUBLIC' or not post.get('id') or published is None:
+            continue
+        remote_posts[post['id']] = RemotePost(node=node,
+                                              url=post['id'],
+                                              author_url=(post.get('author') or {}).get('id', ''),
+                                              published=published,
+                                              unlisted=bool(post.get('unlisted', False)),
+                                              data=post,
+                                              date_synced=now)
+
+    existing = RemotePost.objects.filter(url__in=remote_posts.keys()) \
+                                 .only('pk', 'url', 'content_html', 'content_hash').in_bulk(field_name='url')
+    for url, remote_post in remote_posts.items():
+        if url in existing:
+            remote_post.pk = existing[url].pk
+            remote_post.content_html = existing[url].content_html
+            remote_post.content_hash = existing[url].content_hash
+        render_content(remote_post, remote_post.data.get('contentType'), remote_post.data.get('content'))
+
+    RemotePost.objects.bulk_create([p for p in remote_posts.values() if p.pk is None])
+    RemotePost.objects.bulk_update([p for p in remote_posts.values() if p.pk is not None],
+                                   ['node', 'author_url', 'published', 'unlisted', 'data', 'date_synced',
+                                    'content_html', 'content_hash'])
+    if hidden_urls:
+        RemotePost.objects.filter(node=node, url__in=hidden_urls).delete()
+    return len(remote_posts)
+
+
+@transaction.atomic
+def remove_missing_posts(node, posts) -> int:
+    '''
+    Removes the RemotePosts of node that are not public posts of posts, which must be all posts
+    of the node. Returns the number of removed posts.
+    '''
+    public_urls = {post.get('id') for post in posts if post.get('visibility') == 'PUBLIC'}
+    missing = [pk for pk, url in RemotePost.objects.filter(node=node).values_list('pk', 'url')
+               if url not in public_urls]
+    batch_size = get_config()['DELETE_BATCH_SIZE']
+    for i in range(0, len(missing), batch_size):
+        RemotePost.objects.filter(pk__in=missing[i:i + batch_size]).delete()
+    return len(missing)
+
+
+def sync_node(node, deadline=None) -> ServerNodeSync:
+    '''
+    Pulls the posts of node that are newer than its watermark into RemotePost,
+    and records the result in its ServerNodeSync.
+
+    Every RECONCILE_INTERVAL, all posts of node are pulled instead, and the RemotePosts that are
+    missing from them are removed, since deleted posts are not seen past the watermark.
+    '''
+    sync, created = ServerNodeSync.objects.get_or_create(node=node)
+    sync.last_started = timezone.now()
+    sync.num_runs += 1
+    reconcile = sync.last_reconciled is None or \
+        sync.last_started - sync.last_reconciled >= timedelta(seconds=get_config()['RECONCILE_INTERVAL'])
+    try:
+        posts, complete = fetch_new_posts(node, None if reconcile else sync.watermark, deadline)
+        num_saved = save_remote_posts(node, posts)
+        if reconcile and complete:
+            # posts of a cut or failed list are not known to be deleted
+            sync.num_removed_posts += remove_missing_posts(node, posts)
+            sync.last_reconciled = sync.last_started
+    except Exception as e:
+        sync.num_errors += 1
+        sync.last_error = f'{sync.last_started.isoformat()}: {e}'
+    else:
+        sync.num_synced_posts += num_saved
+        if complete:
+            # only move the watermark when no author was skipped, otherwise their posts would be missed
+            timestamps = [t for t in map(get_post_timestamp, posts) if t is not None]
+            if timestamps:
+                sync.watermark = max(timestamps + ([sync.watermark] if sync.watermark else []))
+            sync.last_succeeded = timezone.now()
+        else:
+            sync.num_errors += 1
+            sync.last_error = f'{sync.last_started.isoformat()}: some authors did not respond before the deadline'
+    sync.last_finished = timezone.now()
+    sync.save()
+    return sync
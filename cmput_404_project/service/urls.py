@@ -15,11 +15,16 @@ urlpatterns = [
     path('authors/<uuid:author_id>/posts/<uuid:post_id>/likes', views.PostLikesView.as_view(), name='post_likes'),
     path('authors/<uuid:author_id>/followers', views.FollowersView.as_view(), name='followers'),
     path('authors/<uuid:author_id>/followers/<uuid:foreign_author_id>', views.FollowerView.as_view(), name='follower'),
+    path('authors/<uuid:author_id>/friends', views.FriendsView.as_view(), name='friends'),
     path('authors/<uuid:author_id>/posts/<uuid:post_id>/comments', views.CommentsView.as_view(), name='comments'),
     # path('authors/<uuid:author_id>/posts/<uuid:post_id>/comments/', views.CommentsView.as_view(), name='comments'),
     path('authors/<uuid:author_id>/posts/<uuid:post_id>/comments/<uuid:comment_id>/likes', views.CommentLikesView.as_view(), name='comment_likes'),
     path('authors/<uuid:author_id>/inbox', views.InboxView.as_view(), name='inbox'),
+    path('authors/<uuid:author_id>/inbox/read', views.InboxReadView.as_view(), name='inbox_read'),
+    path('inbox', views.SharedInboxView.as_view(), name='shared_inbox'),
     # path('authors/<uuid:author_id>/inbox/', views.InboxView.as_view(), name='inbox'),
     path('proxy', views.ProxyView.as_view(), name='proxy'),
+    path('remote-cache', views.RemoteCacheView.as_view(), name='remote_cache'),
+    path('like-counts', views.LikeCountsView.as_view(), name='like_counts'),
 ]
 
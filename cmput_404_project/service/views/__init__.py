@@ -1,9 +1,9 @@
 from .views_author import AuthorsDetailView, AuthorDetailView 
-from .views_follower import FollowersView, FollowerView
+from .views_follower import FollowersView, FollowerView, FriendsView
 from .views_post import PostView, PostsView
 from .views_comment import CommentsView
-from .views_like import PostLikesView, CommentLikesView
-from .views_inbox import InboxView
+from .views_like import PostLikesView, CommentLikesView, LikeCountsView
+from .views_inbox import InboxView, SharedInboxView, InboxReadView
 from .views_liked import LikedView
 from .views_proxy import ProxyView
-
+from .views_remote_cache import RemoteCacheView
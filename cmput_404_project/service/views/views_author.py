@@ -8,6 +8,7 @@ from django.views import View
 from service.server_authorization import is_server_authorized, is_local_server, get_401_response
 from social_distribution.models import Author
 from accounts.forms import AuthorChangeForm
+from service.pagination import is_cursor_request, get_keyset_page_or_400
 
 
 class AuthorsDetailView(View):
@@ -23,8 +24,12 @@ class AuthorsDetailView(View):
 
         Default page = 1, size = 15
 
+        With ?cursor=, the page after the cursor is returned with a "next" cursor
+        instead of the page number (an empty cursor returns the first page).
+
         Returns: 
             - 200: if successful
+            - 400: if the cursor is invalid
             - 401: if server is not authorized
             - 404: if page does not exist
         '''
@@ -55,6 +60,15 @@ class AuthorsDetailView(View):
         page = int(request.GET.get('page', self.DEFAULT_PAGE))
         size = int(request.GET.get('size', self.DEFAULT_SIZE))
 
+        if is_cursor_request(request):
+            authors, next_cursor = get_keyset_page_or_400(Author.objects.all(), ['username', 'id'], request, size)
+
+            data = {}
+            data['type'] = 'authors'
+            data['items'] = [author.get_detail_dict() for author in authors]
+            data['next'] = next_cursor
+            return data
+
         try:
             q = Author.objects.all().order_by('username')
             authors = Paginator(q, size).page(page)
@@ -1,12 +1,14 @@
 import json
 
 from django.shortcuts import get_object_or_404
-from django.core.paginator import EmptyPage
 from django.http import JsonResponse, HttpResponse, Http404
 from django.views import View
 
+from service.outbox import enqueue
 from service.server_authorization import is_server_authorized, get_401_response
 from social_distribution.models import Author, Post, Comment
+from social_distribution.serializers import get_comments_pages
+from service.pagination import is_cursor_request, get_keyset_page_or_400
 
 
 class CommentsView(View):
@@ -20,8 +22,12 @@ class CommentsView(View):
         '''
         GET [local, remote]: get the list of comments of the post whose id is post_id (paginated)
 
+        With ?cursor=, the page after the cursor is returned with a "next" cursor
+        instead of the page number (an empty cursor returns the first page).
+
         Returns:
             - 200: if successful
+            - 400: if the cursor is invalid
             - 401: if server is not authorized
             - 404: if author or post does not exist
         '''
@@ -95,6 +101,8 @@ class CommentsView(View):
             comment = Comment.objects.create(author=comment_author, author_url=comment_author_id_url, post=post, content_type=content_type, content=content)
             post.count += 1
             post.save(update_fields=['count'])
+            if comment_author is not None:
+                enqueue('COMMENT', comment, comment_author)
             return JsonResponse(comment.get_detail_dict(), status=status_code)
 
         
@@ -107,9 +115,23 @@ class CommentsView(View):
 
         post = get_object_or_404(Post, pk=post_id, author_id=author_id)
 
-        try:
-            return post.get_comments_src_dict(page, size)
-        except EmptyPage:
+        if is_cursor_request(request):
+            q = Comment.objects.filter(post=post).select_related('author')
+            comments, next_cursor = get_keyset_page_or_400(q, ['-date_created', '-id'], request, size)
+            for comment in comments:
+                comment.post = post
+
+            data = post.get_comments_src_dict(size=size, comments=comments)
+            del data['page']
+            data['next'] = next_cursor
+            return data
+
+        if page < 1:
+            raise Http404('Page does not exist')
+        comments = get_comments_pages([post], page, size)[post.id]
+        if page > 1 and not comments:
             raise Http404('Page does not exist')
+
+        return post.get_comments_src_dict(page, size, comments)
         
 
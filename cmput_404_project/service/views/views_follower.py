@@ -6,6 +6,7 @@ from django.views import View
 
 from service.server_authorization import is_server_authorized, is_local_server, get_401_response
 from social_distribution.models import Author, Follower
+from social_distribution.serializers import get_friends_detail_dicts
 
 
 class FollowersView(View):
@@ -144,10 +145,25 @@ class FollowerView(View):
         
 
 
+class FriendsView(View):
+    http_method_names = ['get', 'head', 'options']
 
+    def get(self, request, *args, **kwargs):
+        '''
+        GET [local, remote]: Returns JSON response of the details of the author_id's friends,
+        the authors that author_id follows and that follow author_id back.
 
+        Returns:
+            - 200: if successful
+            - 401: if server is not authorized
+            - 404: if author does not exist
+        '''
+        if not is_server_authorized(request):
+            return get_401_response()
 
-
-
-
+        author = get_object_or_404(Author, pk=kwargs.get('author_id', ''))
+        data = {}
+        data['type'] = 'friends'
+        data['items'] = get_friends_detail_dicts(author.id)
+        return JsonResponse(data)
 
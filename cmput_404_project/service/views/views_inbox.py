@@ -1,13 +1,19 @@
 import json
+import uuid
 
+from django.db import transaction, IntegrityError
 from django.shortcuts import get_object_or_404
 from django.views import View
-from django.http import JsonResponse, HttpResponse, Http404
-from django.core.exceptions import ObjectDoesNotExist
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.core.exceptions import BadRequest, ValidationError
 from django.core.paginator import Paginator, EmptyPage
 
 from service.server_authorization import is_server_authorized, is_local_server, get_401_response
-from social_distribution.models import Author, Post, Like, Comment, Inbox, InboxItem, FollowRequest
+from social_distribution.models import Author, InboxItem
+from social_distribution.serializers import get_inbox_items_detail_dicts
+from service.inbox import get_config, get_inbox, clear_inbox, mark_read, save_inbox_object, save_inbox_objects, \
+                          journal_inbox_objects, add_to_inboxes, get_local_followers
+from service.pagination import is_cursor_request, encode_cursor, decode_cursor, get_keyset_page_or_400
 
 
 class InboxView(View):
@@ -17,14 +23,26 @@ class InboxView(View):
     DEFAULT_PAGE = 1
     DEFAULT_SIZE = 10
 
+    MAX_BATCH_SIZE = 1000
+    NDJSON_CONTENT_TYPES = ['application/x-ndjson', 'application/jsonl']
+
     def get(self, request, *args, **kwargs):
         '''
         GET [local]: if authenticated, get a list of posts sent to AUTHOR_ID (paginated)
 
         Default page = 1, size = 10
 
+        With ?cursor=, the page after the cursor is returned with a "next" cursor
+        instead of the page number (an empty cursor returns the first page).
+
+        The first page has a "since" watermark of the newest item. With ?since=<watermark>, only
+        the items added after it are returned (newest first, at most size), with the new watermark
+        and "more" set if there are more new items. 304 is returned if there is no new item.
+
         Returns:
             - 200: if successful
+            - 304: if there is no new item since the watermark
+            - 400: if the cursor or watermark is invalid
             - 401: if server is not authorized
             - 403: if the author is not authenticated
             - 404: if author or page does not exist
@@ -33,7 +51,13 @@ class InboxView(View):
             return get_401_response()
 
         author_id = kwargs.get('author_id', '')
-        return JsonResponse(self._get_inbox_items(request, author_id))
+        data = self._get_inbox_items(request, author_id)
+        if not isinstance(data, dict):
+            # 403
+            return data
+        if request.GET.get('since') and not data['items']:
+            return HttpResponseNotModified()
+        return JsonResponse(data)
 
     def head(self, request, *args, **kwargs):
         '''
@@ -62,73 +86,63 @@ class InboxView(View):
             - If the type is “follow” then add that follow is added to AUTHOR_ID's inbox to approve later
             - If the type is “like” then add that like to AUTHOR_ID's inbox
             - If the type is “comment” then add that comment to AUTHOR_ID's inbox
+
+        Many objects can be sent at once as a json array, or as NDJSON (one object per line)
+        with the application/x-ndjson content type. The response is then a json object with
+        a {"status", "message"} item per object, in the same order.
+
+        With the "Prefer: respond-async" header, or if INBOX['ASYNC'] is set, the objects are
+        journaled and 202 is returned without checking them. They are saved by the process_inbox command.
         
         Returns:
+            - 200: if a batch of objects is processed
             - 201: if successful
-            - 400: if the object is invalid.
+            - 202: if the objects are accepted to be processed later
+            - 400: if the object is invalid, or the batch is too large.
             - 401: if server is not authorized
             - 404: if the author does not exist.
         '''
-        if not is_server_authorized(request):
+        node = is_server_authorized(request)
+        if not node:
             return get_401_response()
 
         author_id = kwargs.get('author_id', '')
         author = get_object_or_404(Author, id=author_id)
 
-        try:
-            inbox = Inbox.objects.get(author=author)
-        except ObjectDoesNotExist:
-            # create an inbox for this author if it doesn't exist
-            inbox = Inbox.objects.create(author=author)
+        body = request.body.decode('utf-8')
+        is_batch = request.content_type in self.NDJSON_CONTENT_TYPES or body.lstrip().startswith('[')
+        if is_batch:
+            try:
+                data_list = self._get_batch(request, body)
+            except ValueError as e:
+                return HttpResponse(e, status=400)
+        else:
+            data_list = [json.loads(body)]
+
+        if get_config()['ASYNC'] or 'respond-async' in request.headers.get('Prefer', ''):
+            journal_inbox_objects(data_list, author, node)
+            return JsonResponse({'type': 'inbox', 'accepted': len(data_list)}, status=202)
+
+        if is_batch:
+            return JsonResponse({'type': 'inbox', 'items': save_inbox_objects(data_list, author)})
 
-        valid_object_types = ['post', 'follow', 'like', 'comment']
-        data = json.loads(request.body.decode('utf-8'))
+        inbox = get_inbox(author)
+
+        data = data_list[0]
         try:
-            t = data['type'].strip().lower()
-            if t not in valid_object_types:
-                raise ValueError('The type of the object is invalid')
-            
-            if t == 'post':
-                object_type = 0
-                post_id = data['id'].split('/')[-1]
-                if Post.objects.filter(id=post_id).exists():
-                    post = Post.objects.get(id=post_id)
-                    object_id = post.id
-                    object_url = post.get_id_url()
-                else:
-                    object_id = None
-                    object_url = data['id'] 
-
-            elif t == 'comment':
-                object_type = 1
-                comment_id = data['id'].split('/')[-1]
-                if Comment.objects.filter(id=comment_id).exists():
-                    comment = Comment.objects.get(id=comment_id)
-                    object_id = comment.id
-                    object_url = comment.get_id_url()
-                else:
-                    object_id = None
-                    object_url = data['id'] 
-
-            elif t == 'follow':
-                object_type = 2
-                object = self._create_follow_request(data, author)
-                object_id = object.id
-                object_url = None
-
-            else:
-                object_type = 3
-                object = self._create_like(data)
-                object_id = object.id
-                object_url = None
-
-            if not InboxItem.objects.filter(object_id=object_id).exists():
-                # Only create if the object is not already in the inbox
-                # If the object exists in the inbox, it has been already updated at this point.
-                InboxItem.objects.create(inbox=inbox, 
-                                        object_type=InboxItem.OBJECT_TYPE_CHOICES[object_type][0], 
-                                        object_id=object_id,
-                                        object_url=object_url)
+            object_type, object_id, object_url = save_inbox_object(data, author)
+
+            # If the object is already in the inbox, it has been already updated at this point,
+            # and the unique constraints of InboxItem reject the insert. Unlike an ignored conflict,
+            # the rejection tells whether the item is new, for the unread count.
+            try:
+                with transaction.atomic():
+                    InboxItem.objects.create(inbox=inbox,
+                                             object_type=object_type,
+                                             object_id=object_id,
+                                             object_url=object_url)
+            except IntegrityError:
+                pass
 
         except (KeyError, ValueError) as e:
             status_code = 400
@@ -138,10 +152,37 @@ class InboxView(View):
             return HttpResponse("An object is successfully sent to the inbox", status=201)
 
 
+    def _get_batch(self, request, body) -> list:
+        '''
+        Returns the list of objects in the json array or NDJSON body.
+
+        Raises ValueError if the body is invalid or has too many objects.
+        '''
+        if request.content_type in self.NDJSON_CONTENT_TYPES:
+            data_list = []
+            for line in body.splitlines():
+                if line.strip():
+                    try:
+                        data_list.append(json.loads(line))
+                    except ValueError:
+                        # reported as an invalid object
+                        data_list.append(None)
+        else:
+            try:
+                data_list = json.loads(body)
+            except ValueError:
+                raise ValueError('The body is not valid json')
+
+        if len(data_list) > self.MAX_BATCH_SIZE:
+            raise ValueError(f'At most {self.MAX_BATCH_SIZE} objects can be sent at once')
+        return data_list
+
     def delete(self, request, *args, **kwargs):
         '''
         DELETE [local]: clears the inbox
 
+        The items are deleted in chunks, so that clearing a large inbox does not lock the table for long.
+
         Returns:
             - 204: if successfully cleared
             - 401: if server is not authorized 
@@ -153,13 +194,9 @@ class InboxView(View):
         author_id = kwargs.get('author_id', '')
         author = get_object_or_404(Author, id=author_id)
 
-        try:
-            inbox = Inbox.objects.get(author=author)
-        except ObjectDoesNotExist:
-            # create an inbox for this author if it doesn't exist
-            inbox = Inbox.objects.create(author=author)
+        inbox = get_inbox(author)
         
-        InboxItem.objects.filter(inbox=inbox).delete()
+        clear_inbox(inbox)
     
         return HttpResponse("The inbox is cleared", status=204)
 
@@ -178,11 +215,34 @@ class InboxView(View):
 
         author = get_object_or_404(Author, id=author_id)
 
-        try:
-            inbox = Inbox.objects.get(author=author)
-        except ObjectDoesNotExist:
-            # create an inbox for this author if it doesn't exist
-            inbox = Inbox.objects.create(author=author)
+        inbox = get_inbox(author)
+
+        if 'since' in request.GET:
+            # a blank watermark would list the inbox from its oldest item
+            if not request.GET['since']:
+                raise BadRequest('The watermark is invalid')
+            # ids grow with insertion, so the items after the watermark are the new ones
+            q = InboxItem.objects.filter(inbox=inbox)
+            inbox_items, next_cursor = get_keyset_page_or_400(q, ['id'], request, size, param='since')
+
+            data = {}
+            data['type'] = 'inbox'
+            data['items'] = get_inbox_items_detail_dicts(inbox_items[::-1])
+            data['since'] = encode_cursor([inbox_items[-1].id]) if inbox_items else request.GET['since']
+            data['more'] = next_cursor is not None
+            return data
+
+        if is_cursor_request(request):
+            q = InboxItem.objects.filter(inbox=inbox)
+            inbox_items, next_cursor = get_keyset_page_or_400(q, ['-date_created', '-id'], request, size)
+
+            data = {}
+            data['type'] = 'inbox'
+            data['items'] = get_inbox_items_detail_dicts(inbox_items)
+            data['next'] = next_cursor
+            if not request.GET['cursor']:
+                data['since'] = self._get_watermark(inbox)
+            return data
 
         try:
             q = InboxItem.objects.all().filter(inbox=inbox)
@@ -193,73 +253,131 @@ class InboxView(View):
 
         data = {}
         data['type'] = 'inbox'
-        data['items'] = [item.get_detail_dict() for item in inbox_items]
+        data['items'] = get_inbox_items_detail_dicts(inbox_items)
+        if page == 1:
+            data['since'] = self._get_watermark(inbox)
         return data
 
+    def _get_watermark(self, inbox) -> str:
+        '''Returns the ?since= watermark of the newest item of inbox, or of no item if inbox is empty.'''
+        newest_id = InboxItem.objects.filter(inbox=inbox).order_by('-id').values_list('id', flat=True).first()
+        return encode_cursor([newest_id or 0])
+
+
+class SharedInboxView(View):
+
+    http_method_names = ['post', 'options']
+
+    MAX_RECIPIENTS = 1000
 
-    def _create_like(self, data_dict) -> Like:
+    def post(self, request, *args, **kwargs):
         '''
-        Create a Like from data_dict.
+        POST [local, remote]: send one object to the inboxes of many local authors.
+
+        The body is a json object with
+            - "object": a post, comment or like object, as it is sent to an author's inbox
+            - "recipients": a list of id urls of local authors, and/or
+            - "followersOf": id url of an author, to send the object to all of its local followers
 
-        Raises ValueError if
-            - @context is invalid, or
-            - object id in data_dict is not associated with the author
+        The object is validated and saved once, and the InboxItems of all recipients are
+        inserted in one transaction. Recipients that do not exist on this server are skipped.
+
+        Returns:
+            - 201: if successful, with the number of recipients and of created InboxItems
+            - 400: if the object or the recipients are invalid
+            - 401: if server is not authorized
         '''
+        if not is_server_authorized(request):
+            return get_401_response()
 
-        context = data_dict['@context']
-        if context != Like.context:
-            raise ValueError('Invalid context: %s' % context)
-        like_author_id = data_dict['author']['id'].split('/')[-1]
-        like_author = None  # can be local or remote author
-        if Author.objects.filter(id=like_author_id).exists():
-            # is a local author
-            like_author = Author.objects.get(id=like_author_id)
-        like_author_url = data_dict['author']['id']
-        object_url = data_dict['object']
-
-        # object id must exist in our database
-        object_id = object_url.split('/')[-1]
-
-        if Post.objects.filter(id=object_id).exists():
-            object_type = Like.OBJECT_TYPE_CHOICES[0][0]
-        elif Comment.objects.filter(id=object_id).exists():
-            object_type = Like.OBJECT_TYPE_CHOICES[1][0]
-        else:
-            raise ValueError('object id: %s is not associated with this author' % object_id)
-        
-        return Like.objects.create(author=like_author, 
-                                   author_url=like_author_url, 
-                                   object_type=object_type, 
-                                   object_url=object_url)
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+            recipient_urls = data.get('recipients', [])
+            followers_of = data.get('followersOf')
+            if not isinstance(recipient_urls, list) or (not recipient_urls and not followers_of):
+                raise ValueError('recipients or followersOf must be given')
+            if len(recipient_urls) > self.MAX_RECIPIENTS:
+                raise ValueError(f'At most {self.MAX_RECIPIENTS} recipients can be given')
+
+            with transaction.atomic():
+                recipients = {author.id: author for author in self._get_authors(recipient_urls)}
+                if followers_of:
+                    recipients.update((author.id, author) for author in get_local_followers(followers_of))
+
+                object_type, object_id, object_url = save_inbox_object(data['object'])
+                num_created = add_to_inboxes(list(recipients.values()), object_type, object_id, object_url)
+
+        except (KeyError, ValueError, TypeError, AttributeError, ValidationError) as e:
+            return HttpResponse(e if str(e) != '' else 'The object is invalid', status=400)
 
+        return JsonResponse({'type': 'inbox', 'recipients': len(recipients), 'created': num_created}, status=201)
 
-    def _create_follow_request(self, data_dict, author:Author) -> FollowRequest:
+    def _get_authors(self, author_urls) -> list:
+        '''Returns the local authors of author_urls.'''
+        author_ids = []
+        for url in author_urls:
+            try:
+                author_ids.append(uuid.UUID(url.rstrip('/').split('/')[-1]))
+            except ValueError:
+                continue
+        return list(Author.objects.filter(id__in=author_ids))
+
+
+class InboxReadView(View):
+
+    http_method_names = ['get', 'head', 'options', 'post']
+
+    def get(self, request, *args, **kwargs):
+        '''
+        GET [local]: if authenticated, get the unread count and read marker of AUTHOR_ID's inbox,
+        without loading any item.
+
+        Returns:
+            - 200: if successful
+            - 401: if server is not authorized
+            - 403: if the author is not authenticated
+            - 404: if the author does not exist
         '''
-        Creates a FollowRequest between the two authors in data_dict.
+        if not is_local_server(request):
+            return get_401_response()
+        if not request.user.is_authenticated:
+            return HttpResponse("You do not have permission to access this author's inbox.", status=403)
+
+        author = get_object_or_404(Author, id=kwargs.get('author_id', ''))
+        return JsonResponse(self._get_counts(get_inbox(author)))
 
-        Raises a ValueError if
-            - FollowRequest between the two authors already exists, or
-            - author in the request and author in the data_dict are not equal.
+    def post(self, request, *args, **kwargs):
         '''
-        # from_author can be from remote server
-        from_author_id = data_dict['actor']['id'].split('/')[-1]
-        if Author.objects.filter(id=from_author_id).exists():
-            from_author = Author.objects.get(id=from_author_id)
-        else:
-            from_author = None
-        from_author_url = data_dict['actor']['url']
-
-        to_author_id = data_dict['object']['id'].split('/')[-1]
-        to_author = get_object_or_404(Author, id=to_author_id)
-        if author != to_author:
-            # assert target author is the author in the request
-            raise ValueError('Target author and to_author in follow object must be equal')
-
-        if FollowRequest.objects.filter(from_author_url=from_author_url, to_author=author).exists():
-            # raise an exception if follow request between the two author already exists
-            raise ValueError('Follow request is already sent') 
-
-        return FollowRequest.objects.create(from_author=from_author,
-                                            from_author_url=from_author_url,
-                                            to_author=author,
-                                            to_author_url=author.get_id_url())
\ No newline at end of file
+        POST [local]: if authenticated, mark the items of AUTHOR_ID's inbox as read.
+
+        With a json body {"since": <watermark>}, only the items up to the watermark returned by
+        GET inbox are marked, so that items the author has not seen stay unread.
+
+        Returns:
+            - 200: if successful, with the updated counts
+            - 400: if the watermark is invalid
+            - 401: if server is not authorized
+            - 403: if the author is not authenticated
+            - 404: if the author does not exist
+        '''
+        if not is_local_server(request):
+            return get_401_response()
+        if not request.user.is_authenticated:
+            return HttpResponse("You do not have permission to access this author's inbox.", status=403)
+
+        author = get_object_or_404(Author, id=kwargs.get('author_id', ''))
+        try:
+            data = json.loads(request.body.decode('utf-8')) if request.content_type == 'application/json' else {}
+            item_id = int(decode_cursor(data['since'])[0]) if 'since' in data else None
+        except (ValueError, TypeError, AttributeError, IndexError) as e:
+            return HttpResponse(e if str(e) != '' else 'The watermark is invalid', status=400)
+
+        return JsonResponse(self._get_counts(mark_read(get_inbox(author), item_id)))
+
+    def _get_counts(self, inbox) -> dict:
+        data = {}
+        data['type'] = 'inbox'
+        data['unread'] = inbox.unread_count
+        data['lastRead'] = encode_cursor([inbox.last_read_id]) if inbox.last_read_id else ''
+        return data
+
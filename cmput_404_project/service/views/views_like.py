@@ -1,4 +1,5 @@
 import json
+import uuid
 
 from django.shortcuts import get_object_or_404
 from django.views import View
@@ -55,11 +56,11 @@ class PostLikesView(View):
         '''
         post_author = get_object_or_404(Author, pk=author_id)
         post = get_object_or_404(Post, pk=post_id, author=post_author)
-        likes = Like.objects.filter(object_type=Like.OBJECT_TYPE_CHOICES[0][0], object_url=post.get_id_url()).all()
+        likes = Like.objects.filter(object_id=post.id).select_related('author')
 
         data = {}
         data['type'] = 'liked'
-        data['count'] = likes.count()
+        data['count'] = post.like_count
         data['items'] = [l.get_detail_dict() for l in likes]
         return data
 
@@ -115,10 +116,70 @@ class CommentLikesView(View):
         post_author = get_object_or_404(Author, pk=author_id)
         post = get_object_or_404(Post, pk=post_id, author=post_author)
         comment = get_object_or_404(Comment, pk=comment_id, post=post)
-        likes = Like.objects.filter(object_type=Like.OBJECT_TYPE_CHOICES[1][0], object_url=comment.get_id_url()).all()
+        likes = Like.objects.filter(object_id=comment.id).select_related('author')
 
         data = {}
         data['type'] = 'liked'
-        data['count'] = likes.count()
+        data['count'] = comment.like_count
         data['items'] = [l.get_detail_dict() for l in likes]
-        return data
\ No newline at end of file
+        return data
+
+class LikeCountsView(View):
+
+    http_method_names = ['get', 'head', 'options']
+
+    MAX_OBJECTS = 100
+
+    def get(self, request, *args, **kwargs):
+        '''
+        GET [local, remote]: returns the number of likes of many local posts and comments at once.
+
+        Query parameters:
+            - object: id url of a post or comment, can be repeated up to 100 times
+            - author (optional): id url of an author, to also return whether the author liked each object
+
+        Objects that are not on this server are left out.
+
+        Returns:
+            - 200: if successful
+            - 400: if no object or too many objects are given
+            - 401: if server is not authorized
+        '''
+        if not is_server_authorized(request):
+            return get_401_response()
+
+        object_urls = request.GET.getlist('object')
+        if not object_urls or len(object_urls) > self.MAX_OBJECTS:
+            return HttpResponse(f'Between 1 and {self.MAX_OBJECTS} objects must be given', status=400)
+
+        return JsonResponse(self._get_like_counts(object_urls, request.GET.get('author')))
+
+    def _get_like_counts(self, object_urls, author_url=None) -> dict:
+        '''
+        Returns a dict that maps each url in object_urls to the like count of the object,
+        and whether author_url liked it.
+        '''
+        object_ids = {}
+        for url in object_urls:
+            try:
+                object_ids[url] = uuid.UUID(url.rstrip('/').split('/')[-1])
+            except ValueError:
+                continue
+
+        like_counts = dict(Post.objects.filter(id__in=object_ids.values()).values_list('id', 'like_count'))
+        like_counts.update(Comment.objects.filter(id__in=object_ids.values()).values_list('id', 'like_count'))
+        liked = set()
+        if author_url:
+            liked = set(Like.objects.filter(object_id__in=like_counts.keys(), author_url=author_url)
+                                    .values_list('object_id', flat=True))
+
+        data = {}
+        data['type'] = 'likeCounts'
+        data['items'] = {}
+        for url, object_id in object_ids.items():
+            if object_id in like_counts:
+                item = {'count': like_counts[object_id]}
+                if author_url:
+                    item['liked'] = object_id in liked
+                data['items'][url] = item
+        return data
@@ -7,8 +7,12 @@ from django.views import View
 from posts.forms import PostForm
 from django.core.exceptions import ValidationError
 
+from service.outbox import enqueue
 from service.server_authorization import is_server_authorized, is_local_server, get_401_response
+from social_distribution.friends import clear_audience
 from social_distribution.models import Author, Post
+from social_distribution.serializers import get_posts_detail_dicts
+from service.pagination import is_cursor_request, get_keyset_page_or_400
 
 
 class PostView(View):
@@ -163,6 +167,7 @@ class PostView(View):
         except ValidationError as e:
             status_code = 400
             return HttpResponse('The form data is not valid.', status=status_code)
+        enqueue('POST', post, author)
         
         return HttpResponse('Post successfully created', status=status_code)
 
@@ -179,6 +184,7 @@ class PostView(View):
         post.visibility = form.cleaned_data['visibility']
         post.save(update_fields=['title', 'description', 'content_type', 'content', 'image', 'categories', 'visibility'])
         post.save()     # update modified date
+        clear_audience(post)
 
             
 class PostsView(View):
@@ -195,8 +201,12 @@ class PostsView(View):
 
         Default page = 1, size = 15
 
+        With ?cursor=, the page after the cursor is returned with a "next" cursor
+        instead of the page number (an empty cursor returns the first page).
+
         Returns:
             - 200: if successful
+            - 400: if the cursor is invalid
             - 401: if server is not authorized
             - 404: if author or page does not exist
         '''
@@ -251,6 +261,7 @@ class PostsView(View):
             return HttpResponse('The form data is not valid.', status=status_code)
         
         post = Post.objects.create(author=author, **form.cleaned_data)
+        enqueue('POST', post, author)
         body = json.dumps(post.get_detail_dict())
         return HttpResponse(body, status=status_code)
 
@@ -263,6 +274,16 @@ class PostsView(View):
         size = int(request.GET.get('size', self.DEFAULT_SIZE))
 
         author = get_object_or_404(Author, pk=author_id)
+        if is_cursor_request(request):
+            q = Post.objects.filter(author=author, visibility='PUBLIC')
+            posts, next_cursor = get_keyset_page_or_400(q, ['-modified', '-id'], request, size)
+
+            data = {}
+            data['type'] = 'posts'
+            data['items'] = get_posts_detail_dicts(posts)
+            data['next'] = next_cursor
+            return data
+
         try:
             q = Post.objects.all().filter(author=author)
             count = q.count()
@@ -275,7 +296,7 @@ class PostsView(View):
         data = {}
         data['type'] = 'posts'
         data['count'] = count
-        data['items'] = [p.get_detail_dict() for p in posts]
+        data['items'] = get_posts_detail_dicts(posts)
         return data
 
 
@@ -8,9 +8,9 @@ from posts.forms import PostForm
 from django.core.exceptions import ValidationError
 
 from service.server_authorization import is_server_authorized, is_local_server, get_401_response
-from service.models import ServerNode
+from service.federation import federation_client
+from service.requests import get_server_node
 import requests
-from urllib.parse import urlparse
 
 
 
@@ -84,17 +84,23 @@ class ProxyView(View):
 
     def _do_proxy(self, url, method, data=None):
         '''Makes a request on behalf of the frontend'''
-        auth = self._get_auth_or_none(url)
-        if not auth:
+        node = get_server_node(url)
+        if not node:
             return JsonResponse({
                 'detail': f'The node {url} needs to be connected by serveradmin first'
             }, status=400)
         
         proxy_response = None
-        if method == 'GET':
-            proxy_response = requests.get(url, auth=auth)
-        elif method == 'POST':
-            proxy_response = requests.post(url, auth=auth, data=data)
+        try:
+            if method == 'GET':
+                proxy_response = federation_client.get(url, node=node)
+            elif method == 'POST':
+                proxy_response = federation_client.post(url, node=node, data=data)
+        except requests.RequestException:
+            return JsonResponse(
+                {'detail': f'The node {url} did not respond'},
+                status=504
+            )
         
         data = {}
         try:
@@ -106,14 +112,3 @@ class ProxyView(View):
             )
     
         return JsonResponse(data, status=proxy_response.status_code)
-
-    
-    def _get_auth_or_none(self, url):        
-        auth = None
-        host = urlparse(url).netloc
-        for node in ServerNode.objects.all():
-            if host in node.host:
-                auth = (node.sending_username, node.sending_password)
-                break
-        return auth
-
@@ -0,0 +1,63 @@
+import json
+
+from django.http import JsonResponse, HttpResponse
+from django.views import View
+
+from service.server_authorization import is_local_server, get_401_response
+from social_distribution.remote_cache import remote_object_cache
+
+
+class RemoteCacheView(View):
+
+    http_method_names = ['get', 'head', 'options', 'delete']
+
+    def get(self, request, *args, **kwargs):
+        '''
+        GET [local]: Returns the hit/miss counters of the remote object cache of this process.
+
+        Returns:
+            - 200: if successful
+            - 401: if server is not authorized
+        '''
+        if not is_local_server(request):
+            return get_401_response()
+
+        return JsonResponse(self._get_stats())
+
+    def head(self, request, *args, **kwargs):
+        '''
+        Handles HEAD request of the same GET request.
+
+        Returns:
+            - 200: if successful
+            - 401: if server is not authorized
+        '''
+        if not is_local_server(request):
+            return get_401_response()
+
+        data_json = json.dumps(self._get_stats())
+        response = HttpResponse()
+        response.headers['Content-Type'] = 'application/json'
+        response.headers['Content-Length'] = str(len(bytes(data_json, 'utf-8')))
+        return response
+
+    def delete(self, request, *args, **kwargs):
+        '''
+        DELETE [local]: Clears the remote object cache of this process.
+
+        Returns:
+            - 204: if successfully cleared
+            - 401: if server is not authorized
+        '''
+        if not is_local_server(request):
+            return get_401_response()
+
+        remote_object_cache.clear()
+        return HttpResponse('The remote object cache is cleared', status=204)
+
+    def _get_stats(self) -> dict:
+        '''Returns a dict that contains the counters of the remote object cache.'''
+        data = {}
+        data['type'] = 'remote-cache'
+        data.update(remote_object_cache.get_stats())
+        return data
@@ -5,3 +5,7 @@ class SocialDistributionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'social_distribution'
     verbose_name = 'Social Distribution'
+
+    def ready(self):
+        # register signal receivers
+        from social_distribution import friends
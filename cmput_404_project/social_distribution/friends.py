@@ -0,0 +1,124 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Author, Friends, Follower, FollowRequest, PostAudience
+
+
+DEFAULT_SETTINGS = {
+    # alias of the cache in settings.CACHES that keeps the friend sets.
+    # Use a cache shared by all processes so that they see each other's invalidations.
+    'CACHE_ALIAS': 'default',
+    # seconds a friend set is kept
+    'TIMEOUT': 60 * 5,
+}
+
+
+class FriendsCache():
+    '''
+    Cache of the friends of local authors, keyed by author id.
+
+    A friend is an author that follows the author back: an accepted Friends request in both
+    directions, or a Follower in both directions. A remote author is a friend if it follows the
+    author and the author sent it a FollowRequest. A friend set is loaded with one query for the
+    local friends and one for the remote friends, and is invalidated when a Friends, Follower or
+    FollowRequest of the author is saved or deleted.
+    '''
+
+    KEY_PREFIX = 'friends:'
+
+    def __init__(self, **options):
+        config = {**DEFAULT_SETTINGS, **getattr(settings, 'FRIENDS_CACHE', {}), **options}
+        self.cache_alias = config['CACHE_ALIAS']
+        self.timeout = config['TIMEOUT']
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_friends(self, author_id) -> dict:
+        '''Returns a dict with the 'local' friend ids and the 'remote' friend urls of author_id.'''
+        key = f'{self.KEY_PREFIX}{author_id}'
+        friends = self.cache.get(key)
+        if friends is None:
+            friends = self._load(author_id)
+            self.cache.set(key, friends, self.timeout)
+        return {'local': [uuid.UUID(i) for i in friends['local']], 'remote': list(friends['remote'])}
+
+    def get_local_ids(self, author_id) -> list:
+        '''Returns the ids of the local friends of author_id.'''
+        return self.get_friends(author_id)['local']
+
+    def invalidate(self, author_ids):
+        '''
+        Makes the next lookup of author_ids reload their friends. The friend sets are deleted
+        again once the current transaction commits, since another process may have loaded them
+        from the data before the change.
+        '''
+        keys = [f'{self.KEY_PREFIX}{author_id}' for author_id in author_ids if author_id is not None]
+        if keys:
+            self.cache.delete_many(keys)
+            transaction.on_commit(lambda: self.cache.delete_many(keys))
+
+    def _load(self, author_id) -> dict:
+        # author_id sent an accepted request to the friend, and the friend sent one to author_id
+        friends = Q(receiver__sender=author_id, receiver__status='accepted',
+                    sender__receiver=author_id, sender__status='accepted')
+        # the friend follows author_id, and author_id follows the friend
+        followers = Q(id__in=Follower.objects.filter(target_author=author_id).values('source_author_id'),
+                      target_author__source_author_id=author_id)
+        local_ids = Author.objects.filter(friends | followers).exclude(id=author_id) \
+                                  .values_list('id', flat=True).distinct()
+
+        followed_urls = FollowRequest.objects.filter(from_author=author_id).values('to_author_url')
+        remote_urls = Follower.objects.filter(target_author=author_id, source_author_id__isnull=True,
+                                              source_author_url__in=followed_urls) \
+                                      .values_list('source_author_url', flat=True).distinct()
+        return {'local': [str(i) for i in local_ids], 'remote': list(remote_urls)}
+
+
+friends_cache = FriendsCache()
+
+
+def get_readable_posts_q(author_id) -> Q:
+    '''
+    Returns a Q of the FRIENDS and PRIVATE posts that author_id can read: the FRIENDS posts
+    of its current friends, and the PRIVATE posts sent to it.
+    '''
+    return Q(visibility='FRIENDS', author_id__in=friends_cache.get_local_ids(author_id)) | \
+           Q(visibility='PRIVATE', audience__recipient=author_id)
+
+
+def clear_audience(post):
+    '''
+    Removes the readers of post unless it is a PRIVATE post. Only the recipients of a PRIVATE post
+    are saved, the readers of a FRIENDS post are the friends of its author when it is read.
+    '''
+    if post.visibility != 'PRIVATE':
+        PostAudience.objects.filter(post=post).delete()
+
+
+@receiver(post_save, sender=Friends)
+@receiver(post_delete, sender=Friends)
+def invalidate_friends(sender, instance, **kwargs):
+    '''Upon Friends change, reload the friends of both authors on the next lookup.'''
+    friends_cache.invalidate([instance.sender_id, instance.receiver_id])
+
+
+@receiver(post_save, sender=Follower)
+@receiver(post_delete, sender=Follower)
+def invalidate_followers(sender, instance, **kwargs):
+    '''Upon Follower change, reload the friends of both authors on the next lookup.'''
+    friends_cache.invalidate([instance.target_author_id, instance.source_author_id])
+
+
+@receiver(post_save, sender=FollowRequest)
+@receiver(post_delete, sender=FollowRequest)
+def invalidate_follow_requests(sender, instance, **kwargs):
+    '''Upon FollowRequest change, reload the friends of both authors on the next lookup.'''
+    friends_cache.invalidate([instance.from_author_id, instance.to_author_id])
@@ -1,4 +1,8 @@
+from collections import Counter
+
 from django.contrib.auth.base_user import BaseUserManager
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 
 
 class AuthorManager(BaseUserManager):
@@ -45,3 +49,75 @@ class AuthorManager(BaseUserManager):
         author = self.model(username=id, **extra_fields)
         author.save()
         return author
+
+
+class LikeManager(models.Manager):
+
+    def create_like(self, object_type, object_id, author_url, **extra_fields):
+        '''
+        Creates a like of the local object and increments the like_count of the object.
+
+        Returns (like, created). If author_url already liked the object,
+        the existing like is returned and nothing is changed.
+        '''
+        object_model = self.model.get_object_model(object_type)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    like = self.create(object_type=object_type,
+                                       object_id=object_id,
+                                       author_url=author_url,
+                                       **extra_fields)
+            except IntegrityError:
+                return self.get(object_id=object_id, author_url=author_url), False
+            object_model.objects.filter(id=object_id).update(like_count=F('like_count') + 1)
+        return like, True
+
+    def create_likes(self, likes) -> list:
+        '''
+        Creates the unsaved likes of local objects in one bulk insert, and increments
+        the like_count of the liked objects.
+
+        Returns a list of (like, created) in the order of likes. If author_url already liked
+        the object, or a like is repeated in likes, the existing like is returned instead.
+        '''
+        with transaction.atomic():
+            existing = self.filter(object_id__in={like.object_id for like in likes},
+                                   author_url__in={like.author_url for like in likes})
+            existing = {(like.object_id, like.author_url): like for like in existing}
+            results = []
+            new_likes = []
+            for like in likes:
+                key = (like.object_id, like.author_url)
+                if key in existing:
+                    results.append((existing[key], False))
+                else:
+                    existing[key] = like
+                    new_likes.append(like)
+                    results.append((like, True))
+
+            try:
+                with transaction.atomic():
+                    self.bulk_create(new_likes)
+            except IntegrityError:
+                # some of the likes were created concurrently
+                return [self.create_like(like.object_type, like.object_id, like.author_url,
+                                         author=like.author, object_url=like.object_url) for like in likes]
+
+            # one update per object type and increment, rather than one per object
+            increments = Counter((like.object_type, like.object_id) for like in new_likes)
+            object_ids = {}
+            for (object_type, object_id), n in increments.items():
+                object_ids.setdefault((object_type, n), []).append(object_id)
+            for (object_type, n), ids in object_ids.items():
+                self.model.get_object_model(object_type).objects.filter(id__in=ids) \
+                                                               .update(like_count=F('like_count') + n)
+        return results
+
+    def delete_like(self, like):
+        '''
+        Deletes the like. The like_count of the liked object is decremented by
+        the post_delete receiver of Like, as for likes deleted in any other way.
+        '''
+        with transaction.atomic():
+            self.filter(id=like.id).delete()
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.12 on 2026-10-18 20:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0002_alter_post_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='share_from',
+            field=models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shared', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
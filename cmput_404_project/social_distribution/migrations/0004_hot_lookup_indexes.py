@@ -0,0 +1,45 @@
+# Generated by Django 3.2.12 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0003_post_share_from'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-date_created'], name='comment_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follower',
+            index=models.Index(fields=['target_author', 'source_author_id'], name='follower_target_source_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['from_author_url', 'to_author'], name='followrequest_from_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboxitem',
+            index=models.Index(fields=['inbox', '-date_created'], name='inboxitem_inbox_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboxitem',
+            index=models.Index(fields=['object_id'], name='inboxitem_object_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['object_url', 'object_type'], name='like_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['author', 'author_url'], name='like_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'visibility', '-modified'], name='post_author_visibility_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+import uuid
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+CHUNK_SIZE = 500
+
+
+def get_object_id(object_url):
+    try:
+        return uuid.UUID(object_url.rstrip('/').split('/')[-1])
+    except ValueError:
+        return None
+
+
+def get_existing_ids(model, ids) -> set:
+    ids = list(ids)
+    existing = set()
+    for i in range(0, len(ids), CHUNK_SIZE):
+        existing.update(model.objects.filter(id__in=ids[i:i + CHUNK_SIZE]).values_list('id', flat=True))
+    return existing
+
+
+def get_like_batches(Like):
+    '''Yields the likes in batches of CHUNK_SIZE, oldest first, without keeping them all in memory.'''
+    likes = Like.objects.order_by('date_created', 'id')
+    last = None
+    while True:
+        batch = likes
+        if last is not None:
+            batch = batch.filter(Q(date_created__gt=last.date_created) | Q(date_created=last.date_created, id__gt=last.id))
+        batch = list(batch[:CHUNK_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def backfill_like_counts(apps, schema_editor):
+    '''
+    Sets object_id of the likes of local objects, removes duplicate likes
+    of the same author and counts the likes of each post and comment.
+    '''
+    Author = apps.get_model('social_distribution', 'Author')
+    Post = apps.get_model('social_distribution', 'Post')
+    Comment = apps.get_model('social_distribution', 'Comment')
+    Like = apps.get_model('social_distribution', 'Like')
+    models = {'POST': Post, 'COMMENT': Comment}
+
+    # the (object_id, author_url) of the likes that are kept
+    seen = set()
+    for likes in get_like_batches(Like):
+        object_ids = {like.id: get_object_id(like.object_url or '') for like in likes}
+        existing_ids = {object_type: get_existing_ids(model, {object_ids[like.id] for like in likes
+                                                              if like.object_type == object_type and object_ids[like.id]})
+                        for object_type, model in models.items()}
+        authors = Author.objects.in_bulk({like.author_id for like in likes if like.author_id})
+
+        kept = []
+        duplicates = []
+        for like in likes:
+            object_id = object_ids[like.id]
+            like.object_id = object_id if object_id in existing_ids.get(like.object_type, set()) else None
+            if not like.author_url and like.author_id in authors:
+                author = authors[like.author_id]
+                like.author_url = f'{author.host}service/authors/{author.id}'
+
+            if like.object_id is not None:
+                key = (like.object_id, like.author_url)
+                if key in seen:
+                    # keep the oldest like of an author
+                    duplicates.append(like.id)
+                    continue
+                seen.add(key)
+            kept.append(like)
+
+        Like.objects.filter(id__in=duplicates).delete()
+        Like.objects.bulk_update(kept, ['object_id', 'author_url'])
+
+    # one UPDATE per model, counting the likes of each object in a subquery
+    for object_type, model in models.items():
+        num_likes = Like.objects.filter(object_type=object_type, object_id=OuterRef('id')) \
+                                .order_by().values('object_id') \
+                                .annotate(num_likes=Count('id')).values('num_likes')
+        model.objects.update(like_count=Coalesce(Subquery(num_likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0005_like_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0006_backfill_like_counts'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('object_id', 'author_url'), name='like_unique_object_author'),
+        ),
+    ]
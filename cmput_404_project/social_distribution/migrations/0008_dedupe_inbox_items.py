@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+CHUNK_SIZE = 500
+
+
+def dedupe_inbox_items(apps, schema_editor):
+    '''Removes the InboxItems that are repeated in an inbox, and keeps the oldest one.'''
+    InboxItem = apps.get_model('social_distribution', 'InboxItem')
+
+    items = InboxItem.objects.order_by('date_created').values_list('id', 'inbox_id', 'object_id', 'object_url')
+    seen = set()
+    duplicates = []
+    for item_id, inbox_id, object_id, object_url in items.iterator():
+        keys = [(inbox_id, 'id', object_id), (inbox_id, 'url', object_url)]
+        keys = [key for key in keys if key[2] is not None]
+        if any(key in seen for key in keys):
+            duplicates.append(item_id)
+            continue
+        seen.update(keys)
+
+    for i in range(0, len(duplicates), CHUNK_SIZE):
+        InboxItem.objects.filter(id__in=duplicates[i:i + CHUNK_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0007_like_unique_object_author'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_inbox_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0008_dedupe_inbox_items'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='inboxitem',
+            constraint=models.UniqueConstraint(fields=('inbox', 'object_id'), name='inboxitem_unique_object_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='inboxitem',
+            constraint=models.UniqueConstraint(fields=('inbox', 'object_url'), name='inboxitem_unique_object_url'),
+        ),
+    ]
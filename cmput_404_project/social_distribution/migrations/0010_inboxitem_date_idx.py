@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0009_inboxitem_unique_object'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inboxitem',
+            index=models.Index(fields=['date_created'], name='inboxitem_date_idx'),
+        ),
+    ]
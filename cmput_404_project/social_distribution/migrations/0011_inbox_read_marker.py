@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0010_inboxitem_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inbox',
+            name='last_read_at',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='inbox',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inbox',
+            name='unread_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    '''Counts the items of each inbox as unread, since nothing was marked read before.'''
+    Inbox = apps.get_model('social_distribution', 'Inbox')
+    InboxItem = apps.get_model('social_distribution', 'InboxItem')
+
+    counts = InboxItem.objects.filter(inbox=OuterRef('pk')).order_by().values('inbox') \
+                              .annotate(num_items=Count('id')).values('num_items')
+    Inbox.objects.update(unread_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0011_inbox_read_marker'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0012_backfill_unread_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audience', to='social_distribution.post')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='audience_posts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='postaudience',
+            index=models.Index(fields=['recipient', 'post'], name='postaudience_recipient_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postaudience',
+            constraint=models.UniqueConstraint(fields=('post', 'recipient'), name='postaudience_unique_recipient'),
+        ),
+    ]
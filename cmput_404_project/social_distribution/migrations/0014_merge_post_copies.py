@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.db import migrations
+
+
+# the fields that are the same in all copies of a post
+COPY_FIELDS = ['author_id', 'share_from_id', 'title', 'description', 'content_type', 'content', 'image', 'categories']
+
+# copies of a post were saved one after another, in the same request
+MAX_COPY_DELAY = timedelta(minutes=1)
+
+
+def get_copy_groups(posts) -> list:
+    '''
+    Returns the lists of posts that are copies of the same post, oldest first.
+
+    posts must be ordered by COPY_FIELDS and published.
+    '''
+    groups = []
+    key = None
+    for post in posts:
+        group = groups[-1] if groups else None
+        post_key = [getattr(post, field) for field in COPY_FIELDS]
+        if group is None or post_key != key or post.published - group[0].published > MAX_COPY_DELAY \
+                or any(p.recipient == post.recipient for p in group):
+            groups.append([post])
+            key = post_key
+        else:
+            group.append(post)
+    return groups
+
+
+def merge_post_copies(apps, schema_editor):
+    '''
+    Replaces the copies of a FRIENDS or PRIVATE post, one per recipient, with one post and
+    a PostAudience per recipient.
+
+    The comments, likes and inbox items of the copies are moved to the oldest copy.
+    A post sent to more than one recipient becomes a FRIENDS post.
+    '''
+    Author = apps.get_model('social_distribution', 'Author')
+    Post = apps.get_model('social_distribution', 'Post')
+    PostAudience = apps.get_model('social_distribution', 'PostAudience')
+    Comment = apps.get_model('social_distribution', 'Comment')
+    Like = apps.get_model('social_distribution', 'Like')
+    InboxItem = apps.get_model('social_distribution', 'InboxItem')
+
+    posts = Post.objects.filter(recipient__isnull=False).order_by(*COPY_FIELDS, 'published')
+    author_ids = set(Author.objects.values_list('id', flat=True))
+
+    for group in get_copy_groups(posts.iterator()):
+        post, copies = group[0], group[1:]
+        copy_ids = [p.id for p in copies]
+
+        PostAudience.objects.bulk_create([
+            PostAudience(post_id=post.id, recipient_id=p.recipient)
+            for p in group if p.recipient in author_ids
+        ], ignore_conflicts=True)
+        if not copies:
+            continue
+
+        Comment.objects.filter(post_id__in=copy_ids).update(post_id=post.id)
+
+        liked_by = set(Like.objects.filter(object_id=post.id).values_list('author_url', flat=True))
+        for like in Like.objects.filter(object_type='POST', object_id__in=copy_ids):
+            if like.author_url in liked_by:
+                like.delete()
+                continue
+            liked_by.add(like.author_url)
+            like.object_url = like.object_url.replace(str(like.object_id), str(post.id))
+            like.object_id = post.id
+            like.save(update_fields=['object_id', 'object_url'])
+
+        inbox_ids = set(InboxItem.objects.filter(object_id=post.id).values_list('inbox_id', flat=True))
+        for item in InboxItem.objects.filter(object_type='POST', object_id__in=copy_ids):
+            if item.inbox_id in inbox_ids:
+                item.delete()
+                continue
+            inbox_ids.add(item.inbox_id)
+            item.object_id = post.id
+            item.save(update_fields=['object_id'])
+
+        for copy in copies:
+            post.liked.add(*copy.liked.all())
+        post.count = sum(p.count for p in group)
+        post.like_count = Like.objects.filter(object_id=post.id).count()
+        post.visibility = 'FRIENDS'
+        post.save(update_fields=['count', 'like_count', 'visibility'])
+        Post.objects.filter(id__in=copy_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0013_postaudience'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_post_copies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0014_merge_post_copies'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='post',
+            name='recipient',
+        ),
+    ]
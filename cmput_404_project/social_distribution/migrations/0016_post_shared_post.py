@@ -0,0 +1,19 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0015_remove_post_recipient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='shared_post',
+            field=models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='social_distribution.post'),
+        ),
+    ]
@@ -0,0 +1,138 @@
+from django.db import migrations
+
+
+CHUNK_SIZE = 500
+
+# the content of a share, which was copied from the shared post
+CONTENT_FIELDS = ['title', 'description', 'content_type', 'content', 'image', 'categories']
+
+
+def get_post_url(post) -> str:
+    return f'{post.author.host}service/authors/{post.author_id}/posts/{post.id}'
+
+
+def backfill_origins(apps, schema_editor):
+    '''Makes the posts that were saved without a source and an origin their own source and origin.'''
+    Post = apps.get_model('social_distribution', 'Post')
+
+    posts = Post.objects.filter(author__isnull=False, share_from__isnull=True).exclude(origin__gt='') \
+                        .select_related('author')
+    batch = []
+    for post in posts.iterator():
+        post.source = post.origin = get_post_url(post)
+        batch.append(post)
+        if len(batch) == CHUNK_SIZE:
+            Post.objects.bulk_update(batch, ['source', 'origin'])
+            batch = []
+    Post.objects.bulk_update(batch, ['source', 'origin'])
+
+
+def find_shared_post(Post, share):
+    '''Returns the post that share was copied from, or None if it was deleted.'''
+    content = {field: getattr(share, field) for field in CONTENT_FIELDS}
+    return Post.objects.filter(author_id=share.share_from_id, published__lte=share.published, **content) \
+                       .exclude(id=share.id).select_related('author').order_by('-published').first()
+
+
+def merge_shares(apps, share, duplicates):
+    '''
+    Moves the audience, comments, likes, inbox items and shares of duplicates to share,
+    and deletes duplicates.
+    '''
+    Post = apps.get_model('social_distribution', 'Post')
+    PostAudience = apps.get_model('social_distribution', 'PostAudience')
+    Comment = apps.get_model('social_distribution', 'Comment')
+    Like = apps.get_model('social_distribution', 'Like')
+    InboxItem = apps.get_model('social_distribution', 'InboxItem')
+    duplicate_ids = [p.id for p in duplicates]
+
+    recipients = PostAudience.objects.filter(post_id__in=duplicate_ids).values_list('recipient_id', flat=True)
+    PostAudience.objects.bulk_create([PostAudience(post_id=share.id, recipient_id=r) for r in set(recipients)],
+                                     ignore_conflicts=True)
+    Comment.objects.filter(post_id__in=duplicate_ids).update(post_id=share.id)
+    Post.objects.filter(source__in=[get_post_url(p) for p in duplicates]).update(source=get_post_url(share))
+
+    liked_by = set(Like.objects.filter(object_id=share.id).values_list('author_url', flat=True))
+    for like in Like.objects.filter(object_type='POST', object_id__in=duplicate_ids):
+        if like.author_url in liked_by:
+            like.delete()
+            continue
+        liked_by.add(like.author_url)
+        like.object_url = like.object_url.replace(str(like.object_id), str(share.id))
+        like.object_id = share.id
+        like.save(update_fields=['object_id', 'object_url'])
+
+    inbox_ids = set(InboxItem.objects.filter(object_id=share.id).values_list('inbox_id', flat=True))
+    for item in InboxItem.objects.filter(object_type='POST', object_id__in=duplicate_ids):
+        if item.inbox_id in inbox_ids:
+            item.delete()
+            continue
+        inbox_ids.add(item.inbox_id)
+        item.object_id = share.id
+        item.save(update_fields=['object_id'])
+
+    for duplicate in duplicates:
+        share.liked.add(*duplicate.liked.all())
+    share.count += sum(p.count for p in duplicates)
+    share.like_count = Like.objects.filter(object_id=share.id).count()
+    share.save(update_fields=['count', 'like_count'])
+    Post.objects.filter(id__in=duplicate_ids).delete()
+
+
+def collapse_shared_posts(apps, schema_editor):
+    '''
+    Replaces the content copied into each share with a reference to the original post,
+    then merges the shares of the same original post by the same author into the oldest one.
+
+    A share of a share references the original post, and its source is the share it was
+    shared from. A share whose original post was deleted keeps its content.
+    '''
+    Post = apps.get_model('social_distribution', 'Post')
+
+    # resolve all shares before their content is cleared, since a share of a share
+    # is found by the content of the share it was copied from
+    shares = Post.objects.filter(share_from__isnull=False, shared_post__isnull=True).select_related('author') \
+                         .order_by('published')
+    sources = {}
+    for share in shares.iterator():
+        source = find_shared_post(Post, share)
+        if source is not None:
+            sources[share.id] = (share, source)
+
+    for share, source in sources.values():
+        original = source
+        seen = {share.id}
+        while original.id in sources and original.id not in seen:
+            seen.add(original.id)
+            original = sources[original.id][1]
+        if original.shared_post_id is not None:
+            original = Post.objects.select_related('author').get(id=original.shared_post_id)
+
+        share.shared_post = original
+        share.source = get_post_url(source)
+        share.origin = original.origin or get_post_url(original)
+        share.title = share.description = share.content = share.categories = ''
+        share.image = None
+        share.save(update_fields=['shared_post', 'source', 'origin',
+                                  'title', 'description', 'content', 'categories', 'image'])
+
+    shares = Post.objects.filter(shared_post__isnull=False).select_related('author') \
+                         .order_by('author_id', 'shared_post_id', 'published')
+    groups = {}
+    for share in shares.iterator():
+        groups.setdefault((share.author_id, share.shared_post_id), []).append(share)
+    for group in groups.values():
+        if len(group) > 1:
+            merge_shares(apps, group[0], group[1:])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0016_post_shared_post'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_origins, migrations.RunPython.noop),
+        migrations.RunPython(collapse_shared_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-18 21:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0017_collapse_shared_posts'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(fields=('author', 'shared_post'), name='post_unique_share'),
+        ),
+    ]
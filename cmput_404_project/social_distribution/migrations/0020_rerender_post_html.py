@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from social_distribution.rendering import render_all
+
+
+def rerender_post_html(apps, schema_editor):
+    '''Renders the markdown posts again, so that the raw html stored in their content_html is escaped.'''
+    Post = apps.get_model('social_distribution', 'Post')
+    render_all(Post.objects.exclude(content_hash=''), lambda post: (post.content_type, post.content), force=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0019_post_content_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(rerender_post_html, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def remove_friends_audience(apps, schema_editor):
+    '''
+    Removes the readers saved with FRIENDS and PUBLIC posts. A FRIENDS post is read by the
+    current friends of its author, and only the recipients of a PRIVATE post are saved.
+    '''
+    PostAudience = apps.get_model('social_distribution', 'PostAudience')
+    PostAudience.objects.exclude(post__visibility='PRIVATE').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social_distribution', '0020_rerender_post_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_friends_audience, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,16 @@
 import uuid
-import requests
 
-from urllib.parse import urlparse
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.core.paginator import Paginator
 
-from service.requests import get_b64_server_credential
-
-from .managers import AuthorManager
+from .managers import AuthorManager, LikeManager
+from .remote_cache import remote_object_cache
+from .rendering import render_content
 
 
 class Author(AbstractUser):
@@ -60,6 +61,9 @@ class Follower(models.Model):
 
     class Meta:
         verbose_name = 'Follower'
+        indexes = [
+            models.Index(fields=['target_author', 'source_author_id'], name='follower_target_source_idx'),
+        ]
 
     # source_author follows target_author
     # target_author always exist in local server
@@ -96,6 +100,15 @@ class Post(models.Model):
     DEFAULT_COMMENTS_PAGE = 1
     DEFAULT_COMMENTS_SIZE = 5
 
+    class Meta:
+        indexes = [
+            # public posts of an author, newest first
+            models.Index(fields=['author', 'visibility', '-modified'], name='post_author_visibility_idx'),
+        ]
+        constraints = [
+            # an author shares a post at most once
+            models.UniqueConstraint(fields=['author', 'shared_post'], name='post_unique_share'),
+        ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     author = models.ForeignKey(Author, on_delete=models.CASCADE, default=None, null=True, blank=True)
@@ -106,28 +119,46 @@ class Post(models.Model):
     description = models.TextField(max_length=150, default='')
     content_type = models.CharField(max_length=18, choices=CONTENT_TYPE_CHOICES, default='text/plain')
     content = models.TextField(max_length=10000, default='')
+    # html of markdown content, rendered upon save, see social_distribution/rendering.py
+    content_html = models.TextField(default='', editable=False)
+    content_hash = models.CharField(max_length=64, default='', editable=False)
     categories = models.CharField(max_length=100, default='')
     count = models.IntegerField(default=0)
+    # number of likes, maintained by Like.objects.create_like() and decrement_like_count()
+    like_count = models.IntegerField(default=0)
     published = models.DateTimeField(default=timezone.now, editable=False)
     modified = models.DateTimeField(default=timezone.now)
     visibility = models.CharField(max_length=7, choices=VISIBILITY_CHOICES, default='PUBLIC')
     unlisted = models.BooleanField(default=False)
     liked = models.ManyToManyField(Author, blank=True, related_name='likes')
     comments_id = models.UUIDField(default=uuid.uuid4, editable=False)
-    recipient = models.UUIDField(Author, null=True, default=None)
     share_from = models.ForeignKey(Author, on_delete=models.SET_NULL, null=True, default=None, related_name='shared')
+    # original post of a share. A share has no content of its own, see get_content_post()
+    shared_post = models.ForeignKey('self', on_delete=models.CASCADE, null=True, default=None, related_name='shares')
 
 
     type = 'post'
 
     def save(self, *args, **kwargs):
-        '''Upon save, update timestamps of the post'''
+        '''
+        Upon save, update timestamps of the post, make a new post its own source and origin,
+        and render its markdown content if it changed
+        '''
         self.modified = timezone.now()
+        if not self.origin and self.author_id is not None:
+            self.source = self.source or self.get_id_url()
+            self.origin = self.get_id_url()
+        if render_content(self, self.content_type, self.content) and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'content_html', 'content_hash'}
         return super(Post, self).save(*args, **kwargs)
 
     def get_id_url(self):
         return f'{self.author.get_id_url()}/posts/{self.id}'
 
+    def get_content_post(self):
+        '''Returns the post whose content is shown: the original post of a share, or this post.'''
+        return self.shared_post if self.shared_post_id is not None else self
+
     def get_comments_id_url(self):
         return f'{self.get_id_url()}/comments'
 
@@ -140,24 +171,28 @@ class Post(models.Model):
     def get_iso_modified(self):
         return self.modified.replace(microsecond=0).isoformat()
 
-    def get_detail_dict(self, page=DEFAULT_COMMENTS_PAGE, size=DEFAULT_COMMENTS_SIZE) -> dict:
+    def get_detail_dict(self, page=DEFAULT_COMMENTS_PAGE, size=DEFAULT_COMMENTS_SIZE, comments=None) -> dict:
         '''
         Returns a dict that contains a post detail.
+
+        If comments is given, it is used as the page of comments instead of querying it.
+        The content of a share is the content of its original post.
         '''
+        content_post = self.get_content_post()
         d = {}
         d['type'] = self.type
-        d['title'] = self.title
+        d['title'] = content_post.title
         d['id'] = self.get_id_url()
         d['source'] = self.source
         d['origin'] = self.origin
-        d['description'] = self.description
-        d['contentType'] = self.content_type
-        d['content'] = self.content
+        d['description'] = content_post.description
+        d['contentType'] = content_post.content_type
+        d['content'] = content_post.content
         d['author'] = self.author.get_detail_dict()
-        d['categories'] = self.get_list_of_categories()
+        d['categories'] = content_post.get_list_of_categories()
         d['count'] = self.count
         d['comments'] = self.get_comments_id_url()
-        d['commentsSrc'] = self.get_comments_src_dict(page, size)
+        d['commentsSrc'] = self.get_comments_src_dict(page, size, comments)
         d['published'] = self.get_iso_published()
         d['visibility'] = self.visibility
         d['unlisted'] = self.unlisted
@@ -166,12 +201,15 @@ class Post(models.Model):
 
         return d
 
-    def get_comments_src_dict(self, page=DEFAULT_COMMENTS_PAGE, size=DEFAULT_COMMENTS_SIZE) -> dict:
+    def get_comments_src_dict(self, page=DEFAULT_COMMENTS_PAGE, size=DEFAULT_COMMENTS_SIZE, comments=None) -> dict:
         '''
         Returns a dict that contains the details of the comments for the post
+
+        If comments is given, it is used as the page of comments instead of querying it.
         '''
-        q = Comment.objects.filter(post=self).order_by('-date_created')
-        comments = Paginator(q, size).page(page)
+        if comments is None:
+            q = Comment.objects.filter(post=self).order_by('-date_created')
+            comments = Paginator(q, size).page(page)
 
         data = {}
         data['type'] = 'comments'
@@ -184,7 +222,34 @@ class Post(models.Model):
         return data
 
 
+class PostAudience(models.Model):
+    '''
+    A local author that a PRIVATE post is sent to.
+
+    A post is saved once, with one PostAudience per recipient, instead of one copy per recipient.
+    FRIENDS posts have no PostAudience: they are read by the current friends of their author.
+    '''
+
+    class Meta:
+        indexes = [
+            # posts that an author can read
+            models.Index(fields=['recipient', 'post'], name='postaudience_recipient_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'recipient'], name='postaudience_unique_recipient'),
+        ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='audience')
+    recipient = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='audience_posts')
+
+
 class FollowRequest(models.Model):
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_author_url', 'to_author'], name='followrequest_from_to_idx'),
+        ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     from_author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='follow_request_from', null=True)
     from_author_url = models.URLField(max_length=1000, editable=False, null=False)
@@ -235,6 +300,12 @@ class Comment(models.Model):
         ('image/jpeg;base64', 'jpeg')
     ]
 
+    class Meta:
+        indexes = [
+            # comments of a post, newest first
+            models.Index(fields=['post', '-date_created'], name='comment_post_date_idx'),
+        ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     author = models.ForeignKey(Author, on_delete=models.CASCADE, null=True)
     author_url = models.URLField(max_length=1000, editable=False, null=False)
@@ -242,6 +313,8 @@ class Comment(models.Model):
     content_type = models.CharField(max_length=18, choices=CONTENT_TYPE_CHOICES, default='text/plain')
     date_created = models.DateTimeField(default=timezone.now, editable=False)
     content = models.TextField(max_length=1000, default='')
+    # number of likes, maintained by Like.objects.create_like() and decrement_like_count()
+    like_count = models.IntegerField(default=0)
 
     type = 'comment'
 
@@ -272,17 +345,37 @@ class Like(models.Model):
     ]
     context = "https://www.w3.org/ns/activitystreams"
 
+    class Meta:
+        indexes = [
+            # likes of an object
+            models.Index(fields=['object_url', 'object_type'], name='like_object_idx'),
+            # likes made by a local author
+            models.Index(fields=['author', 'author_url'], name='like_author_idx'),
+        ]
+        constraints = [
+            # an author likes an object at most once
+            models.UniqueConstraint(fields=['object_id', 'author_url'], name='like_unique_object_author'),
+        ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     # Author object does not have to be given, but author url must be provided
     author = models.ForeignKey(Author, on_delete=models.CASCADE, default=None, null=True)
     author_url = models.URLField(max_length=1000, editable=False, null=False)
     object_type = models.CharField(max_length=7, choices=OBJECT_TYPE_CHOICES, default='POST')
-    # object_id = models.UUIDField(default=None, editable=False, null=True)
+    # id of the liked local post or comment
+    object_id = models.UUIDField(default=None, editable=False, null=True)
     object_url = models.URLField(max_length=1000, default=None, editable=False)
     date_created = models.DateTimeField(default=timezone.now, editable=False)
 
+    objects = LikeManager()
+
     type = 'Like'
 
+    @staticmethod
+    def get_object_model(object_type):
+        '''Returns the model of the objects of object_type that can be liked.'''
+        return Post if object_type == 'POST' else Comment
+
 
     def get_iso_date_created(self):
         return self.date_created.replace(microsecond=0).isoformat()
@@ -333,8 +426,24 @@ class Like(models.Model):
 
 
 
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, **kwargs):
+    '''
+    Decrements the like_count of the liked object when a like is deleted in any way,
+    including Like.objects.delete_like(), QuerySet.delete() and cascades.
+    '''
+    if instance.object_id is not None:
+        Like.get_object_model(instance.object_type).objects.filter(id=instance.object_id) \
+                                                        .update(like_count=F('like_count') - 1)
+
+
 class Inbox(models.Model):
     author = models.ForeignKey(Author, on_delete=models.CASCADE)
+    # id of the newest InboxItem the author has read
+    last_read_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, default=None)
+    # number of items added after last_read_id, kept up to date on insert and on read
+    unread_count = models.IntegerField(default=0)
     type = 'inbox'
 
 
@@ -357,6 +466,20 @@ class InboxItem(models.Model):
         ('LIKE', 'like')
     ]
 
+    class Meta:
+        indexes = [
+            # items of an inbox, newest first
+            models.Index(fields=['inbox', '-date_created'], name='inboxitem_inbox_date_idx'),
+            models.Index(fields=['object_id'], name='inboxitem_object_id_idx'),
+            # expired items
+            models.Index(fields=['date_created'], name='inboxitem_date_idx'),
+        ]
+        constraints = [
+            # an object is in an inbox at most once
+            models.UniqueConstraint(fields=['inbox', 'object_id'], name='inboxitem_unique_object_id'),
+            models.UniqueConstraint(fields=['inbox', 'object_url'], name='inboxitem_unique_object_url'),
+        ]
+
     inbox = models.ForeignKey(Inbox, on_delete=models.CASCADE)
     object_type = models.CharField(max_length=7, choices=OBJECT_TYPE_CHOICES, default='POST')
     object_id = models.UUIDField(default=None, editable=False, null=True)
@@ -386,15 +509,10 @@ def request_detail_dict(object_url) -> dict:
     '''
     Makes a GET request to service api of object_url.
     Then, returns a parsed json data.
+
+    Responses are cached in remote_object_cache, see social_distribution.remote_cache.
     '''
-    o = urlparse(object_url)
-    o.scheme
-    headers = {}
-    b64_basic_auth = get_b64_server_credential(f"{o.scheme}://{o.netloc}")
-    if b64_basic_auth:
-        headers['Authorization'] = b64_basic_auth
-    res = requests.get(object_url, headers=headers)
-    return dict(res.json()) if res.status_code == 200 else {}
+    return remote_object_cache.get(object_url)
 
 
 
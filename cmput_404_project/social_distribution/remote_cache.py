@@ -0,0 +1,249 @@
+import copy
+import hashlib
+import threading
+import time
+import requests
+
+from collections import OrderedDict
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.cache import caches
+
+from service.fanout import FanOut
+from service.federation import federation_client
+from service.requests import get_server_node
+
+
+DEFAULT_SETTINGS = {
+    # alias of a cache in settings.CACHES shared by all processes, or None to only use the in-process cache
+    'CACHE_ALIAS': None,
+    # max number of objects kept in the in-process cache
+    'MAX_ENTRIES': 1000,
+    # seconds an object is fresh, per object type
+    'TIMEOUTS': {
+        'author': 300,
+        'post': 60,
+        'comment': 60,
+        'default': 60,
+    },
+    # seconds a failed or not found object is remembered
+    'NEGATIVE_TIMEOUT': 30,
+    # seconds an expired object is kept so that it can be revalidated with ETag/Last-Modified
+    'STALE_TIMEOUT': 60 * 60 * 24,
+    # seconds get_many() waits for all objects
+    'DEADLINE': 5,
+}
+
+OBJECT_TYPES = {
+    'authors': 'author',
+    'posts': 'post',
+    'comments': 'comment',
+}
+
+
+class RemoteObjectCache():
+    '''
+    Cache of the objects of remote servers, keyed by their url.
+
+    Objects are kept in an in-process LRU cache and, if CACHE_ALIAS is set, in a Django cache
+    shared by all processes. Failed requests are cached for NEGATIVE_TIMEOUT seconds.
+    Expired objects are revalidated with If-None-Match / If-Modified-Since when possible.
+
+    Objects of the local node are not cached: they are read from the service view in this
+    process on every call, see service/dispatch.py.
+    '''
+
+    def __init__(self, **options):
+        config = {**DEFAULT_SETTINGS, **getattr(settings, 'REMOTE_OBJECT_CACHE', {}), **options}
+        self.max_entries = config['MAX_ENTRIES']
+        self.timeouts = {**DEFAULT_SETTINGS['TIMEOUTS'], **config['TIMEOUTS']}
+        self.negative_timeout = config['NEGATIVE_TIMEOUT']
+        self.stale_timeout = config['STALE_TIMEOUT']
+        self.deadline = config['DEADLINE']
+        self.shared_cache = caches[config['CACHE_ALIAS']] if config['CACHE_ALIAS'] else None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(['hits', 'misses', 'negative_hits', 'revalidations', 'evictions', 'errors'], 0)
+
+    def get(self, object_url) -> dict:
+        '''
+        Returns the parsed json data of object_url.
+        Returns an empty dict if the object does not exist or the request fails.
+
+        The returned dict is a copy, so callers can change it without changing the cached object.
+        '''
+        if self._is_local(object_url):
+            return self._get_local(object_url)
+
+        entry = self._get_entry(object_url)
+        if entry is not None and entry['expires'] > time.time():
+            self._count('negative_hits' if entry['negative'] else 'hits')
+            return copy.deepcopy(entry['data'])
+
+        self._count('misses')
+        entry = self._fetch(object_url, entry)
+        self._set_entry(object_url, entry)
+        return copy.deepcopy(entry['data'])
+
+    def get_many(self, object_urls, deadline=None) -> dict:
+        '''
+        Returns a dict that maps each url in object_urls to its parsed json data.
+
+        Objects that are not cached are fetched concurrently. An object that is not fetched
+        before the deadline gets an empty dict and is remembered as failed, so that later get()
+        calls do not wait for it either. If its request still finishes in the background,
+        the fetched object replaces the failed entry.
+        '''
+        data = {}
+        futures = {}
+        with FanOut(deadline if deadline is not None else self.deadline) as fan_out:
+            for object_url in set(object_urls):
+                if self._is_local(object_url):
+                    # dispatched in this thread, in the transaction of the caller
+                    data[object_url] = self._get_local(object_url)
+                    continue
+                entry = self._get_entry(object_url)
+                if entry is not None and entry['expires'] > time.time():
+                    data[object_url] = self.get(object_url)
+                else:
+                    futures[fan_out.submit(self.get, object_url)] = object_url
+
+            for future, object_data in fan_out.as_completed(futures):
+                data[futures[future]] = object_data
+
+            for future, object_url in futures.items():
+                if object_url in data:
+                    continue
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    data[object_url] = future.result()
+                else:
+                    self._set_local_entry(object_url, self._make_entry({}, negative=True))
+                    data[object_url] = {}
+        return data
+
+    def invalidate(self, object_url):
+        '''Removes object_url from the cache.'''
+        with self._lock:
+            self._entries.pop(object_url, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self._get_shared_key(object_url))
+
+    def clear(self):
+        '''Removes all objects from the in-process cache and resets the counters.'''
+        with self._lock:
+            self._entries.clear()
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def get_stats(self) -> dict:
+        '''Returns a dict that contains the hit/miss counters of this process.'''
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['negative_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def get_timeout(self, object_url) -> int:
+        '''Returns the seconds the object of object_url stays fresh, based on its type.'''
+        segments = [s for s in urlparse(object_url).path.split('/') if s]
+        object_type = OBJECT_TYPES.get(segments[-2], 'default') if len(segments) > 1 else 'default'
+        return self.timeouts.get(object_type, self.timeouts['default'])
+
+    def _is_local(self, object_url) -> bool:
+        node = get_server_node(object_url)
+        return node is not None and node.is_local
+
+    def _get_local(self, object_url) -> dict:
+        '''Returns the parsed json data of object_url of the local node, or an empty dict.'''
+        try:
+            res = federation_client.get(object_url)
+            return dict(res.json()) if res.status_code == 200 else {}
+        except (requests.RequestException, ValueError):
+            return {}
+
+    def _fetch(self, object_url, stale_entry) -> dict:
+        '''
+        Makes a GET request to object_url and returns a new cache entry.
+        If stale_entry has validators, the request is conditional.
+        '''
+        headers = {}
+        if stale_entry is not None and not stale_entry['negative']:
+            if stale_entry['etag']:
+                headers['If-None-Match'] = stale_entry['etag']
+            if stale_entry['last_modified']:
+                headers['If-Modified-Since'] = stale_entry['last_modified']
+
+        try:
+            res = federation_client.get(object_url, headers=headers)
+        except requests.RequestException:
+            self._count('errors')
+            return self._make_entry({}, negative=True)
+
+        if res.status_code == 304 and stale_entry is not None and not stale_entry['negative']:
+            self._count('revalidations')
+            return self._make_entry(stale_entry['data'], object_url,
+                                    etag=stale_entry['etag'],
+                                    last_modified=stale_entry['last_modified'])
+        if res.status_code != 200:
+            return self._make_entry({}, negative=True)
+
+        try:
+            data = dict(res.json())
+        except ValueError:
+            self._count('errors')
+            return self._make_entry({}, negative=True)
+
+        return self._make_entry(data, object_url,
+                                etag=res.headers.get('ETag'),
+                                last_modified=res.headers.get('Last-Modified'))
+
+    def _make_entry(self, data, object_url=None, etag=None, last_modified=None, negative=False) -> dict:
+        timeout = self.negative_timeout if negative else self.get_timeout(object_url)
+        return {
+            'data': data,
+            'etag': etag,
+            'last_modified': last_modified,
+            'negative': negative,
+            'expires': time.time() + timeout,
+        }
+
+    def _get_entry(self, object_url):
+        with self._lock:
+            entry = self._entries.get(object_url)
+            if entry is not None:
+                self._entries.move_to_end(object_url)
+                return entry
+
+        if self.shared_cache is None:
+            return None
+        entry = self.shared_cache.get(self._get_shared_key(object_url))
+        if entry is not None:
+            self._set_local_entry(object_url, entry)
+        return entry
+
+    def _set_entry(self, object_url, entry):
+        self._set_local_entry(object_url, entry)
+        if self.shared_cache is not None:
+            timeout = self.negative_timeout if entry['negative'] else self.get_timeout(object_url) + self.stale_timeout
+            self.shared_cache.set(self._get_shared_key(object_url), entry, timeout)
+
+    def _set_local_entry(self, object_url, entry):
+        with self._lock:
+            self._entries[object_url] = entry
+            self._entries.move_to_end(object_url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _get_shared_key(self, object_url) -> str:
+        return 'remote-object:' + hashlib.sha1(object_url.encode('utf-8')).hexdigest()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+remote_object_cache = RemoteObjectCache()
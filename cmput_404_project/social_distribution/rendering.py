@@ -0,0 +1,126 @@
+import functools
+import hashlib
+import threading
+
+from collections import OrderedDict
+from django.conf import settings
+from markdown_it import MarkdownIt
+
+
+DEFAULT_SETTINGS = {
+    # markdown-it preset used to render text/markdown content
+    'PRESET': 'commonmark',
+    # max number of rendered contents kept in the in-process cache
+    'MAX_ENTRIES': 500,
+}
+
+MARKDOWN_CONTENT_TYPE = 'text/markdown'
+
+
+def get_config() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'MARKDOWN_RENDERER', {})}
+
+
+def get_content_hash(content) -> str:
+    '''Returns the sha256 hex digest of content, which identifies its rendered html.'''
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache(maxsize=8)
+def get_renderer(preset) -> MarkdownIt:
+    '''
+    Returns the MarkdownIt of preset. A renderer is built once per preset and process.
+
+    Raw html in the content is escaped, since the rendered html is shown as is.
+    '''
+    return MarkdownIt(preset, {'html': False})
+
+
+class MarkdownRenderer():
+    '''
+    Renders markdown content into html.
+
+    Rendered contents are kept in an in-process LRU cache keyed by their content hash,
+    so the same content is only rendered once, e.g. when a remote post is pulled again.
+    '''
+
+    def __init__(self, **options):
+        config = {**get_config(), **options}
+        self.preset = config['PRESET']
+        self.max_entries = config['MAX_ENTRIES']
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, content, content_hash=None) -> str:
+        '''Returns the html of the markdown content. content_hash is computed if not given.'''
+        content_hash = content_hash or get_content_hash(content)
+        with self._lock:
+            html = self._entries.get(content_hash)
+            if html is not None:
+                self._entries.move_to_end(content_hash)
+                return html
+
+        html = get_renderer(self.preset).render(content)
+        with self._lock:
+            self._entries[content_hash] = html
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+markdown_renderer = MarkdownRenderer()
+
+
+def render_content(obj, content_type, content) -> bool:
+    '''
+    Sets obj.content_html to the html of content and obj.content_hash to its hash,
+    unless obj.content_hash shows that content was already rendered.
+    Content that is not markdown has no html.
+
+    Returns True if the fields of obj were changed.
+    '''
+    # the content of a remote post can be anything
+    content = content if isinstance(content, str) else ''
+    content_hash = get_content_hash(content) if content_type == MARKDOWN_CONTENT_TYPE else ''
+    if content_hash == obj.content_hash:
+        return False
+    obj.content_html = markdown_renderer.render(content, content_hash) if content_hash else ''
+    obj.content_hash = content_hash
+    return True
+
+
+def render_all(queryset, get_content, batch_size=500, force=False) -> int:
+    '''
+    Renders the content of the objects of queryset, whose model has content_html and content_hash
+    fields. get_content(obj) returns (content_type, content). Objects are read and updated in
+    batches of batch_size. If force is True, contents are rendered again even if unchanged,
+    e.g. after the PRESET was changed.
+
+    Returns the number of updated objects.
+    '''
+    if force:
+        # the cached html may have been rendered with other options
+        markdown_renderer.clear()
+    queryset = queryset.order_by('pk')
+    num_updated = 0
+    last_pk = None
+    while True:
+        batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+        batch = list(batch[:batch_size])
+        if not batch:
+            return num_updated
+
+        changed = []
+        for obj in batch:
+            if force:
+                obj.content_hash = None
+            if render_content(obj, *get_content(obj)):
+                changed.append(obj)
+        queryset.model.objects.bulk_update(changed, ['content_html', 'content_hash'])
+        num_updated += len(changed)
+        last_pk = batch[-1].pk
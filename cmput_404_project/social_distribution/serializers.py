@@ -0,0 +1,119 @@
+from django.db.models import OuterRef, Subquery, prefetch_related_objects
+
+from .friends import friends_cache
+from .models import Author, Post, Comment, FollowRequest, Like, InboxItem
+from .remote_cache import remote_object_cache
+
+
+def get_posts_detail_dicts(posts, page=Post.DEFAULT_COMMENTS_PAGE, size=Post.DEFAULT_COMMENTS_SIZE) -> list:
+    '''
+    Returns a list of post detail dicts, one per post in posts.
+
+    posts can be a queryset, a Page or a list of Posts. The authors, the shared-from authors,
+    the original posts of shares and the requested page of comments of all posts are loaded
+    in bulk, so the number of queries does not grow with the number of posts.
+    '''
+    posts = list(posts)
+    prefetch_related_objects(posts, 'author', 'share_from', 'shared_post')
+    comments = get_comments_pages(posts, page, size)
+    return [post.get_detail_dict(page, size, comments=comments[post.id]) for post in posts]
+
+
+def get_comments_detail_dicts(comments) -> list:
+    '''
+    Returns a list of comment detail dicts, one per comment in comments.
+
+    comments can be a queryset, a Page or a list of Comments.
+    '''
+    comments = list(comments)
+    prefetch_related_objects(comments, 'author', 'post__author')
+    return [comment.get_detail_dict() for comment in comments]
+
+
+def get_comments_pages(posts, page=Post.DEFAULT_COMMENTS_PAGE, size=Post.DEFAULT_COMMENTS_SIZE) -> dict:
+    '''
+    Returns a dict that maps the id of each post in posts to the given page of its comments,
+    ordered from the newest to the oldest.
+
+    The comments of all posts are fetched in one query. Each post only gets its own top-N
+    comments through a correlated LIMIT/OFFSET subquery.
+    '''
+    posts = {post.id: post for post in posts}
+    pages = {post_id: [] for post_id in posts}
+    if not posts:
+        return pages
+
+    offset = (page - 1) * size
+    page_ids = Comment.objects.filter(post=OuterRef('post')) \
+                              .order_by('-date_created') \
+                              .values('id')[offset:offset + size]
+    q = Comment.objects.filter(post__in=posts.keys(), id__in=Subquery(page_ids)) \
+                       .select_related('author') \
+                       .order_by('-date_created')
+
+    for comment in q:
+        # reuse the already loaded post so that comment ids can be built without queries
+        comment.post = posts[comment.post_id]
+        pages[comment.post_id].append(comment)
+    return pages
+
+
+def get_inbox_items_detail_dicts(inbox_items, deadline=None) -> list:
+    '''
+    Returns a list of detail dicts, one per InboxItem in inbox_items.
+
+    The local objects of inbox_items are loaded with one query per object type, with their
+    authors. The remote objects and remote authors are fetched concurrently before the deadline,
+    see RemoteObjectCache.get_many().
+    '''
+    inbox_items = list(inbox_items)
+    ids = {object_type: [] for object_type, _ in InboxItem.OBJECT_TYPE_CHOICES}
+    for item in inbox_items:
+        if item.object_id is not None:
+            ids[item.object_type].append(item.object_id)
+
+    posts = _get_objects(Post, ids['POST'], 'author', 'share_from', 'shared_post')
+    comments = _get_objects(Comment, ids['COMMENT'], 'author', 'post__author')
+    follow_requests = _get_objects(FollowRequest, ids['FOLLOW'], 'from_author', 'to_author')
+    likes = _get_objects(Like, ids['LIKE'], 'author')
+
+    # fetch all remote objects at once, so that serializing them below only hits the cache
+    remote_urls = [item.object_url for item in inbox_items if item.object_id is None and item.object_url]
+    remote_urls += [comment.author_url for comment in comments if comment.author is None]
+    remote_urls += [like.author_url for like in likes if like.author is None]
+    for follow_request in follow_requests:
+        if follow_request.from_author is None:
+            remote_urls.append(follow_request.from_author_url)
+        if follow_request.to_author is None:
+            remote_urls.append(follow_request.to_author_url)
+    if remote_urls:
+        remote_object_cache.get_many(remote_urls, deadline)
+
+    details = {}
+    details.update(zip([post.id for post in posts], get_posts_detail_dicts(posts)))
+    details.update(zip([comment.id for comment in comments], get_comments_detail_dicts(comments)))
+    details.update((obj.id, obj.get_detail_dict()) for obj in follow_requests + likes)
+
+    return [details[item.object_id] if item.object_id in details else item.get_detail_dict()
+            for item in inbox_items]
+
+
+def get_friends_detail_dicts(author_id, deadline=None) -> list:
+    '''
+    Returns a list of author detail dicts, one per friend of author_id.
+
+    The friends come from the friends cache, the local ones are loaded with one query and
+    the remote ones are fetched concurrently before the deadline.
+    '''
+    friends = friends_cache.get_friends(author_id)
+    details = [author.get_detail_dict() for author in Author.objects.filter(id__in=friends['local'])]
+    remote_objects = remote_object_cache.get_many(friends['remote'], deadline) if friends['remote'] else {}
+    details += [remote_objects[url] for url in friends['remote'] if remote_objects.get(url)]
+    return details
+
+
+def _get_objects(model, ids, *related_fields) -> list:
+    '''Returns the objects of model whose id is in ids, with related_fields loaded in the same query.'''
+    if not ids:
+        return []
+    return list(model.objects.filter(id__in=ids).select_related(*related_fields))